@@ -1,6 +1,8 @@
 from UM.FileHandler.FileWriter import FileWriter
 
 from .settings_plugin.SnapmakerSettingsPlugin import SnapmakerSettingsPlugin
+from .gcode_writer.ExtruderUsageIndex import ExtruderUsageIndex
+from .gcode_writer.SettingsSnapshot import SettingsSnapshot
 from .gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
 from .network_plugin.SnapmakerOutputDevicePlugin import SnapmakerOutputDevicePlugin
 
@@ -18,8 +20,16 @@ def getMetaData():
     }
 
 
+def _startWatching() -> None:
+    # connect to Qt signals on the Qt thread, not from the write job that uses them first
+    SettingsSnapshot.watch()
+    ExtruderUsageIndex.start()
+
+
 def register(app):
     """Register plugins."""
+    app.engineCreatedSignal.connect(_startWatching)
+
     return {
         # Extends Snapmaker related settings
         "extension": SnapmakerSettingsPlugin(),
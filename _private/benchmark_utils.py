@@ -0,0 +1,26 @@
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from gcode_writer.GCodeSpool import GCodeSpool
+
+
+def write_gcode(spool: GCodeSpool, size: int) -> None:
+    """Write about `size` bytes of G-code, layer by layer like Cura's gcode_list."""
+    written = 0
+    index = 0
+    while written < size:
+        layer = "".join("G1 X{:.3f} Y{:.3f} E{:.5f} ; move {}\n".format(
+            i % 300 * 0.731, i % 250 * 0.917, i * 0.0123, i) for i in range(index, index + 10000))
+        spool.write(layer)
+        written += len(layer)
+        index += 10000
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes, 0 if unknown."""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if rss > 1 << 32 else rss * 1024  # KiB on Linux, bytes on macOS
@@ -0,0 +1,42 @@
+import hashlib
+import zlib
+
+
+class ContentDigest:
+    """md5 and size of a received file's content, decompressed on the fly if it's gzip.
+
+    Gzip files may consist of several members (the G-code spool appends
+    segments as separate members), decompression continues with the next
+    member after each one ends.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.compressed = filename.endswith(".gz")
+        self.size = 0
+
+        self._md5 = hashlib.md5()
+        self._decompressor = self.__createDecompressor() if self.compressed else None
+
+    @staticmethod
+    def __createDecompressor():
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+    def update(self, data: bytes) -> None:
+        if self._decompressor is None:
+            self.__add(data)
+            return
+
+        while data:
+            self.__add(self._decompressor.decompress(data))
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data
+            self._decompressor = self.__createDecompressor()
+
+    def __add(self, data: bytes) -> None:
+        self._md5.update(data)
+        self.size += len(data)
@@ -0,0 +1,169 @@
+import http.client
+import json
+import os
+import time
+import uuid
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+
+
+class UploadResult:
+
+    def __init__(self) -> None:
+        self.success = False
+        self.size = 0
+        self.token = ""
+        self.status_polls = 0
+        self.reconnects = 0  # after 403 on an expired token
+        self.connect_time = 0.  # connect until authorized
+        self.upload_time = 0.  # upload request until reply
+        self.upload_started_at = 0.  # time.monotonic() when the upload request starts
+
+    @property
+    def throughput(self) -> float:
+        """Payload throughput in MB/s."""
+        return self.size / self.upload_time / 1e6 if self.upload_time else 0.
+
+
+def _formFields(boundary: str, fields: List[Tuple[str, str]]) -> bytes:
+    return b"".join(
+        '--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n{}\r\n'.format(boundary, name, value).encode("utf-8")
+        for name, value in fields)
+
+
+def _fileHead(boundary: str, filename: str) -> bytes:
+    return ('--{}\r\nContent-Disposition: form-data; name="file"; filename="{}"\r\n\r\n'
+            .format(boundary, filename).encode("utf-8"))
+
+
+def _fileTail(boundary: str) -> bytes:
+    return "\r\n--{}--\r\n".format(boundary).encode("utf-8")
+
+
+def _readFile(path: str, chunk_size: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class Snapmaker2Client:
+    """Mirror of HTTPNetworkedPrinterOutputDevice's connect -> auth -> upload flow, without Qt.
+
+    streaming uploads the file from disk while sending, like the QFile body
+    device the device uses; otherwise the whole multipart body is built in
+    memory first, as the device did before the G-code was spooled.
+    """
+
+    def __init__(self, host: str, port: int = 8080, token: str = "", poll_interval: float = 1.5,
+                 timeout: float = 60., keep_alive: bool = False) -> None:
+        self.host = host
+        self.port = port
+        self.token = token
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.keep_alive = keep_alive  # stay connected and authorized after an upload, like KeepAliveSession
+
+        self._authorized = False
+
+        self._connection = None  # type: Optional[http.client.HTTPConnection]
+
+    def _request(self, method: str, url: str, body=None, headers: Optional[dict] = None) -> Tuple[int, dict]:
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        self._connection.request(method, "/api/v1" + url, body=body, headers=headers or {})
+        response = self._connection.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data.decode("utf-8")) if data else {}
+        except json.decoder.JSONDecodeError:
+            return response.status, {}
+
+    def _postForm(self, url: str, fields: List[Tuple[str, str]]) -> Tuple[int, dict]:
+        boundary = uuid.uuid4().hex
+        body = _formFields(boundary, fields) + "--{}--\r\n".format(boundary).encode("utf-8")
+        return self._request("POST", url, body, {"Content-Type": "multipart/form-data; boundary=" + boundary})
+
+    def _queryParams(self) -> List[Tuple[str, str]]:
+        return [("token", self.token), ("_", "{}".format(time.time()))]
+
+    def connect(self, result: UploadResult) -> bool:
+        start = time.perf_counter()
+        if self._authorized and self.checkStatus():
+            result.token = self.token
+            result.connect_time = time.perf_counter() - start
+            return True
+        while True:
+            code, resp = self._postForm("/connect", self._queryParams())
+            if code == 200:
+                self.token = resp.get("token", "")
+                break
+            if code == 403 and self.token:
+                # expired, retry connect
+                self.token = ""
+                result.reconnects += 1
+                continue
+            return False
+
+        while True:
+            result.status_polls += 1
+            code, _ = self._request("GET", "/status?" + urlencode({"token": self.token, "_": time.time()}))
+            if code == 200:
+                break
+            if code != 204:
+                return False
+            time.sleep(self.poll_interval)
+
+        result.token = self.token
+        result.connect_time = time.perf_counter() - start
+        self._authorized = True
+        return True
+
+    def checkStatus(self) -> bool:
+        """Health check of a kept session."""
+        code, _ = self._request("GET", "/status?" + urlencode({"token": self.token, "_": time.time()}))
+        self._authorized = code == 200
+        return self._authorized
+
+    def upload(self, path: str, filename: str, streaming: bool = True,
+               chunk_size: int = 64 * 1024) -> UploadResult:
+        result = UploadResult()
+        result.size = os.path.getsize(path)
+        if not self.connect(result):
+            return result
+
+        boundary = uuid.uuid4().hex
+        head = _formFields(boundary, self._queryParams()) + _fileHead(boundary, filename)
+        tail = _fileTail(boundary)
+        headers = {
+            "Content-Type": "multipart/form-data; boundary=" + boundary,
+            "Content-Length": str(len(head) + result.size + len(tail)),
+        }
+
+        result.upload_started_at = time.monotonic()
+        start = time.perf_counter()
+        if streaming:
+            def body() -> Iterator[bytes]:
+                yield head
+                yield from _readFile(path, chunk_size)
+                yield tail
+            code, _ = self._request("POST", "/upload", body(), headers)
+        else:
+            with open(path, "rb") as f:
+                code, _ = self._request("POST", "/upload", head + f.read() + tail, headers)
+        result.upload_time = time.perf_counter() - start
+        result.success = code == 200
+
+        if not self.keep_alive:
+            self.disconnect()
+        return result
+
+    def disconnect(self) -> None:
+        self._authorized = False
+        if self.token:
+            self._postForm("/disconnect", self._queryParams())
+        if self._connection:
+            self._connection.close()
+            self._connection = None
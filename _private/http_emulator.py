@@ -0,0 +1,283 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from _private.content_digest import ContentDigest
+
+
+class ReceivedUpload:
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.size = 0
+        self.first_byte_at = 0.  # time.monotonic() when the first body byte arrived
+        self.finished_at = 0.
+
+        self.content = ContentDigest(filename)  # decompressed content of .gz uploads
+
+        self._md5 = hashlib.md5()
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+    def update(self, data: bytes) -> None:
+        self._md5.update(data)
+        self.size += len(data)
+        self.content.update(data)
+
+
+def parse_multipart(read: Callable[[int], bytes], length: int, boundary: bytes,
+                    on_part: Callable[[Dict[str, str]], None], on_data: Callable[[bytes], None],
+                    chunk_size: int = 64 * 1024) -> None:
+    """Parse a multipart/form-data body while it's being read.
+
+    on_part is called with the headers of every part, followed by on_data
+    calls with its content. Only a delimiter's worth of data is held back.
+    """
+    delimiter = b"\r\n--" + boundary
+    buffer = b"\r\n"  # so that the first delimiter looks like all others
+    in_headers = False
+    in_body = False
+    remaining = length
+    while True:
+        if remaining > 0:
+            data = read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            buffer += data
+
+        progressed = True
+        while progressed:
+            progressed = False
+            if in_headers:
+                end = buffer.find(b"\r\n\r\n")
+                if end >= 0:
+                    headers = {}
+                    for line in buffer[:end].decode("utf-8").split("\r\n"):
+                        if ":" in line:
+                            key, value = line.split(":", 1)
+                            headers[key.strip().lower()] = value.strip()
+                    on_part(headers)
+                    buffer = buffer[end + 4:]
+                    in_headers = False
+                    in_body = True
+                    progressed = True
+                continue
+
+            position = buffer.find(delimiter)
+            if position < 0:
+                # keep what could be the start of a delimiter
+                keep = len(delimiter) - 1
+                if in_body and len(buffer) > keep:
+                    on_data(buffer[:-keep])
+                    buffer = buffer[-keep:]
+                break
+
+            if in_body and position:
+                on_data(buffer[:position])
+            rest = buffer[position + len(delimiter):]
+            if len(rest) < 2:
+                buffer = buffer[position:]
+                break
+            if rest.startswith(b"--"):
+                return
+            buffer = rest[2:]  # skip CRLF after the delimiter
+            in_body = False
+            in_headers = True
+            progressed = True
+
+        if remaining <= 0 and not progressed:
+            break
+
+
+def _dispositionParams(headers: Dict[str, str]) -> Dict[str, str]:
+    params = {}
+    for item in headers.get("content-disposition", "").split(";")[1:]:
+        if "=" in item:
+            key, value = item.split("=", 1)
+            params[key.strip()] = value.strip().strip('"')
+    return params
+
+
+class Snapmaker2Emulator:
+    """Local stand-in for the Snapmaker 2.0 HTTP API on :8080/api/v1.
+
+    - /connect returns a token, a known but expired token gets 403
+    - /status returns 204 until the touchscreen authorization is granted
+      (auth_delay seconds after the first status request), 401 for unknown tokens
+    - /upload streams the G-code file, it's hashed on the fly and never kept
+    - /disconnect, the token has to be authorized on the touchscreen again
+
+    bandwidth: bytes per second uploads are read at most, 0 for unlimited
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, auth_delay: float = 0.,
+                 bandwidth: float = 0.) -> None:
+        self.host = host
+        self.port = port
+        self.auth_delay = auth_delay
+        self.bandwidth = bandwidth
+
+        self.uploads = []  # type: List[ReceivedUpload]
+
+        self._tokens = {}  # type: Dict[str, Optional[float]]  # token -> time authorized at
+        self._expired = set()
+        self._lock = threading.Lock()
+        self._server = None  # type: Optional[ThreadingHTTPServer]
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def start(self) -> None:
+        emulator = self
+
+        class Handler(_Snapmaker2RequestHandler):
+            pass
+
+        Handler.emulator = emulator
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def expireTokens(self) -> None:
+        """Expire all tokens handed out so far, next /connect with one of them gets 403."""
+        with self._lock:
+            self._expired.update(self._tokens)
+            self._tokens.clear()
+
+    def connect(self, token: str) -> (int, dict):
+        with self._lock:
+            if token in self._expired:
+                self._expired.discard(token)
+                return 403, {}
+            if token not in self._tokens:
+                token = uuid.uuid4().hex
+                self._tokens[token] = None
+            return 200, {"token": token}
+
+    def status(self, token: str) -> (int, dict):
+        with self._lock:
+            if token not in self._tokens:
+                return 401, {}
+
+            authorized_at = self._tokens[token]
+            now = time.monotonic()
+            if authorized_at is None:
+                # first poll, the user taps Yes on the touchscreen after auth_delay
+                authorized_at = self._tokens[token] = now + self.auth_delay
+            if now < authorized_at:
+                return 204, {}
+            return 200, {"status": "IDLE"}
+
+    def disconnect(self, token: str) -> (int, dict):
+        with self._lock:
+            if token in self._tokens:
+                self._tokens[token] = None
+            return 200, {}
+
+    def isAuthorized(self, token: str) -> bool:
+        with self._lock:
+            authorized_at = self._tokens.get(token)
+            return authorized_at is not None and time.monotonic() >= authorized_at
+
+
+class _Snapmaker2RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    emulator = None  # type: Snapmaker2Emulator
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _reply(self, code: int, body: Optional[dict] = None) -> None:
+        data = json.dumps(body).encode("utf-8") if body is not None and code == 200 else b""
+        self.send_response(code)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _readForm(self, upload: Optional[ReceivedUpload] = None) -> Dict[str, str]:
+        length = int(self.headers.get("Content-Length", 0))
+        content_type = self.headers.get("Content-Type", "")
+        if "boundary=" not in content_type:
+            self.rfile.read(length)
+            return {}
+        boundary = content_type.split("boundary=", 1)[1].strip().strip('"').encode("utf-8")
+
+        fields = {}
+        current = {}
+
+        def on_part(headers: Dict[str, str]) -> None:
+            params = _dispositionParams(headers)
+            current["name"] = params.get("name", "")
+            if "filename" in params and upload is not None:
+                upload.filename = params["filename"]
+                upload.content = ContentDigest(upload.filename)
+            fields[current["name"]] = b""
+
+        def on_data(data: bytes) -> None:
+            if current.get("name") == "file" and upload is not None:
+                upload.update(data)
+            else:
+                fields[current["name"]] += data
+
+        read_budget = [0.]
+
+        def read(size: int) -> bytes:
+            data = self.rfile.read(size)
+            if upload is not None and not upload.first_byte_at and data:
+                upload.first_byte_at = time.monotonic()
+            if self.emulator.bandwidth > 0:
+                now = time.monotonic()
+                read_budget[0] = max(read_budget[0], now) + len(data) / self.emulator.bandwidth
+                if read_budget[0] > now:
+                    time.sleep(read_budget[0] - now)
+            return data
+
+        parse_multipart(read, length, boundary, on_part, on_data)
+        return {key: value.decode("utf-8") for key, value in fields.items()}
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path == "/api/v1/status":
+            token = parse_qs(url.query).get("token", [""])[0]
+            self._reply(*self.emulator.status(token))
+        else:
+            self._reply(404)
+
+    def do_POST(self) -> None:
+        path = urlparse(self.path).path
+        if path == "/api/v1/connect":
+            form = self._readForm()
+            self._reply(*self.emulator.connect(form.get("token", "")))
+
+        elif path == "/api/v1/disconnect":
+            form = self._readForm()
+            self._reply(*self.emulator.disconnect(form.get("token", "")))
+
+        elif path == "/api/v1/upload":
+            upload = ReceivedUpload("")
+            form = self._readForm(upload)
+            if not self.emulator.isAuthorized(form.get("token", "")):
+                self._reply(401)
+                return
+            upload.finished_at = time.monotonic()
+            self.emulator.uploads.append(upload)
+            self._reply(200, {})
+
+        else:
+            self._reply(404)
@@ -0,0 +1,128 @@
+import selectors
+import socket
+import struct
+import time
+from typing import Callable, Optional, Tuple, Union
+
+from network_plugin.SACP import SACPFrameDecoder, SACP_pack, SACP_validData
+from network_plugin.SACPFileTransfer import SACPFileTransfer
+
+
+class UploadResult:
+
+    def __init__(self) -> None:
+        self.success = False
+        self.size = 0
+        self.bytes_sent = 0  # including framing and retransmits
+        self.connect_time = 0.
+        self.upload_time = 0.
+        self.packets_prefetched = 0
+        self.max_in_flight = 0
+        self.sock = None  # type: Optional[socket.socket]  # kept open for the next upload
+
+    @property
+    def throughput(self) -> float:
+        """Payload throughput in MB/s."""
+        return self.size / self.upload_time / 1e6 if self.upload_time else 0.
+
+
+def _sacpString(s: str) -> bytes:
+    s_utf = s.encode("utf-8")
+    return struct.pack("<H", len(s_utf)) + s_utf
+
+
+def upload(host: str, port: int, data: Union[bytes, memoryview, Callable[[], Tuple[memoryview, str]]],
+           filename: str, pipeline_depth: int = 0, timeout: float = 60., md5: Optional[str] = None,
+           sock: Optional[socket.socket] = None, keep_open: bool = False) -> UploadResult:
+    """Upload a file the way SACPNetworkedPrinterOutputDevice does, without Qt.
+
+    Packets are handled as they arrive, prefetching only happens when no data
+    is waiting, like the zero-timeout QTimer the device uses.
+
+    data may be a function returning data and MD5, it's called once the
+    handshake is done and may block until the file is written, like the
+    device that connects while the G-code is still being written.
+
+    sock is a connection kept open by a previous upload (keep_open), the
+    file is sent over it without another handshake.
+
+    A connection lost during the transfer isn't raised, the result isn't
+    successful then.
+    """
+    result = UploadResult()
+    start = time.perf_counter()
+
+    reuse = sock is not None
+    if not reuse:
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(True)
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    decoder = SACPFrameDecoder()
+
+    def write(packet) -> None:
+        sock.sendall(packet)
+        result.bytes_sent += len(packet)
+
+    transfer = None
+    upload_start = 0.
+
+    def start_transfer() -> None:
+        nonlocal data, md5, transfer, upload_start
+        result.connect_time = time.perf_counter() - start
+        if callable(data):
+            data, md5 = data()
+        upload_start = time.perf_counter()
+        transfer = SACPFileTransfer(data, filename, md5=md5, pipeline_depth=pipeline_depth)
+        write(transfer.getPreparePacket())
+
+    if reuse:
+        start_transfer()
+    else:
+        write(SACP_pack(2, 0, 0, 1, 0x01, 0x05, _sacpString("Destop") + _sacpString("Cura") + _sacpString("")))
+
+    prefetch_pending = False
+    deadline = start + timeout
+    try:
+        while time.perf_counter() < deadline:
+            if not selector.select(0 if prefetch_pending else deadline - time.perf_counter()):
+                if prefetch_pending:
+                    result.packets_prefetched += transfer.prefetch()
+                    prefetch_pending = False
+                continue
+
+            data_in = sock.recv(256 * 1024)
+            if not data_in:
+                break
+            for receiver_data in decoder.feed(data_in):
+                command = (receiver_data.command_set, receiver_data.command_id)
+                if command == (0x01, 0x05):
+                    start_transfer()
+
+                elif command == (0xb0, 0x01) and transfer:
+                    md5_length = receiver_data.valid_data[0]
+                    index = SACP_validData(receiver_data.valid_data, "<H{0}sH".format(md5_length))[-1]
+                    transfer.onPackageRequested(index)
+                    write(transfer.getPacket(index, receiver_data.sequence))
+                    result.max_in_flight = max(result.max_in_flight, transfer.inFlight)
+                    prefetch_pending = transfer.pipelineDepth > 0
+
+                elif command == (0xb0, 0x02) and transfer:
+                    transfer.onFinished()
+                    result.success = receiver_data.valid_data[0] == 0
+                    result.upload_time = time.perf_counter() - upload_start
+                    result.size = transfer.size
+                    if keep_open:
+                        result.sock = sock
+                    else:
+                        write(SACP_pack(2, 0, 0, 1, 0x01, 0x06, b""))
+                    return result
+    except OSError:
+        pass  # connection lost, the upload is started over by a retry
+    finally:
+        selector.close()
+        if result.sock is None:
+            sock.close()
+
+    return result
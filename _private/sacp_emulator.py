@@ -0,0 +1,285 @@
+import hashlib
+import heapq
+import logging
+import random
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import List, Optional
+
+from _private.content_digest import ContentDigest
+from network_plugin.SACP import SACPFrameDecoder, SACP_pack
+
+
+class ReceivedFile:
+    """File received by the emulator, hashed as packages arrive in order."""
+
+    def __init__(self, filename: str, size: int, package_count: int, md5: str) -> None:
+        self.filename = filename
+        self.size = size
+        self.package_count = package_count
+        self.md5 = md5
+        self.received = 0  # bytes received in order so far
+        self.retransmits = 0
+        self.started_at = time.perf_counter()
+        self.finished_at = 0.
+
+        self.content = ContentDigest(filename)  # decompressed content of .gz files
+
+        self._md5 = hashlib.md5()
+        self._next_index = 0
+        self._pending = {}  # out of order packages, index -> bytes
+
+    @property
+    def complete(self) -> bool:
+        return self._next_index >= self.package_count
+
+    @property
+    def valid(self) -> bool:
+        return self.complete and self.received == self.size and self._md5.hexdigest() == self.md5
+
+    def addChunk(self, index: int, chunk: bytes) -> None:
+        if index < self._next_index:
+            return  # duplicate
+        self._pending[index] = chunk
+        while self._next_index in self._pending:
+            chunk = self._pending.pop(self._next_index)
+            self._md5.update(chunk)
+            self.content.update(chunk)
+            self.received += len(chunk)
+            self._next_index += 1
+
+
+class SACPPrinterEmulator:
+    """Headless stand-in for a SACP printer (J1 / Artisan) listening on TCP.
+
+    Speaks the flows used by SACPNetworkedPrinterOutputDevice: connect
+    (0x01/0x05), disconnect (0x01/0x06), file prepare (0xb0/0x00), package
+    requests (0xb0/0x01) and transfer finished (0xb0/0x02).
+
+    Received files are checked against the MD5 and byte count announced in
+    the prepare packet, the result is reported back in 0xb0/0x02.
+
+    latency: delay in seconds before each package request goes out
+    window: number of package requests kept outstanding (the J1 asks for one at a time)
+    bandwidth: bytes per second the emulator reads at most, 0 for unlimited
+    loss: probability that a package reply is dropped, it's requested again
+        after retransmit_timeout seconds
+    fragment: if set, packets are sent and read in pieces of at most that many bytes
+    connect_delay: delay in seconds before the connect reply, the printer's part of the handshake
+    drop_after: if set, connections are closed after this many packages, like a dropped link
+    drops: number of connections dropped (see drop_after), 0 for all of them
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8888, latency: float = 0., window: int = 1,
+                 bandwidth: float = 0., loss: float = 0., fragment: int = 0,
+                 retransmit_timeout: float = 0.1, seed: Optional[int] = None, connect_delay: float = 0.,
+                 drop_after: int = 0, drops: int = 0) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.window = max(1, window)
+        self.bandwidth = bandwidth
+        self.loss = loss
+        self.fragment = fragment
+        self.retransmit_timeout = retransmit_timeout
+        self.connect_delay = connect_delay
+        self.drop_after = drop_after
+        self.drops = drops
+        self.dropped = 0  # connections dropped so far
+        self.random = random.Random(seed)
+
+        self.files = []  # type: List[ReceivedFile]
+
+        self._server = None  # type: Optional[socket.socket]
+        self._thread = None  # type: Optional[threading.Thread]
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        self._server = socket.create_server((self.host, self.port), reuse_port=False)
+        self.port = self._server.getsockname()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._server:
+            self._server.close()
+        if self._thread:
+            self._thread.join()
+
+    def _serve(self) -> None:
+        self._server.settimeout(0.2)
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        _Connection(self, conn).run()
+
+
+class _Connection:
+
+    def __init__(self, emulator: SACPPrinterEmulator, conn: socket.socket) -> None:
+        self._emulator = emulator
+        self._conn = conn
+        self._decoder = SACPFrameDecoder()
+        self._outbox = []  # heap of (due time, order, packet)
+        self._order = 0
+        self._sequence = 0
+
+        self._file = None  # type: Optional[ReceivedFile]
+        self._next_request = 0
+        self._outstanding = 0
+        self._received = 0  # packages received on this connection
+        self._closed = False
+
+        self._read_budget = time.perf_counter()  # time at which the link is free again
+
+    def run(self) -> None:
+        conn = self._conn
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        selector = selectors.DefaultSelector()
+        selector.register(conn, selectors.EVENT_READ)
+        try:
+            while not self._closed and self._emulator.running:
+                timeout = 0.2
+                if self._outbox:
+                    timeout = max(0., self._outbox[0][0] - time.perf_counter())
+                if selector.select(timeout):
+                    data = conn.recv(self._emulator.fragment or 256 * 1024)
+                    if not data:
+                        break
+                    self._throttle(len(data))
+                    for receiver_data in self._decoder.feed(data):
+                        self._onPacket(receiver_data)
+                self._flush()
+        except OSError as e:
+            logging.debug("Emulator connection closed: %s", e)
+        finally:
+            selector.close()
+            conn.close()
+
+    def _throttle(self, size: int) -> None:
+        bandwidth = self._emulator.bandwidth
+        if bandwidth <= 0:
+            return
+        now = time.perf_counter()
+        self._read_budget = max(self._read_budget, now) + size / bandwidth
+        if self._read_budget > now:
+            time.sleep(self._read_budget - now)
+
+    def _send(self, command_set: int, command_id: int, data: bytes, attribute: int = 0,
+              sequence: Optional[int] = None, delay: float = 0.) -> None:
+        if sequence is None:
+            self._sequence = (self._sequence + 1) & 0xFFFF
+            sequence = self._sequence
+        packet = SACP_pack(0, 2, attribute, sequence, command_set, command_id, data)
+        self._order += 1
+        heapq.heappush(self._outbox, (time.perf_counter() + delay, self._order, bytes(packet)))
+
+    def _flush(self) -> None:
+        now = time.perf_counter()
+        while self._outbox and self._outbox[0][0] <= now:
+            _, _, packet = heapq.heappop(self._outbox)
+            fragment = self._emulator.fragment
+            if not fragment:
+                self._conn.sendall(packet)
+                continue
+            for offset in range(0, len(packet), fragment):
+                self._conn.sendall(packet[offset:offset + fragment])
+
+    def _onPacket(self, receiver_data) -> None:
+        command = (receiver_data.command_set, receiver_data.command_id)
+        data = receiver_data.valid_data
+
+        if command == (0x01, 0x05):
+            token = b"emulator"
+            self._send(0x01, 0x05, struct.pack("<BH{}s".format(len(token)), 0, len(token), token),
+                       attribute=1, sequence=receiver_data.sequence, delay=self._emulator.connect_delay)
+
+        elif command == (0x01, 0x06):
+            self._send(0x01, 0x06, b"\x00", attribute=1, sequence=receiver_data.sequence)
+            self._flush()
+            self._closed = True
+
+        elif command == (0xb0, 0x00):
+            offset = 0
+            name_length, = struct.unpack_from("<H", data, offset)
+            offset += 2
+            filename = data[offset:offset + name_length].decode("utf-8")
+            offset += name_length
+            size, package_count, md5_length = struct.unpack_from("<IHH", data, offset)
+            offset += 8
+            md5 = data[offset:offset + md5_length].decode("utf-8")
+
+            self._file = ReceivedFile(filename, size, package_count, md5)
+            self._next_request = 0
+            self._outstanding = 0
+            self._requestPackages()
+
+        elif command == (0xb0, 0x01) and self._file:
+            md5_length, = struct.unpack_from("<H", data, 1)
+            offset = 3 + md5_length
+            index, length = struct.unpack_from("<HH", data, offset)
+            offset += 4
+            chunk = data[offset:offset + length]
+            if len(chunk) != length:
+                logging.warning("Package %d truncated: %d of %d bytes", index, len(chunk), length)
+
+            if self._emulator.loss and self._emulator.random.random() < self._emulator.loss:
+                # pretend the reply got lost, ask again once the timeout expires
+                self._file.retransmits += 1
+                self._requestPackage(index, self._emulator.retransmit_timeout)
+                return
+
+            self._file.addChunk(index, chunk)
+            self._outstanding -= 1
+            self._received += 1
+
+            if self._shouldDrop():
+                self._emulator.dropped += 1
+                self._closed = True  # link drops
+                return
+
+            if self._file.complete:
+                self._finishFile()
+            else:
+                self._requestPackages()
+
+    def _shouldDrop(self) -> bool:
+        emulator = self._emulator
+        if not emulator.drop_after or self._received < emulator.drop_after or self._file.complete:
+            return False
+        return not emulator.drops or emulator.dropped < emulator.drops
+
+    def _requestPackage(self, index: int, delay: float) -> None:
+        md5 = self._file.md5.encode("utf-8")
+        payload = struct.pack("<H{}sH".format(len(md5)), len(md5), md5, index)
+        self._send(0xb0, 0x01, payload, delay=delay)
+
+    def _requestPackages(self) -> None:
+        while self._outstanding < self._emulator.window and self._next_request < self._file.package_count:
+            self._requestPackage(self._next_request, self._emulator.latency)
+            self._next_request += 1
+            self._outstanding += 1
+
+    def _finishFile(self) -> None:
+        received = self._file
+        received.finished_at = time.perf_counter()
+        self._emulator.files.append(received)
+        self._file = None
+
+        self._send(0xb0, 0x02, b"\x00" if received.valid else b"\x01", delay=self._emulator.latency)
@@ -0,0 +1,95 @@
+import argparse
+import hashlib
+import logging
+import time
+
+from _private import sacp_client
+from _private.benchmark_utils import write_gcode
+from _private.http_client import Snapmaker2Client
+from _private.http_emulator import Snapmaker2Emulator
+from _private.sacp_emulator import SACPPrinterEmulator
+from gcode_writer.GCodeSpool import COMPRESSION_GZIP, GCodeSpool
+
+
+def spool_gcode(size: int, level: int) -> (GCodeSpool, float, str):
+    """Spool G-code like the writer does, level 0 for plain G-code."""
+    start = time.perf_counter()
+    if level:
+        spool = GCodeSpool(compression=COMPRESSION_GZIP, compression_level=level)
+    else:
+        spool = GCodeSpool()
+    md5 = _HashingStream(spool)
+    write_gcode(md5, size)
+    spool.finish()
+    return spool, time.perf_counter() - start, md5.hexdigest()
+
+
+class _HashingStream:
+    """Pass writes through, keeping the md5 of the plain G-code to verify what's received."""
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._md5 = hashlib.md5()
+
+    def write(self, data: str) -> int:
+        self._md5.update(data.encode("utf-8"))
+        return self._stream.write(data)
+
+    def hexdigest(self) -> str:
+        return self._md5.hexdigest()
+
+
+def upload_http(emulator: Snapmaker2Emulator, spool: GCodeSpool, filename: str):
+    client = Snapmaker2Client(emulator.host, emulator.port, poll_interval=0.05, timeout=3600)
+    result = client.upload(spool.path, filename)
+    return result.success, result.upload_time, emulator.uploads[-1].content
+
+
+def upload_sacp(emulator: SACPPrinterEmulator, spool: GCodeSpool, filename: str):
+    result = sacp_client.upload(emulator.host, emulator.port, spool.getbuffer(), filename,
+                                pipeline_depth=4, timeout=3600, md5=spool.md5)
+    return result.success, result.upload_time, emulator.files[-1].content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed G-code uploads against the local emulators.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[10, 50], help="G-code sizes in MB")
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 6, 9], help="zlib levels, 0 is plain G-code")
+    parser.add_argument("--bandwidth", type=float, default=2, help="link bandwidth in MB/s, 0 for unlimited")
+    parser.add_argument("--transport", choices=["http", "sacp"], nargs="+", default=["http", "sacp"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    bandwidth = args.bandwidth * 1e6
+    http_emulator = Snapmaker2Emulator(port=0, bandwidth=bandwidth)
+    http_emulator.start()
+    sacp_emulator = SACPPrinterEmulator(port=0, window=4, bandwidth=bandwidth)
+    sacp_emulator.start()
+    logging.info("Emulators: bandwidth %s", "{:.1f} MB/s".format(args.bandwidth) if bandwidth else "unlimited")
+
+    try:
+        for size in args.sizes:
+            for transport in args.transport:
+                for level in args.levels:
+                    spool, spool_time, md5 = spool_gcode(int(size * 1e6), level)
+                    filename = "benchmark.gcode" + (".gz" if level else "")
+                    if transport == "http":
+                        success, upload_time, content = upload_http(http_emulator, spool, filename)
+                    else:
+                        success, upload_time, content = upload_sacp(sacp_emulator, spool, filename)
+
+                    valid = success and content.md5 == md5 and content.size == spool.rawSize
+                    logging.info("%6.1f MB, %-4s, level %d: %8.2f MB on the wire (%5.1f%%), "
+                                 "spool %6.2f s, upload %7.2f s, total %7.2f s%s",
+                                 size, transport, level, spool.size / 1e6, spool.size / spool.rawSize * 100,
+                                 spool_time, upload_time, spool_time + upload_time,
+                                 "" if valid else ", content MISMATCH")
+                    spool.close()
+    finally:
+        http_emulator.stop()
+        sacp_emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
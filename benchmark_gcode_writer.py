@@ -0,0 +1,146 @@
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+from typing import List
+
+from gcode_writer.GCodeCompactor import GCodeCompactor, compact_gcode
+from gcode_writer.GCodeLayerIndex import GCodeLayerIndex
+from gcode_writer.GCodeScanner import scan_gcode
+
+
+def make_gcode_list(line_count: int, lines_per_layer: int = 10000) -> List[str]:
+    """G-code chunks like CuraEngine puts them in gcode_list: header, start G-code, one chunk per layer.
+
+    Layers alternate between two extruders.
+    """
+    gcode_list = [
+        ";FLAVOR:Marlin\n;TIME:6183\n;Filament used: 3.21557m, 0m\n;Layer height: 0.1\n"
+        ";MINX:136.734\n;MINY:74.638\n;MINZ:0.3\n;MAXX:186.578\n;MAXY:125.365\n;MAXZ:52\n"
+        ";Generated with Cura_SteamEngine 5.0.0\n",
+        "M104 S200\nM140 S60\nG28 ;Home\n",
+    ]
+    written = 3
+    layer = 0
+    while written < line_count:
+        count = min(lines_per_layer, line_count - written)
+        lines = [";LAYER:{}\nT{}\n".format(layer, layer % 2)]
+        lines.extend("G1 X{:.3f} Y{:.3f} E{:.5f}\n".format(
+            i % 300 * 0.731, i % 250 * 0.917, i * 0.0123) if i % 1000 else ";TYPE:FILL\n" for i in range(count - 2))
+        gcode_list.append("".join(lines))
+        written += count
+        layer += 1
+    return gcode_list
+
+
+def parse_with_split(gcode_list: List[str]):
+    """The parser SnapmakerGCodeWriter used before GCodeScanner, for reference."""
+    check_header_line = True
+    line_count = 0
+
+    key_value_pairs = {}
+
+    for gcode in gcode_list:
+        lines = gcode.split('\n')
+        line_count += len(lines) - 1
+
+        if check_header_line:
+            for line in lines:
+                if line.startswith(";Generated with Cura_SteamEngine"):  # header ends
+                    check_header_line = False
+                    break
+
+                if line.startswith(";") and ':' in line:
+                    line = line[1:].strip()
+                    key, value = line.split(":", 1)
+                    value = value.strip()
+
+                    key_value_pairs[key] = value
+
+    return key_value_pairs, line_count
+
+
+def parse_with_scanner(gcode_list: List[str]):
+    """What SnapmakerGCodeWriter runs if the header doesn't use layer statistics, e.g. the legacy header."""
+    scanner = scan_gcode(gcode_list)
+    return scanner.header, scanner.line_count
+
+
+def parse_with_layer_index(gcode_list: List[str]):
+    """What SnapmakerGCodeWriter runs for the V1 header, with layer count and tool changes."""
+    index = GCodeLayerIndex()
+    scanner = scan_gcode(gcode_list, index)
+    return scanner.header, scanner.line_count, index
+
+
+def check_layer_index(gcode_list: List[str]) -> bool:
+    _, _, index = parse_with_layer_index(gcode_list)
+    if index.layerCount != sum(gcode.count(";LAYER:") for gcode in gcode_list):
+        return False
+
+    # chunks split in the middle of lines, e.g. by a pipeline stage, give the same statistics
+    text = "".join(gcode_list)
+    cuts = sorted(random.sample(range(1, len(text)), min(1000, len(text) - 1)))
+    _, _, split_index = parse_with_layer_index([text[start:end] for start, end in zip([0] + cuts, cuts + [None])])
+    return (split_index.layerCount == index.layerCount
+            and split_index.tool_changes == index.tool_changes)
+
+
+def measure(parse, gcode_list: List[str], repeat: int) -> (float, int):
+    """Best time of `repeat` runs and peak of memory allocated while parsing."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(gcode_list)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(gcode_list)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark G-code header parsing of SnapmakerGCodeWriter.")
+    parser.add_argument("--lines", type=int, default=1000000, help="G-code lines")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per parser, the best one counts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    gcode_list = make_gcode_list(args.lines)
+    size = sum(len(gcode) for gcode in gcode_list)
+    logging.info("G-code: %d lines in %d chunks, %.1f MB", args.lines, len(gcode_list), size / 1e6)
+
+    if parse_with_split(gcode_list) != parse_with_scanner(gcode_list):
+        logging.error("Parsers disagree")
+        return
+
+    if not check_layer_index(gcode_list):
+        logging.error("Layer index doesn't match the G-code")
+        return
+
+    split_time, split_peak = measure(parse_with_split, gcode_list, args.repeat)
+    scan_time, scan_peak = measure(parse_with_scanner, gcode_list, args.repeat)
+    index_time, index_peak = measure(parse_with_layer_index, gcode_list, args.repeat)
+    logging.info("split (before):       %8.2f ms, peak allocation %9.1f KB", split_time * 1000, split_peak / 1e3)
+    logging.info("scanner (legacy):     %8.2f ms, peak allocation %9.1f KB, %.1fx split",
+                 scan_time * 1000, scan_peak / 1e3, split_time / scan_time)
+    logging.info("+ layer index (V1):   %8.2f ms, peak allocation %9.1f KB, %.1fx split",
+                 index_time * 1000, index_peak / 1e3, split_time / index_time)
+
+    compactor = GCodeCompactor()
+    compacted = list(compact_gcode(gcode_list, compactor))
+    layers = GCodeLayerIndex()
+    scan_gcode(compacted, layers)
+    original_layers = GCodeLayerIndex()
+    scan_gcode(gcode_list, original_layers)
+    logging.info("compact:              %8.2f ms, %.1f MB -> %.1f MB (-%.1f%%), layers %s",
+                 compactor.time * 1000, compactor.bytes_in / 1e6, compactor.bytes_out / 1e6,
+                 compactor.reduction * 100, "kept" if layers.layerCount == original_layers.layerCount else "LOST")
+
+
+if __name__ == "__main__":
+    main()
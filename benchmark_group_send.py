@@ -0,0 +1,77 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from _private import sacp_client
+from _private.benchmark_utils import write_gcode
+from _private.sacp_emulator import SACPPrinterEmulator
+from gcode_writer.GCodeSpool import GCodeSpool
+
+
+def send(emulator: SACPPrinterEmulator, spool: GCodeSpool) -> bool:
+    result = sacp_client.upload(emulator.host, emulator.port, spool.getbuffer(), "farm.gcode",
+                                pipeline_depth=4, timeout=3600, md5=spool.md5)
+    return result.success
+
+
+def send_one_by_one(emulators: List[SACPPrinterEmulator], size: int) -> (float, int):
+    """Write and send the job for each printer, like sending to the printers one after another."""
+    sent = 0
+    start = time.perf_counter()
+    for emulator in emulators:
+        spool = GCodeSpool()
+        write_gcode(spool, size)
+        sent += send(emulator, spool)
+        spool.close()
+    return time.perf_counter() - start, sent
+
+
+def send_to_group(emulators: List[SACPPrinterEmulator], size: int, concurrency: int) -> (float, int):
+    """Write the job once and send the shared spool to all printers, like SnapmakerGroupOutputDevice."""
+    start = time.perf_counter()
+    spool = GCodeSpool()
+    write_gcode(spool, size)
+    spool.finish()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        sent = sum(executor.map(lambda emulator: send(emulator, spool), emulators))
+    spool.close()
+    return time.perf_counter() - start, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sending one job to a group of printers.")
+    parser.add_argument("--printers", type=int, default=4, help="printers in the group")
+    parser.add_argument("--size", type=float, default=20, help="G-code size in MB")
+    parser.add_argument("--latency", type=float, default=2, help="request latency in ms")
+    parser.add_argument("--bandwidth", type=float, default=5, help="bandwidth of each printer in MB/s, 0 for unlimited")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="uploads at the same time")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    emulators = [SACPPrinterEmulator(port=0, latency=args.latency / 1000, bandwidth=args.bandwidth * 1e6, seed=0)
+                 for _ in range(args.printers)]
+    for emulator in emulators:
+        emulator.start()
+    logging.info("%d printers: latency %.1f ms, bandwidth %s", args.printers, args.latency,
+                 "{} MB/s".format(args.bandwidth) if args.bandwidth else "unlimited")
+
+    size = int(args.size * 1e6)
+    try:
+        runs = [("one by one", lambda: send_one_by_one(emulators, size))]
+        runs += [("group, {} at a time".format(concurrency), lambda c=concurrency: send_to_group(emulators, size, c))
+                 for concurrency in args.concurrency]
+        for name, run in runs:
+            elapsed, sent = run()
+            valid = all(emulator.files and emulator.files[-1].valid for emulator in emulators)
+            logging.info("%-20s: %7.2f s for %d printers%s", name, elapsed, args.printers,
+                         "" if sent == args.printers and valid else ", {} FAILED".format(args.printers - sent))
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
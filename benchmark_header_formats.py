@@ -0,0 +1,94 @@
+import argparse
+import base64
+import logging
+import os
+import time
+
+from gcode_writer.HeaderFormats import HeaderFormat, HeaderFormatRegistry
+
+
+def make_context(extruder_count: int, thumbnail_size: int) -> dict:
+    """Context like SnapmakerGCodeWriter builds it, with a thumbnail of thumbnail_size bytes (before base64)."""
+    context = {
+        "machine_name": "Snapmaker J1",
+        "material_bed_temperature_layer_0": 60,
+        "estimated_time": 6183,
+        "line_count": 1000000,
+        "extruder_mode": "IDEX Full Control",
+        "extruders_used": extruder_count,
+        "layer_count": 520,
+        "active_material_print_temperature": 205.,
+        "active_material_bed_temperature": 60.,
+        "active_speed_infill": 60.,
+        "min_x": 136.734, "min_y": 74.638, "min_z": 0.3,
+        "max_x": 186.578, "max_y": 125.365, "max_z": 52.,
+        "thumbnail": "data:image/png;base64," + base64.b64encode(os.urandom(thumbnail_size)).decode("ascii"),
+        "extruders": [{
+            "position": str(i),
+            "material_name": "Generic PLA",
+            "machine_nozzle_size": 0.4,
+            "material_print_temperature": 205,
+            "retraction_amount": 0.8,
+            "switch_extruder_retraction_amount": 16,
+            "filament_used": 3215.57,
+            "tool_changes": 12,
+        } for i in range(extruder_count)],
+    }
+    return context
+
+
+def render_per_line(header_format: HeaderFormat, context: dict, flags: frozenset) -> str:
+    """Format every line on its own and join, the way headers were built before templates."""
+    headers = []
+    for section in header_format.sections:
+        if section.when is not None and section.when not in flags:
+            continue
+        if not section.per_extruder:
+            headers.extend(line.format_map(context) for line in section.lines)
+            continue
+        for extruder in context["extruders"]:
+            headers.extend(line.format_map(extruder) for line in section.lines)
+    headers.append("")
+    return "\n".join(headers)
+
+
+def measure(func, repeat: int) -> float:
+    """Best time of `repeat` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rendering of the registered G-code header formats.")
+    parser.add_argument("--extruders", type=int, default=2, help="number of extruders")
+    parser.add_argument("--thumbnail", type=int, default=100 * 1024, help="thumbnail size in bytes before base64")
+    parser.add_argument("--repeat", type=int, default=1000, help="renders per format, the best one counts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    context = make_context(args.extruders, args.thumbnail)
+    flags = frozenset(["gcode_info", "bbox"])
+    for header_format in HeaderFormatRegistry.getFormats():
+        start = time.perf_counter()
+        header = header_format.render(context, flags)
+        first_time = time.perf_counter() - start
+
+        if header != render_per_line(header_format, context, flags):
+            logging.error("%s: compiled template differs from per line rendering", header_format.name)
+            continue
+
+        compiled_time = measure(lambda: header_format.render(context, flags), args.repeat)
+        per_line_time = measure(lambda: render_per_line(header_format, context, flags), args.repeat)
+        logging.info("%-14s (version %d): %d lines, %7.1f KB, first render (compile) %7.1f us, "
+                     "compiled %7.1f us, per line %7.1f us",
+                     header_format.name, header_format.version, header.count("\n"), len(header) / 1e3,
+                     first_time * 1e6, compiled_time * 1e6, per_line_time * 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import time
+
+from _private.benchmark_utils import peak_rss, write_gcode
+from _private.http_client import Snapmaker2Client
+from _private.http_emulator import Snapmaker2Emulator
+from gcode_writer.GCodeSpool import GCodeSpool
+
+
+def run_upload(host: str, port: int, size: int, streaming: bool, token: str, poll_interval: float, queue) -> None:
+    """Upload in a child process, so CPU time and peak RSS belong to the client only."""
+    spool = GCodeSpool()
+    write_gcode(spool, size)
+    spool.finish()
+
+    client = Snapmaker2Client(host, port, token=token, poll_interval=poll_interval, timeout=3600)
+    cpu_start = time.process_time()
+    result = client.upload(spool.path, "benchmark.gcode", streaming=streaming)
+    cpu_time = time.process_time() - cpu_start
+
+    queue.put({
+        "md5": hashlib.md5(spool.getbuffer()).hexdigest(),
+        "success": result.success,
+        "size": result.size,
+        "reconnects": result.reconnects,
+        "status_polls": result.status_polls,
+        "connect_time": result.connect_time,
+        "upload_time": result.upload_time,
+        "upload_started_at": result.upload_started_at,
+        "cpu_time": cpu_time,
+        "peak_rss": peak_rss(),
+        "throughput": result.throughput,
+    })
+    spool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Snapmaker 2.0 HTTP uploads against a local emulator.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 100], help="G-code sizes in MB")
+    parser.add_argument("--auth-delay", type=float, default=0, help="seconds until the touchscreen authorizes")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="status poll interval in seconds")
+    parser.add_argument("--expired-token", action="store_true", help="start with an expired token (403, reconnect)")
+    parser.add_argument("--mode", choices=["streaming", "memory"], nargs="+", default=["streaming", "memory"],
+                        help="upload from the spool file while sending, or build the body in memory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    emulator = Snapmaker2Emulator(port=0, auth_delay=args.auth_delay)
+    emulator.start()
+    logging.info("Emulator: auth delay %.1f s, poll interval %.1f s, expired token %s",
+                 args.auth_delay, args.poll_interval, "yes" if args.expired_token else "no")
+
+    context = multiprocessing.get_context("spawn")
+    try:
+        for size in args.sizes:
+            for mode in args.mode:
+                token = ""
+                if args.expired_token:
+                    _, resp = emulator.connect("")
+                    token = resp["token"]
+                    emulator.expireTokens()
+
+                uploads = len(emulator.uploads)
+                queue = context.Queue()
+                process = context.Process(target=run_upload,
+                                          args=(emulator.host, emulator.port, int(size * 1e6), mode == "streaming",
+                                                token, args.poll_interval, queue))
+                process.start()
+                stats = queue.get()
+                process.join()
+
+                received = emulator.uploads[-1] if len(emulator.uploads) > uploads else None
+                valid = stats["success"] and received is not None and received.md5 == stats["md5"]
+                ttfb = received.first_byte_at - stats["upload_started_at"] if received else 0.
+                logging.info("%7.1f MB, %-9s: auth %6.2f s (%d polls, %d reconnects), first byte %7.2f ms, "
+                             "upload %7.2f s, %7.2f MB/s, CPU %6.2f s, peak RSS %7.1f MB%s",
+                             stats["size"] / 1e6, mode, stats["connect_time"], stats["status_polls"],
+                             stats["reconnects"], ttfb * 1000, stats["upload_time"], stats["throughput"],
+                             stats["cpu_time"], stats["peak_rss"] / 1e6, "" if valid else " FAILED")
+    finally:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import logging
+import time
+
+from _private import sacp_client
+from _private.benchmark_utils import write_gcode
+from _private.http_client import Snapmaker2Client
+from _private.http_emulator import Snapmaker2Emulator
+from _private.sacp_emulator import SACPPrinterEmulator
+from gcode_writer.GCodeSpool import GCodeSpool
+
+
+def send_http(emulator: Snapmaker2Emulator, spool: GCodeSpool, plates: int, keep_alive: bool) -> (float, int):
+    """Send a batch of plates, time in seconds and number of successful sends."""
+    client = Snapmaker2Client(emulator.host, emulator.port, poll_interval=0.05, timeout=3600, keep_alive=keep_alive)
+    sent = 0
+    start = time.perf_counter()
+    for plate in range(plates):
+        result = client.upload(spool.path, "plate_{}.gcode".format(plate))
+        sent += result.success
+    elapsed = time.perf_counter() - start
+    client.disconnect()
+    return elapsed, sent
+
+
+def send_sacp(emulator: SACPPrinterEmulator, spool: GCodeSpool, plates: int, keep_alive: bool) -> (float, int):
+    sock = None
+    sent = 0
+    start = time.perf_counter()
+    for plate in range(plates):
+        result = sacp_client.upload(emulator.host, emulator.port, spool.getbuffer(), "plate_{}.gcode".format(plate),
+                                    pipeline_depth=4, timeout=3600, md5=spool.md5, sock=sock, keep_open=keep_alive)
+        sock = result.sock
+        sent += result.success
+    elapsed = time.perf_counter() - start
+    if sock:
+        sock.close()
+    return elapsed, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sending a batch of plates with and without keep-alive.")
+    parser.add_argument("--plates", type=int, default=5, help="plates sent to the same printer")
+    parser.add_argument("--size", type=float, default=2, help="G-code size of a plate in MB")
+    parser.add_argument("--auth-delay", type=float, default=1, help="seconds until the touchscreen authorizes")
+    parser.add_argument("--connect-delay", type=float, default=300, help="SACP printer's handshake time in ms")
+    parser.add_argument("--transport", choices=["http", "sacp"], nargs="+", default=["http", "sacp"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    http_emulator = Snapmaker2Emulator(port=0, auth_delay=args.auth_delay)
+    http_emulator.start()
+    sacp_emulator = SACPPrinterEmulator(port=0, connect_delay=args.connect_delay / 1000)
+    sacp_emulator.start()
+    logging.info("Emulators: auth delay %.1f s, SACP handshake %.0f ms", args.auth_delay, args.connect_delay)
+
+    spool = GCodeSpool()
+    write_gcode(spool, int(args.size * 1e6))
+    spool.finish()
+    try:
+        for transport in args.transport:
+            for keep_alive in (False, True):
+                if transport == "http":
+                    elapsed, sent = send_http(http_emulator, spool, args.plates, keep_alive)
+                else:
+                    elapsed, sent = send_sacp(sacp_emulator, spool, args.plates, keep_alive)
+                logging.info("%-4s, keep-alive %-3s: %d plates in %7.2f s, %6.2f s per plate%s",
+                             transport, "on" if keep_alive else "off", args.plates, elapsed, elapsed / args.plates,
+                             "" if sent == args.plates else ", {} FAILED".format(args.plates - sent))
+    finally:
+        spool.close()
+        http_emulator.stop()
+        sacp_emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
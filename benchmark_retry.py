@@ -0,0 +1,65 @@
+import argparse
+import logging
+import time
+
+from _private import sacp_client
+from _private.benchmark_utils import write_gcode
+from _private.sacp_emulator import SACPPrinterEmulator
+from gcode_writer.GCodeSpool import GCodeSpool
+
+
+def send_with_retries(emulator: SACPPrinterEmulator, spool: GCodeSpool, max_attempts: int,
+                      retry_delay: float) -> (bool, int, float, int):
+    """Send like UploadQueue does: retry with backoff, every attempt starts over.
+
+    Returns whether the file was sent, attempts, time in seconds and bytes sent.
+    """
+    bytes_sent = 0
+    start = time.perf_counter()
+    for attempt in range(1, max_attempts + 1):
+        result = sacp_client.upload(emulator.host, emulator.port, spool.getbuffer(), "retry.gcode",
+                                    pipeline_depth=4, timeout=3600, md5=spool.md5)
+        bytes_sent += result.bytes_sent
+        if result.success:
+            return True, attempt, time.perf_counter() - start, bytes_sent
+        time.sleep(retry_delay * 2 ** (attempt - 1))
+    return False, max_attempts, time.perf_counter() - start, bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retries of uploads over a link that drops.")
+    parser.add_argument("--size", type=float, default=20, help="G-code size in MB")
+    parser.add_argument("--latency", type=float, default=2, help="request latency in ms")
+    parser.add_argument("--bandwidth", type=float, default=5, help="link bandwidth in MB/s, 0 for unlimited")
+    parser.add_argument("--drop-after", type=int, default=100, help="packages until the link drops")
+    parser.add_argument("--drops", type=int, nargs="+", default=[0, 1, 2, 4], help="times the link drops")
+    parser.add_argument("--attempts", type=int, default=8, help="attempts until giving up")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="first retry delay in s, doubled each time")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    spool = GCodeSpool()
+    write_gcode(spool, int(args.size * 1e6))
+    spool.finish()
+    logging.info("Link drops after %d packages, %.1f MB file", args.drop_after, spool.size / 1e6)
+
+    try:
+        for drops in args.drops:
+            emulator = SACPPrinterEmulator(port=0, latency=args.latency / 1000, bandwidth=args.bandwidth * 1e6,
+                                           drop_after=args.drop_after if drops else 0, drops=drops)
+            emulator.start()
+            try:
+                sent, attempts, elapsed, bytes_sent = send_with_retries(emulator, spool, args.attempts,
+                                                                        args.retry_delay)
+            finally:
+                emulator.stop()
+            valid = sent and emulator.files and emulator.files[-1].valid
+            logging.info("%d drops: %s after %d attempts, %7.2f s, %7.1f MB sent",
+                         drops, "sent" if valid else "FAILED", attempts, elapsed, bytes_sent / 1e6)
+    finally:
+        spool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import argparse
+import logging
+import multiprocessing
+import threading
+import time
+
+from _private.benchmark_utils import peak_rss, write_gcode
+from _private.sacp_client import upload
+from _private.sacp_emulator import SACPPrinterEmulator
+from gcode_writer.GCodeSpool import GCodeSpool
+from network_plugin.SACP import CHECKSUM_BACKENDS, set_checksum_backend
+
+
+def run_upload(host: str, port: int, size: int, pipeline_depth: int, checksum: str, overlap: bool, queue) -> None:
+    """Upload in a child process, so CPU time and peak RSS belong to the client only.
+
+    With overlap, the client connects while the G-code is still being
+    written, like SACPNetworkedPrinterOutputDevice does, CPU time includes
+    writing then.
+    """
+    if checksum:
+        set_checksum_backend(checksum)
+
+    start = time.perf_counter()
+    spool = GCodeSpool()
+    if overlap:
+        writer = threading.Thread(target=write_gcode, args=(spool, size))
+        cpu_start = time.process_time()
+        writer.start()
+
+        def written():
+            writer.join()
+            return spool.getbuffer(), spool.md5
+
+        result = upload(host, port, written, "benchmark.gcode", pipeline_depth=pipeline_depth, timeout=3600)
+    else:
+        write_gcode(spool, size)
+        cpu_start = time.process_time()
+        result = upload(host, port, spool.getbuffer(), "benchmark.gcode", pipeline_depth=pipeline_depth,
+                        timeout=3600, md5=spool.md5)
+    cpu_time = time.process_time() - cpu_start
+
+    queue.put({
+        "success": result.success,
+        "size": result.size,
+        "upload_time": result.upload_time,
+        "time_to_print": time.perf_counter() - start,
+        "cpu_time": cpu_time,
+        "peak_rss": peak_rss(),
+        "throughput": result.throughput,
+    })
+    result = None
+    spool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SACP uploads against a local printer emulator.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 100], help="G-code sizes in MB")
+    parser.add_argument("--latency", type=float, default=2, help="request latency in ms")
+    parser.add_argument("--window", type=int, default=1, help="package requests the emulator keeps outstanding")
+    parser.add_argument("--bandwidth", type=float, default=0, help="link bandwidth in MB/s, 0 for unlimited")
+    parser.add_argument("--loss", type=float, default=0, help="probability that a package reply is lost")
+    parser.add_argument("--fragment", type=int, default=0, help="emulator reads and writes at most this many bytes")
+    parser.add_argument("--depth", type=int, nargs="+", default=[0, 4], help="pipeline depths to compare")
+    parser.add_argument("--checksum", choices=sorted(CHECKSUM_BACKENDS), help="checksum backend")
+    parser.add_argument("--connect-delay", type=float, default=0, help="printer's handshake time in ms")
+    parser.add_argument("--overlap", action="store_true",
+                        help="also connect while the G-code is written, compare time to print")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.checksum:
+        set_checksum_backend(args.checksum)
+
+    emulator = SACPPrinterEmulator(port=0,
+                                   latency=args.latency / 1000,
+                                   window=args.window,
+                                   bandwidth=args.bandwidth * 1e6,
+                                   loss=args.loss,
+                                   fragment=args.fragment,
+                                   seed=0,
+                                   connect_delay=args.connect_delay / 1000)
+    emulator.start()
+    logging.info("Emulator: latency %.1f ms, window %d, bandwidth %s, loss %.1f%%, fragment %s, connect %.1f ms",
+                 args.latency, args.window, "{} MB/s".format(args.bandwidth) if args.bandwidth else "unlimited",
+                 args.loss * 100, args.fragment or "off", args.connect_delay)
+
+    context = multiprocessing.get_context("spawn")
+    try:
+        for size in args.sizes:
+            for depth in args.depth:
+                for overlap in [False, True] if args.overlap else [False]:
+                    queue = context.Queue()
+                    process = context.Process(target=run_upload,
+                                              args=(emulator.host, emulator.port, int(size * 1e6), depth,
+                                                    args.checksum, overlap, queue))
+                    process.start()
+                    stats = queue.get()
+                    process.join()
+
+                    received = emulator.files[-1] if emulator.files else None
+                    valid = stats["success"] and received is not None and received.valid
+                    logging.info("%7.1f MB, pipeline %d%s: %7.2f MB/s, upload %7.2f s, time to print %7.2f s, "
+                                 "CPU %7.2f s, peak RSS %7.1f MB, retransmits %d%s",
+                                 stats["size"] / 1e6, depth, ", overlapped" if overlap else "",
+                                 stats["throughput"], stats["upload_time"], stats["time_to_print"],
+                                 stats["cpu_time"], stats["peak_rss"] / 1e6,
+                                 received.retransmits if received else 0,
+                                 "" if valid else " FAILED")
+    finally:
+        emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
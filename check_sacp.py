@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import random
+import time
+import timeit
+from typing import List, Tuple
+
+from network_plugin.SACP import (
+    CHECKSUM_BACKENDS,
+    SACP_PACKAGE,
+    SACPFrameDecoder,
+    SACP_check_head,
+    SACP_check_head_bitwise,
+    SACP_head_prefix,
+    SACP_pack,
+    SACP_unpack,
+    u16_check_data_python,
+)
+from network_plugin.SACPFileTransfer import SACPFileTransfer
+
+
+def check_checksum_backends(rounds: int = 200) -> bool:
+    """Compare every checksum backend against the reference implementation."""
+    buffers = [b"", b"\x01", b"\xff" * 7, b"\xff" * (256 * 1024)]  # the last one wraps the 32-bit sum
+    for _ in range(rounds):
+        buffers.append(os.urandom(random.randint(0, 2 * SACP_PACKAGE)))
+
+    ok = True
+    for data in buffers:
+        length = len(data)
+        # also check a length shorter than the buffer, like SACP_unpack does
+        for check_length in (length, max(0, length - 3)):
+            expected = u16_check_data_python(data, check_length)
+            for name, backend in CHECKSUM_BACKENDS.items():
+                for buffer in (data, bytearray(data), memoryview(data)):
+                    result = backend(buffer, check_length)
+                    if result != expected:
+                        logging.error("Checksum backend %s mismatch (length %d): %04x != %04x",
+                                      name, check_length, result, expected)
+                        ok = False
+
+    logging.info("Checked %d buffers against %d checksum backends", len(buffers), len(CHECKSUM_BACKENDS))
+    return ok
+
+
+def benchmark_checksum_backends(number: int = 20) -> None:
+    data = os.urandom(SACP_PACKAGE + 6)
+    for name, backend in CHECKSUM_BACKENDS.items():
+        elapsed = timeit.timeit(lambda: backend(data, len(data)), number=number) / number
+        logging.info("Checksum %-10s %8.3f ms per 60 KiB chunk", name, elapsed * 1000)
+
+
+def check_head_crc(rounds: int = 2000) -> bool:
+    """Compare the table-driven header CRC and cached prefixes against the bitwise CRC."""
+    ok = True
+    for _ in range(rounds):
+        head = os.urandom(6)
+        if SACP_check_head(head, 6) != SACP_check_head_bitwise(head, 6):
+            logging.error("Header CRC mismatch for %s", head.hex())
+            ok = False
+
+    for data_length in (0, 1, 255, 256, SACP_PACKAGE + 60):
+        for receiver_id in (0, 1, 2):
+            packet = SACP_pack(receiver_id, 0, 1, 1, 0xb0, 0x01, bytes(data_length))
+            prefix = SACP_head_prefix(data_length, receiver_id)
+            if packet[:7] != prefix or packet[6] != SACP_check_head_bitwise(packet, 6):
+                logging.error("Header prefix mismatch (length %d, receiver %d)", data_length, receiver_id)
+                ok = False
+
+    logging.info("Checked %d header CRCs", rounds)
+    return ok
+
+
+def benchmark_head_crc(number: int = 10000) -> None:
+    head = os.urandom(6)
+    for name, crc in (("bitwise", SACP_check_head_bitwise), ("table", SACP_check_head)):
+        elapsed = timeit.timeit(lambda: crc(head, 6), number=number) / number
+        logging.info("Header CRC %-8s %8.3f us per header", name, elapsed * 1000000)
+    elapsed = timeit.timeit(lambda: SACP_head_prefix(SACP_PACKAGE, 2), number=number) / number
+    logging.info("Header CRC %-8s %8.3f us per header", "cached", elapsed * 1000000)
+
+
+def benchmark_pack(number: int = 200) -> None:
+    chunk_head = bytes(40)
+    chunk = os.urandom(SACP_PACKAGE)
+
+    elapsed = timeit.timeit(lambda: SACP_pack(2, 0, 1, 1, 0xb0, 0x01, chunk_head + chunk), number=number) / number
+    logging.info("Pack %-8s %8.3f ms per 60 KiB chunk", "concat", elapsed * 1000)
+    elapsed = timeit.timeit(lambda: SACP_pack(2, 0, 1, 1, 0xb0, 0x01, (chunk_head, chunk)), number=number) / number
+    logging.info("Pack %-8s %8.3f ms per 60 KiB chunk", "parts", elapsed * 1000)
+
+
+def make_packets(count: int, max_size: int) -> List[Tuple[int, int, int, bytes]]:
+    packets = []
+    for sequence in range(count):
+        payload = os.urandom(random.randint(0, max_size))
+        packets.append((random.choice((0x01, 0xb0)), random.randint(0, 6), sequence & 0xFFFF, payload))
+    return packets
+
+
+def split_stream(stream: bytes, max_fragment: int) -> List[bytes]:
+    fragments = []
+    offset = 0
+    while offset < len(stream):
+        size = random.randint(1, max_fragment)
+        fragments.append(stream[offset:offset + size])
+        offset += size
+    return fragments
+
+
+def garbage(max_size: int) -> bytes:
+    # no 0xAA, so garbage can never look like the start of a packet
+    return os.urandom(random.randint(0, max_size)).replace(b"\xaa", b"\x00")
+
+
+def check_frame_decoder(rounds: int = 50) -> bool:
+    """Feed randomly split streams with garbage in between and compare decoded packets."""
+    ok = True
+    for _ in range(rounds):
+        packets = make_packets(random.randint(1, 50), random.choice((16, 512, SACP_PACKAGE)))
+        stream = bytearray()
+        for command_set, command_id, sequence, payload in packets:
+            stream += garbage(8)
+            stream += SACP_pack(2, 0, 1, sequence, command_set, command_id, payload)
+            if random.random() < 0.2:
+                # a packet with a broken header CRC has to be skipped
+                broken = SACP_pack(2, 0, 1, sequence, command_set, command_id, b"broken")
+                broken[6] ^= 0xFF
+                stream += broken.replace(b"\xaa", b"\x00")[1:]
+
+        decoder = SACPFrameDecoder()
+        decoded = []
+        for fragment in split_stream(bytes(stream), random.choice((1, 7, 1460, 65536))):
+            decoded.extend(decoder.feed(fragment))
+
+        expected = [(sequence, command_set, command_id, payload)
+                    for command_set, command_id, sequence, payload in packets]
+        result = [(data.sequence, data.command_set, data.command_id, data.valid_data) for data in decoded]
+        if result != expected:
+            logging.error("Frame decoder mismatch: %d packets decoded, %d expected", len(result), len(expected))
+            ok = False
+
+    logging.info("Checked frame decoder with %d fragmented streams", rounds)
+    return ok
+
+
+def benchmark_frame_decoder() -> None:
+    for payload_size, count in ((16, 20000), (SACP_PACKAGE, 200)):
+        packets = make_packets(count, payload_size)
+        stream = b"".join(SACP_pack(2, 0, 1, sequence, command_set, command_id, payload)
+                          for command_set, command_id, sequence, payload in packets)
+        for max_fragment in (7, 1460, len(stream)):
+            fragments = split_stream(stream, max_fragment)
+            decoder = SACPFrameDecoder()
+            start = time.perf_counter()
+            decoded = 0
+            for fragment in fragments:
+                for _ in decoder.feed(fragment):
+                    decoded += 1
+            elapsed = time.perf_counter() - start
+            logging.info("Decode %5d B packets, fragments <= %8d B: %8.0f packets/s, %7.1f MB/s",
+                         payload_size, max_fragment, decoded / elapsed, len(stream) / elapsed / 1e6)
+
+
+def check_file_transfer() -> bool:
+    """Check that chunks cover the encoded file byte by byte, including non-ASCII text."""
+    ok = True
+    gcode = "".join(";注释 {}\nG1 X{} Y{}\n".format(i, i % 200, i % 150) for i in range(20000)).encode("utf-8")
+    for data in (gcode, gcode[:SACP_PACKAGE * 3], b""):
+        transfer = SACPFileTransfer(data, "test.gcode", pipeline_depth=2)
+        chunks = [transfer.getChunk(index) for index in range(transfer.packageCount)]
+        if b"".join(chunks) != data or transfer.md5 != hashlib.md5(data).hexdigest():
+            logging.error("Chunks don't add up to the file (%d bytes)", len(data))
+            ok = False
+
+        for index in list(range(transfer.packageCount)) + [0, transfer.packageCount - 1]:
+            sequence = random.randint(0, 0xFFFF)
+            transfer.onPackageRequested(index)
+            packet = bytes(transfer.getPacket(index, sequence))
+            transfer.prefetch()  # prefetched packets get their sequence patched on request
+            received = SACP_unpack(packet)
+            expected = SACP_pack(2, 0, 1, sequence, 0xb0, 0x01, received.valid_data)
+            if packet != bytes(expected) or not received.valid_data.endswith(bytes(chunks[index])):
+                logging.error("Packet %d doesn't match a freshly packed one", index)
+                ok = False
+
+    logging.info("Checked chunked file transfer")
+    return ok
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    random.seed(0)
+
+    logging.info("Checking SACP checksum backends...")
+    if not check_checksum_backends():
+        raise SystemExit(1)
+    benchmark_checksum_backends()
+
+    logging.info("Checking SACP header CRC...")
+    if not check_head_crc():
+        raise SystemExit(1)
+    benchmark_head_crc()
+    benchmark_pack()
+
+    logging.info("Checking SACP frame decoder...")
+    if not check_frame_decoder():
+        raise SystemExit(1)
+    benchmark_frame_decoder()
+
+    logging.info("Checking SACP file transfer...")
+    if not check_file_transfer():
+        raise SystemExit(1)
+
+    logging.info("Done.")
+
+
+if __name__ == "__main__":
+    main()
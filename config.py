@@ -1,43 +1,54 @@
+from typing import Optional
+
 SNAPMAKER_2_A150 = dict(
     name="Snapmaker A150",
     model="Snapmaker 2 Model A150",
     header_version=0,  # default is 1
+    thumbnail_size=(300, 300),  # default is 600x600, smaller for the touchscreen
 )
 
 SNAPMAKER_2_A250 = dict(
     name="Snapmaker A250",
     model="Snapmaker 2 Model A250",
     header_version=0,
+    thumbnail_size=(300, 300),
 )
 
 SNAPMAKER_2_A350 = dict(
     name="Snapmaker A350",
     model="Snapmaker 2 Model A350",
     header_version=0,
+    thumbnail_size=(300, 300),
 )
 
 SNAPMAKER_2_A150_DUAL_EXTRUDER = dict(
     name="Snapmaker 2.0 A150 Dual Extruder",
     model="Snapmaker 2 Model A150",
     header_version=0,
+    thumbnail_size=(300, 300),
 )
 
 SNAPMAKER_2_A250_DUAL_EXTRUDER = dict(
     name="Snapmaker 2.0 A250 Dual Extruder",
     model="Snapmaker 2 Model A250",
     header_version=0,
+    thumbnail_size=(300, 300),
 )
 
 SNAPMAKER_2_A350_DUAL_EXTRUDER = dict(
     name="Snapmaker 2.0 A350 Dual Extruder",
     model="Snapmaker 2 Model A350",
     header_version=0,
+    thumbnail_size=(300, 300),
 )
 
 SNAPMAKER_J1 = dict(
     name="Snapmaker J1",
     model="Snapmaker J1",
     header_version=1,  # default is 1
+    thumbnail_size=(600, 600),  # default is 600x600
+    thumbnail_format="PNG",  # default is PNG, or JPG
+    compression=(),  # compressed uploads the firmware accepts, e.g. ("gzip",), default is none
 )
 
 SNAPMAKER_ARTISAN = dict(
@@ -60,3 +71,11 @@ SNAPMAKER_DISCOVER_MACHINES = [
 
 def is_machine_discover_supported(machine_name: str) -> bool:
     return machine_name in [machine['name'] for machine in SNAPMAKER_DISCOVER_MACHINES]
+
+
+def get_machine_by_model(model: str) -> Optional[dict]:
+    """Get machine config by the model a printer reports on discovery."""
+    for machine in SNAPMAKER_DISCOVER_MACHINES:
+        if machine['model'] == model:
+            return machine
+    return None
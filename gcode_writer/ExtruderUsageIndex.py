@@ -0,0 +1,128 @@
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from UM.Logger import Logger
+from UM.Scene.Iterator.DepthFirstIterator import DepthFirstIterator
+from UM.Scene.SceneNode import SceneNode
+from UM.Scene.Selection import Selection
+
+from cura.CuraApplication import CuraApplication
+from cura.Settings.ExtruderManager import ExtruderManager
+
+
+class ExtruderUsageIndex:
+    """Extruders used by the nodes on each build plate, kept up to date with the scene.
+
+    A node that changes is updated on its own. Changes of the scene
+    structure (nodes added, removed, grouped) mark the index dirty, it's
+    rebuilt on the next query, so a burst of changes costs one walk.
+
+    The index connects to scene signals, it's created by start() on the
+    Qt thread, not on first use, which may be in a write job.
+    """
+
+    __instance = None  # type: Optional[ExtruderUsageIndex]
+
+    @classmethod
+    def start(cls) -> None:
+        """Create the index, call it on the Qt thread."""
+        if not cls.__instance:
+            cls.__instance = cls()
+
+    @classmethod
+    def getInstance(cls) -> Optional["ExtruderUsageIndex"]:
+        """Get the index, None if it's not started."""
+        return cls.__instance
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._nodes = {}  # type: Dict[int, Tuple[int, int]]  # id(node) -> (build plate, extruder)
+        self._usage = {}  # type: Dict[int, Dict[int, int]]  # build plate -> extruder -> node count
+        self._dirty = True
+
+        application = CuraApplication.getInstance()
+        self._root = application.getController().getScene().getRoot()
+        application.getController().getScene().sceneChanged.connect(self._onSceneChanged)
+        application.globalContainerStackChanged.connect(self.invalidate)
+        ExtruderManager.getInstance().selectedObjectExtrudersChanged.connect(self._onSelectedObjectExtrudersChanged)
+
+    def invalidate(self, *args, **kwargs) -> None:
+        with self._lock:
+            self._dirty = True
+
+    def getExtrudersUsed(self, build_plate: int) -> Set[int]:
+        with self._lock:
+            if self._dirty:
+                self.__rebuild()
+            return set(self._usage.get(build_plate, {}))
+
+    def getExtrudersUsedCount(self, build_plate: int) -> int:
+        with self._lock:
+            if self._dirty:
+                self.__rebuild()
+            return len(self._usage.get(build_plate, {}))
+
+    def __rebuild(self) -> None:
+        self._nodes.clear()
+        self._usage.clear()
+        for node in DepthFirstIterator(self._root):
+            self.__addNode(node)
+        self._dirty = False
+
+    @staticmethod
+    def __nodeEntry(node: SceneNode) -> Optional[Tuple[int, int]]:
+        stack = node.callDecoration("getStack")
+        if not stack:
+            return None
+
+        extruder_nr = stack.getProperty("extruder_nr", "value")
+        build_plate = node.callDecoration("getBuildPlateNumber")
+        return (build_plate if build_plate is not None else 0), int(extruder_nr)
+
+    def __addNode(self, node: SceneNode) -> None:
+        entry = self.__nodeEntry(node)
+        if entry is None:
+            return
+
+        self._nodes[id(node)] = entry
+        build_plate, extruder_nr = entry
+        usage = self._usage.setdefault(build_plate, {})
+        usage[extruder_nr] = usage.get(extruder_nr, 0) + 1
+
+    def __removeNode(self, node: SceneNode) -> None:
+        entry = self._nodes.pop(id(node), None)
+        if entry is None:
+            return
+
+        build_plate, extruder_nr = entry
+        usage = self._usage[build_plate]
+        usage[extruder_nr] -= 1
+        if not usage[extruder_nr]:
+            del usage[extruder_nr]
+
+    def __updateNode(self, node: SceneNode) -> None:
+        if node is self._root or node.hasChildren() or node.getParent() is None:
+            # structure changed, or node was removed
+            self._dirty = True
+            return
+
+        self.__removeNode(node)
+        self.__addNode(node)
+
+    def _onSceneChanged(self, node: SceneNode) -> None:
+        with self._lock:
+            if not self._dirty:
+                self.__updateNode(node)
+
+    def _onSelectedObjectExtrudersChanged(self) -> None:
+        # extruder of the selected nodes changed, which isn't a scene change
+        with self._lock:
+            if self._dirty:
+                return
+            try:
+                for node in Selection.getAllSelectedObjects():
+                    for child in DepthFirstIterator(node):
+                        self.__updateNode(child)
+            except Exception:
+                Logger.logException("w", "Failed to update extruder usage")
+                self._dirty = True
@@ -0,0 +1,212 @@
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .GCodeScanner import GCodeScanner
+
+# decimals kept per parameter, CuraEngine writes the same by default
+DEFAULT_PRECISION = {
+    "X": 3,
+    "Y": 3,
+    "Z": 3,
+    "E": 5,
+    "F": 0,
+}
+
+# comments that are kept, the printer and the layer index use them
+_KEPT_COMMENTS = (";LAYER:",)
+
+# G-codes that don't change the position
+_NON_MOTION = frozenset(("G4", "G20", "G21", "G90", "G91", "G92"))
+
+
+class GCodeCompactor:
+    """Streaming compaction of G-code chunks, as Cura puts them in gcode_list.
+
+    After the CuraEngine header (up to ";Generated with Cura_SteamEngine"):
+
+    - comments are stripped, except ;LAYER: markers
+    - X, Y, Z, F and absolute E of G0/G1 moves that equal the modal state are
+      dropped, moves that are left with no parameters are dropped
+    - numbers are rounded to the precision of their axis, trailing zeros
+      are trimmed
+
+    The modal state is tracked across chunks; lines split across chunks are
+    carried over to the next one. Positions are forgotten on relative
+    positioning (G91). The whole modal state (positions, F and E) is
+    forgotten on tool changes and other motion commands like G2/G3 arcs
+    or G28, which may set F and E the compactor doesn't track.
+    """
+
+    def __init__(self, precision: Optional[Dict[str, int]] = None) -> None:
+        self._precision = dict(DEFAULT_PRECISION)
+        if precision:
+            self._precision.update(precision)
+        self._formats = {axis: "{{:.{}f}}".format(digits) for axis, digits in self._precision.items()}
+
+        self._state = {}  # type: Dict[str, str]  # axis -> last value, as written
+        self._relative = False  # G91
+        self._relative_e = False  # M83
+
+        self._in_header = True
+        self._partial_line = ""
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.time = 0.  # seconds spent
+
+    @property
+    def reduction(self) -> float:
+        """Fraction of the input that was removed."""
+        return 1. - self.bytes_out / self.bytes_in if self.bytes_in else 0.
+
+    def feed(self, gcode: str) -> str:
+        start = time.perf_counter()
+
+        self.bytes_in += len(gcode)
+        if self._partial_line:
+            gcode = self._partial_line + gcode
+            self._partial_line = ""
+
+        end = gcode.rfind("\n") + 1
+        if end < len(gcode):
+            self._partial_line = gcode[end:]
+            gcode = gcode[:end]
+
+        result = self.__compact(gcode)
+        self.bytes_out += len(result)
+        self.time += time.perf_counter() - start
+        return result
+
+    def finish(self) -> str:
+        """Compact the last line if the G-code doesn't end with a newline."""
+        line, self._partial_line = self._partial_line, ""
+        if not line:
+            return ""
+
+        start = time.perf_counter()
+        result = self.__compact(line + "\n")[:-1]
+        self.bytes_out += len(result)
+        self.time += time.perf_counter() - start
+        return result
+
+    def __compact(self, gcode: str) -> str:
+        lines = gcode.split("\n")
+        lines.pop()  # empty, after the last newline
+
+        output = []
+        append = output.append
+        compact_line = self.__compactLine
+        if self._in_header:
+            for position, line in enumerate(lines):
+                append(line)
+                if line.startswith(GCodeScanner.HEADER_END):
+                    self._in_header = False
+                    lines = lines[position + 1:]
+                    break
+            else:
+                lines = []
+
+        for line in lines:
+            line = compact_line(line)
+            if line:
+                append(line)
+
+        if not output:
+            return ""
+        output.append("")
+        return "\n".join(output)
+
+    def __compactLine(self, line: str) -> str:
+        comment = line.find(";")
+        if comment >= 0:
+            if line.startswith(_KEPT_COMMENTS):
+                return line
+            line = line[:comment]
+
+        words = line.split()
+        if not words:
+            return ""
+
+        command = words[0]
+        if command == "G1" or command == "G0":
+            return self.__compactMove(command, words)
+
+        if command[0] == "T":
+            self._state.clear()
+        elif command == "M82":
+            self._relative_e = False
+        elif command == "M83":
+            self._relative_e = True
+        elif command == "G90":
+            self._relative = False
+        elif command == "G91":
+            self._relative = True
+            self.__forgetPosition()
+        elif command == "G92":
+            for word in words[1:]:
+                axis = word[0]
+                if axis in self._formats:
+                    self._state[axis] = self.__trim(axis, word[1:])
+        elif command[0] == "G" and command not in _NON_MOTION:
+            self._state.clear()
+
+        return " ".join(words)
+
+    def __compactMove(self, command: str, words: List[str]) -> str:
+        state = self._state
+        precision = self._precision
+        relative = self._relative
+        relative_e = self._relative_e
+        output = [command]
+        for word in words[1:]:
+            axis = word[0]
+            digits = precision.get(axis)
+            if digits is None:
+                output.append(word)
+                continue
+
+            value = word[1:]
+            dot = value.find(".")
+            if dot < 0 or len(value) - dot - 1 > digits or value[-1] == "0":
+                value = self.__trim(axis, value)
+                word = axis + value
+
+            if (relative and axis != "F") or (relative_e and axis == "E"):
+                output.append(word)
+            elif state.get(axis) != value:
+                state[axis] = value
+                output.append(word)
+
+        if len(output) == 1:
+            return ""  # nothing left to do
+        return " ".join(output)
+
+    def __trim(self, axis: str, value: str) -> str:
+        dot = value.find(".")
+        if dot < 0 and value.isdigit():
+            return value  # integer, nothing to trim
+        if dot < 0 or len(value) - dot - 1 > self._precision[axis]:
+            try:
+                value = self._formats[axis].format(float(value))
+            except ValueError:
+                return value
+
+        if "." in value:
+            value = value.rstrip("0").rstrip(".")
+        if value == "-0" or value == "":
+            value = "0"
+        return value
+
+    def __forgetPosition(self) -> None:
+        for axis in ("X", "Y", "Z"):
+            self._state.pop(axis, None)
+
+
+def compact_gcode(gcode_list: Iterable[str], compactor: Optional[GCodeCompactor] = None) -> Iterator[str]:
+    """Compact G-code chunk by chunk, yields one compacted chunk per input chunk."""
+    compactor = compactor or GCodeCompactor()
+    for gcode in gcode_list:
+        yield compactor.feed(gcode)
+    tail = compactor.finish()
+    if tail:
+        yield tail
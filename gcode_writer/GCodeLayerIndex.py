@@ -0,0 +1,79 @@
+import re
+from typing import Dict, List
+
+# events that start a layer or change the extruder
+_EVENTS = re.compile(r"(?:;LAYER:(-?\d+)|T(\d+))")
+# Events are rare, their lines are found with str.find instead of running the
+# regex on every line. Single characters are found with memchr, which is a lot
+# faster than searching for a longer prefix.
+_EVENT_CHARS = (";", "T")
+
+
+class GCodeLayerIndex:
+    """Layer and tool change statistics of a G-code file, collected while scanning the chunks.
+
+    Counts the ;LAYER: markers and the tool changes to each extruder, for
+    the header. Only lines that start with one of _EVENT_CHARS are parsed.
+    Filament used per extruder isn't counted here, CuraEngine writes it in
+    its header, see SnapmakerGCodeWriter.
+
+    Chunks are scanned line by line, a line split across chunks is held
+    back until it's complete, finish() scans the last one.
+    """
+
+    def __init__(self) -> None:
+        self.tool_changes = {}  # type: Dict[int, int]  # extruder -> changes to it
+
+        self._layer_count = 0
+        self._extruder = 0
+
+        self._partial_line = ""  # last line of the previous chunk, not complete yet
+
+    @property
+    def layerCount(self) -> int:
+        return self._layer_count
+
+    def feed(self, gcode: str) -> None:
+        """Collect statistics of the next chunk."""
+        if self._partial_line:
+            gcode = self._partial_line + gcode
+
+        end = gcode.rfind("\n") + 1
+        self._partial_line = gcode[end:]
+        if end:
+            self._feedLines(gcode[:end] if self._partial_line else gcode)
+
+    def finish(self) -> None:
+        """Scan the last line if the G-code doesn't end with a newline."""
+        if self._partial_line:
+            gcode, self._partial_line = self._partial_line, ""
+            self._feedLines(gcode)
+
+    def _feedLines(self, gcode: str) -> None:
+        for position in self._findEvents(gcode):
+            match = _EVENTS.match(gcode, position)
+            if not match:
+                continue
+
+            layer, tool = match.groups()
+            if layer is not None:
+                self._layer_count += 1
+            else:
+                tool = int(tool)
+                if tool != self._extruder:
+                    self.tool_changes[tool] = self.tool_changes.get(tool, 0) + 1
+                    self._extruder = tool
+
+    @staticmethod
+    def _findEvents(gcode: str) -> List[int]:
+        """Start of the lines that may hold an event, in order."""
+        positions = []
+        for char in _EVENT_CHARS:
+            position = gcode.find(char)
+            while position >= 0:
+                if position == 0 or gcode[position - 1] == "\n":
+                    positions.append(position)
+                position = gcode.find(char, position + 1)
+
+        positions.sort()
+        return positions
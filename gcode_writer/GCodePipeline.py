@@ -0,0 +1,80 @@
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Stage of the pipeline: takes G-code chunks, yields G-code chunks. Stages
+# are usually generators, they see one chunk at a time and may hold back
+# what they need, e.g. a line split across chunks or the moves of an arc.
+Stage = Callable[[Iterable[str]], Iterable[str]]
+
+
+class GCodePipeline:
+    """Chain of streaming stages the G-code body passes through on its way to the stream.
+
+    All stages run in a single pass over gcode_list, chunk by chunk, so
+    filters don't reload the whole file, and memory is bounded by what the
+    stages hold back. Time is recorded per stage, without the time spent
+    in the stages before it.
+    """
+
+    def __init__(self, stages: Optional[Iterable[Tuple[str, Stage]]] = None) -> None:
+        self._stages = list(stages or [])  # type: List[Tuple[str, Stage]]
+        self._times = []  # type: List[float]  # seconds spent up to and including a stage
+
+    def __bool__(self) -> bool:
+        return bool(self._stages)
+
+    def addStage(self, name: str, stage: Stage) -> None:
+        """Add a stage, it gets the output of the stages added before."""
+        self._stages.append((name, stage))
+
+    def getTimings(self) -> Dict[str, float]:
+        """Time (in seconds) each stage took in the last run."""
+        return {name: self._times[i + 1] - self._times[i] for i, (name, _) in enumerate(self._stages)}
+
+    def run(self, gcode_list: Iterable[str]) -> Iterator[str]:
+        self._times = [0.] * (len(self._stages) + 1)
+
+        chunks = _timed(gcode_list, self._times, 0)
+        for i, (_, stage) in enumerate(self._stages):
+            chunks = _timed(stage(chunks), self._times, i + 1)
+        return chunks
+
+
+class GCodeStageRegistry:
+    """Post-processing stages every SnapmakerGCodeWriter passes the G-code body through.
+
+    Writers are created in many places (output devices, the upload queue,
+    Cura's writer registry), so stages are registered here, e.g. by another
+    plugin, and every write reads them when it starts.
+    """
+
+    _stages = []  # type: List[Tuple[str, Stage]]
+
+    @classmethod
+    def register(cls, name: str, stage: Stage) -> None:
+        """Add a stage, it gets the output of the stages registered before. Replaces a stage of the same name."""
+        stages = [(stage_name, registered) for stage_name, registered in cls._stages if stage_name != name]
+        stages.append((name, stage))
+        cls._stages = stages  # replaced as a whole, writes read it from their own threads
+
+    @classmethod
+    def unregister(cls, name: str) -> None:
+        cls._stages = [(stage_name, stage) for stage_name, stage in cls._stages if stage_name != name]
+
+    @classmethod
+    def getStages(cls) -> List[Tuple[str, Stage]]:
+        return list(cls._stages)
+
+
+def _timed(chunks: Iterable[str], times: List[float], index: int) -> Iterator[str]:
+    """Add the time spent producing each chunk to times[index]."""
+    iterator = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            times[index] += time.perf_counter() - start
+            return
+        times[index] += time.perf_counter() - start
+        yield chunk
@@ -0,0 +1,80 @@
+from typing import Dict, Iterable, Optional
+
+from .GCodeLayerIndex import GCodeLayerIndex
+
+
+class GCodeScanner:
+    """Single pass scanner over G-code chunks, as Cura puts them in gcode_list.
+
+    Lines are counted with str.count, no per-line strings are created. The
+    ;KEY:value pairs of the header are only parsed until the line
+    ";Generated with Cura_SteamEngine", where the CuraEngine header ends.
+
+    ;FLAVOR:Marlin\n;TIME:6183\n;Filament used: 3.21557m, 0m\n;Layer height: 0.1\n;MINX:136.734\n...
+
+    If a layer index is given, layer and tool change statistics are
+    collected as well.
+    """
+
+    HEADER_END = ";Generated with Cura_SteamEngine"
+
+    def __init__(self, layer_index: Optional[GCodeLayerIndex] = None) -> None:
+        self.line_count = 0
+        self.header = {}  # type: Dict[str, str]
+        self.layer_index = layer_index
+
+        self._in_header = True
+        self._partial_line = ""  # header line split across chunks
+
+    @property
+    def headerComplete(self) -> bool:
+        return not self._in_header
+
+    def feed(self, gcode: str) -> None:
+        if self.layer_index is not None:
+            self.layer_index.feed(gcode)
+        self.line_count += gcode.count("\n")
+
+        if self._in_header:
+            self._scanHeader(gcode)
+
+    def _scanHeader(self, gcode: str) -> None:
+        start = 0
+        while self._in_header:
+            end = gcode.find("\n", start)
+            if end < 0:
+                self._partial_line += gcode[start:]
+                return
+
+            line = gcode[start:end]
+            if self._partial_line:
+                line = self._partial_line + line
+                self._partial_line = ""
+            start = end + 1
+
+            self._parseLine(line)
+
+    def _parseLine(self, line: str) -> None:
+        if line.startswith(self.HEADER_END):  # header ends
+            self._in_header = False
+            return
+
+        if line.startswith(";") and ":" in line:
+            key, value = line[1:].strip().split(":", 1)
+            self.header[key] = value.strip()
+
+    def finish(self) -> None:
+        """Parse the last header line if the G-code doesn't end with a newline."""
+        if self.layer_index is not None:
+            self.layer_index.finish()
+        if self._in_header and self._partial_line:
+            line, self._partial_line = self._partial_line, ""
+            self._parseLine(line)
+
+
+def scan_gcode(gcode_list: Iterable[str], layer_index: Optional[GCodeLayerIndex] = None) -> GCodeScanner:
+    scanner = GCodeScanner(layer_index)
+    for gcode in gcode_list:
+        scanner.feed(gcode)
+    scanner.finish()
+    return scanner
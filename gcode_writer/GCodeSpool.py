@@ -0,0 +1,222 @@
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import zlib
+from typing import Optional
+
+COMPRESSION_GZIP = "gzip"
+
+
+class GCodeSpool:
+    """Disk-backed stream that G-code is written to before it's sent.
+
+    Writers write text to it like to any text stream, every chunk is encoded
+    and appended to a temporary file right away. Once writing is done, the
+    file is memory-mapped, uploads read from the mapping (which is backed by
+    the OS page cache) instead of holding copies of the whole job in memory.
+
+    With compression set to COMPRESSION_GZIP, chunks are compressed (zlib,
+    at the given level) as they are written, the file holds what's sent over
+    the wire. Segments are compressed on their own and appended as separate
+    gzip members, which is valid gzip (RFC 1952) that decompresses to the
+    concatenated text.
+
+    The MD5 of the spooled bytes is computed while they are written, so it's
+    ready as soon as writing is done, without another pass before sending.
+
+    A finished spool may be shared, e.g. by the uploads of a group send,
+    every holder retains it and closes it when done, the file is removed
+    with the last of them.
+
+    With path set, a spool file kept from before (e.g. queued uploads
+    across a restart) is opened read-only, it's hashed once on opening,
+    unless its md5 is given (e.g. saved along with it).
+    """
+
+    def __init__(self, directory: Optional[str] = None, compression: Optional[str] = None,
+                 compression_level: int = 6, path: Optional[str] = None, md5: Optional[str] = None) -> None:
+        if compression not in (None, COMPRESSION_GZIP):
+            raise ValueError("Unsupported compression: {}".format(compression))
+
+        if path is None:
+            fd, self._path = tempfile.mkstemp(prefix="snapmaker_", suffix=".gcode", dir=directory)
+            self._file = os.fdopen(fd, "wb")
+        else:
+            self._path = path
+            self._file = None  # written already
+        self._size = 0
+        self._raw_size = 0
+        self._md5 = hashlib.md5()
+        self._known_md5 = md5 if path is not None else None  # type: Optional[str]
+
+        self._compression = compression
+        self._compression_level = compression_level
+        self._compressor = None
+
+        self._mmap = None  # type: Optional[mmap.mmap]
+        self._references = 1
+        self._closed = False
+
+        if path is not None:
+            if md5 is None:
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        self._md5.update(chunk)
+                        self._size += len(chunk)
+            else:
+                self._size = os.path.getsize(path)
+            if compression is None:
+                self._raw_size = self._size
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def size(self) -> int:
+        """Size of the spooled (encoded, and maybe compressed) G-code in bytes."""
+        return self._size
+
+    @property
+    def md5(self) -> str:
+        """MD5 (hex) of the spooled bytes, finishes writing."""
+        self.finish()
+        return self._known_md5 or self._md5.hexdigest()
+
+    @property
+    def rawSize(self) -> int:
+        """Size of the encoded G-code before compression, 0 if unknown (opened compressed spool file)."""
+        return self._raw_size
+
+    @property
+    def compression(self) -> Optional[str]:
+        return self._compression
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def writable(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: str) -> int:
+        encoded = data.encode("utf-8")
+        self._raw_size += len(encoded)
+        if self._compression:
+            if self._compressor is None:
+                self._compressor = zlib.compressobj(self._compression_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            encoded = self._compressor.compress(encoded)
+        self.__append(encoded)
+        return len(data)
+
+    def __append(self, data: bytes) -> None:
+        self._file.write(data)
+        self._md5.update(data)
+        self._size += len(data)
+
+    def __finishMember(self) -> None:
+        if self._compressor is not None:
+            self.__append(self._compressor.flush())
+            self._compressor = None
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def createSegment(self) -> "GCodeSpool":
+        """Create a spool that can be written independently, e.g. from another thread.
+
+        Its content is added to the end of this spool by appendSegment().
+        """
+        return GCodeSpool(os.path.dirname(self._path), self._compression, self._compression_level)
+
+    def appendSegment(self, segment: "GCodeSpool") -> None:
+        """Append the content of a segment and close it.
+
+        The copy is done by the kernel where possible (copy_file_range),
+        data isn't read into Python. MD5 can't be combined from parts, the
+        segment is hashed from a mapping of its file (in the page cache)
+        as it's appended.
+        """
+        segment.finish()
+        self.__finishMember()
+        self._file.flush()
+        with open(segment.path, "rb") as source:
+            if segment.size:
+                with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                    self._md5.update(mapping)
+            _copy_file(source, self._file, segment.size)
+        self._size += segment.size
+        self._raw_size += segment.rawSize
+        segment.close()
+
+    def finish(self) -> None:
+        """Finish writing, the spool is read-only from now on."""
+        if self._file is not None:
+            self.__finishMember()
+            self._file.close()
+            self._file = None
+
+    def getbuffer(self) -> memoryview:
+        """Get a read-only view of the spooled G-code."""
+        self.finish()
+        if self._size == 0:
+            return memoryview(b"")  # empty files can't be mapped
+
+        if self._mmap is None:
+            with open(self._path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def retain(self) -> "GCodeSpool":
+        """Add a holder of the spool, which closes it when done with it."""
+        if self._closed:
+            raise ValueError("Spool is closed")
+        self._references += 1
+        return self
+
+    def close(self) -> None:
+        """Release the mapping and remove the spool file, once the last holder closes it."""
+        if self._closed:
+            return
+        self._references -= 1
+        if self._references > 0:
+            return
+        self._closed = True
+
+        self.finish()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # views are still alive, the mapping is released with the last of them
+                pass
+            self._mmap = None
+
+        try:
+            os.remove(self._path)
+        except OSError:
+            # still mapped on Windows, it's in the temporary directory anyway
+            pass
+
+
+def _copy_file(source, destination, count: int) -> None:
+    copy_file_range = getattr(os, "copy_file_range", None)  # Linux only
+    if copy_file_range is not None:
+        try:
+            in_fd = source.fileno()
+            out_fd = destination.fileno()
+            while count > 0:
+                copied = copy_file_range(in_fd, out_fd, count)
+                if copied == 0:
+                    break
+                count -= copied
+        except OSError:
+            pass  # not supported by the file system, copy the rest in user space
+        destination.seek(0, os.SEEK_END)  # sync the file object with the descriptor
+        if count == 0:
+            return
+
+    shutil.copyfileobj(source, destination, 1024 * 1024)
@@ -0,0 +1,208 @@
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+_FIELD = re.compile(r"\{(\w+)")
+
+
+class Section:
+    """Lines of a header template.
+
+    per_extruder: lines are repeated for every extruder, fields refer to
+        values of that extruder
+    when: name of a flag, the section is only rendered if the flag is set
+    """
+
+    def __init__(self, *lines: str, per_extruder: bool = False, when: Optional[str] = None) -> None:
+        self.lines = lines
+        self.per_extruder = per_extruder
+        self.when = when
+
+
+class HeaderFormat:
+    """Header of a G-code flavour, as template.
+
+    Fields are filled in with str.format syntax from the context built by
+    the writer, see SnapmakerGCodeWriter. Templates are compiled to a single
+    format string per extruder count and set of flags, so rendering is one
+    format_map() call.
+
+    Settings a format needs are declared, the writer fetches them for all
+    registered formats in one pass:
+
+    global_keys: values of the global stack, fields {key}
+    extruder_keys: values of each extruder stack, fields {key} in per_extruder sections
+    active_extruder_keys: values of the active extruder, fields {active_key},
+        floats if they can be converted
+
+    fields holds the names of all fields in the template, so the writer
+    only computes values that are used.
+    """
+
+    def __init__(self, name: str, version: int, sections: Sequence[Section],
+                 global_keys: Iterable[str] = (), extruder_keys: Iterable[str] = (),
+                 active_extruder_keys: Iterable[str] = (), thumbnail: bool = True) -> None:
+        self.name = name
+        self.version = version
+        self.sections = tuple(sections)
+        self.global_keys = tuple(global_keys)
+        self.extruder_keys = tuple(extruder_keys)
+        self.active_extruder_keys = tuple(active_extruder_keys)
+        self.thumbnail = thumbnail
+        self.fields = frozenset(field for section in self.sections for line in section.lines
+                                for field in _FIELD.findall(line))
+
+        self._compiled = {}  # type: Dict[Tuple[int, FrozenSet[str]], str]
+
+    def compile(self, extruder_count: int, flags: FrozenSet[str] = frozenset()) -> str:
+        key = (extruder_count, flags)
+        template = self._compiled.get(key)
+        if template is None:
+            lines = []  # type: List[str]
+            for section in self.sections:
+                if section.when is not None and section.when not in flags:
+                    continue
+                if not section.per_extruder:
+                    lines.extend(section.lines)
+                    continue
+                for i in range(extruder_count):
+                    lines.extend(_FIELD.sub(r"{extruders[%d][\1]" % i, line) for line in section.lines)
+            lines.append("")  # header ends with a newline
+
+            template = self._compiled[key] = "\n".join(lines)
+        return template
+
+    def render(self, context: Dict[str, Any], flags: FrozenSet[str] = frozenset()) -> str:
+        """Render header, context["extruders"] holds a dict of values per extruder."""
+        return self.compile(len(context["extruders"]), flags).format_map(context)
+
+
+class HeaderFormatRegistry:
+    """Header formats by header version, see header_version in config.py."""
+
+    _formats = {}  # type: Dict[int, HeaderFormat]
+    _revision = 0
+
+    @classmethod
+    def register(cls, header_format: HeaderFormat) -> None:
+        cls._formats[header_format.version] = header_format
+        cls._revision += 1
+
+    @classmethod
+    def get(cls, version: int) -> Optional[HeaderFormat]:
+        return cls._formats.get(version)
+
+    @classmethod
+    def getFormats(cls) -> List[HeaderFormat]:
+        return list(cls._formats.values())
+
+    @classmethod
+    def getRevision(cls) -> int:
+        """Changes with every registration, to notice that more settings are needed."""
+        return cls._revision
+
+    @classmethod
+    def getGlobalKeys(cls) -> Tuple[str, ...]:
+        return _union(header_format.global_keys for header_format in cls._formats.values())
+
+    @classmethod
+    def getExtruderKeys(cls) -> Tuple[str, ...]:
+        return _union(header_format.extruder_keys for header_format in cls._formats.values())
+
+    @classmethod
+    def getActiveExtruderKeys(cls) -> Tuple[str, ...]:
+        return _union(header_format.active_extruder_keys for header_format in cls._formats.values())
+
+
+def _union(key_lists: Iterable[Tuple[str, ...]]) -> Tuple[str, ...]:
+    keys = {}
+    for key_list in key_lists:
+        keys.update(dict.fromkeys(key_list))
+    return tuple(keys)
+
+
+_EXTRUDER_SECTION = Section(
+    ";Extruder {position} Nozzle Size:{machine_nozzle_size}",
+    ";Extruder {position} Material:{material_name}",
+    ";Extruder {position} Print Temperature:{material_print_temperature}",
+    ";Extruder {position} Retraction Distance:{retraction_amount}",
+    ";Extruder {position} Switch Retraction Distance:{switch_extruder_retraction_amount}",
+    per_extruder=True,
+)
+
+_EXTRUDER_KEYS = (
+    "machine_nozzle_size",
+    "material_print_temperature",
+    "retraction_amount",
+    "switch_extruder_retraction_amount",
+)
+
+HEADER_FORMAT_V1 = HeaderFormat("Snapmaker V1", 1, [
+    Section(
+        ";Header Start",
+        ";Version:1",
+        ";Slicer:CuraEngine",
+        ";Printer:{machine_name}",
+        ";Estimated Print Time:{estimated_time}",
+        ";Lines:{line_count}",
+        ";Extruder Mode:{extruder_mode}",
+    ),
+    _EXTRUDER_SECTION,
+    Section(
+        ";Bed Temperature:{material_bed_temperature_layer_0}",
+        ";Extruder(s) Used:{extruders_used}",
+    ),
+    Section(";Layer Count:{layer_count}", when="gcode_info"),
+    Section(
+        ";Extruder {position} Filament Used:{filament_used:.2f}",
+        ";Extruder {position} Tool Changes:{tool_changes}",
+        per_extruder=True, when="gcode_info",
+    ),
+    Section(
+        ";Work Range - Min X:{min_x}",
+        ";Work Range - Min Y:{min_y}",
+        ";Work Range - Min Z:{min_z}",
+        ";Work Range - Max X:{max_x}",
+        ";Work Range - Max Y:{max_y}",
+        ";Work Range - Max Z:{max_z}",
+        when="bbox",
+    ),
+    Section(
+        ";Thumbnail:{thumbnail}",
+        ";Header End",
+    ),
+], global_keys=("machine_name", "material_bed_temperature_layer_0"), extruder_keys=_EXTRUDER_KEYS)
+
+HEADER_FORMAT_LEGACY = HeaderFormat("Snapmaker 2.0", 0, [
+    Section(
+        ";Header Start",
+
+        # legacy keys
+        ";header_type: 3dp",
+        ";file_total_lines: {line_count}",
+        ";estimated_time(s): {estimated_time:.02f}",
+        ";nozzle_temperature(°C): {active_material_print_temperature:.0f}",
+        ";build_plate_temperature(°C): {active_material_bed_temperature:.0f}",
+        ";work_speed(mm/minute): {active_speed_infill:.0f}",
+
+        # keys for Version 1
+        ";Printer:{machine_name}",
+    ),
+    _EXTRUDER_SECTION,
+    Section(
+        ";min_x(mm): {min_x}",
+        ";min_y(mm): {min_y}",
+        ";min_z(mm): {min_z}",
+        ";max_x(mm): {max_x}",
+        ";max_y(mm): {max_y}",
+        ";max_z(mm): {max_z}",
+        when="bbox",
+    ),
+    Section(
+        ";thumbnail: {thumbnail}",
+        ";Header End",
+    ),
+], global_keys=("machine_name",), extruder_keys=_EXTRUDER_KEYS,
+    active_extruder_keys=("material_print_temperature", "material_bed_temperature", "speed_infill"))
+
+HeaderFormatRegistry.register(HEADER_FORMAT_V1)
+HeaderFormatRegistry.register(HEADER_FORMAT_LEGACY)
@@ -0,0 +1,136 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+from UM.Logger import Logger
+
+from cura.CuraApplication import CuraApplication
+from cura.Settings.ExtruderManager import ExtruderManager
+from .HeaderFormats import HeaderFormatRegistry
+
+
+class ExtruderSettings:
+
+    def __init__(self, position: int, material_name: str, values: Dict[str, Any]) -> None:
+        self.position = position
+        self.material_name = material_name
+        self.values = values
+
+    def getValue(self, key: str) -> Any:
+        return self.values.get(key)
+
+
+class SettingsSnapshot:
+    """Settings used by the G-code headers, fetched in one pass.
+
+    Every getProperty() call resolves through Cura's container stack chain,
+    the header builders used to call it for each key and extruder on every
+    export. The snapshot fetches all keys the registered header formats
+    need once, and is reused until a setting, container or the global stack
+    changes, or another header format is registered. Changes are only seen
+    once watch() has been called (on the Qt thread), snapshots aren't
+    reused before.
+    """
+
+    _snapshot = None  # type: Optional[SettingsSnapshot]
+    _lock = threading.RLock()
+    _watched_stacks = []  # type: List[Any]
+    _signals_connected = False
+
+    def __init__(self) -> None:
+        global_stack = CuraApplication.getInstance().getGlobalContainerStack()
+        self.revision = HeaderFormatRegistry.getRevision()
+
+        self.global_values = {key: global_stack.getProperty(key, "value")
+                              for key in HeaderFormatRegistry.getGlobalKeys()}
+
+        self.extruders = []  # type: List[ExtruderSettings]
+        for extruder in global_stack.extruderList:
+            values = {key: extruder.getProperty(key, "value") for key in HeaderFormatRegistry.getExtruderKeys()}
+            self.extruders.append(ExtruderSettings(extruder.position, extruder.material.getName(), values))
+
+        self.active_extruder_values = {}  # type: Dict[str, str]
+        extruder_stack = ExtruderManager.getInstance().getActiveExtruderStack()
+        if extruder_stack:
+            for key in HeaderFormatRegistry.getActiveExtruderKeys():
+                self.active_extruder_values[key] = self.__formatValue(extruder_stack, key)
+
+    @staticmethod
+    def __formatValue(extruder_stack, key: str) -> str:
+        type_ = extruder_stack.getProperty(key, "type")
+        value_ = extruder_stack.getProperty(key, "value")
+
+        if str(type_) == "float":
+            value = "{:.4f}".format(value_).rstrip("0").rstrip(".")
+        else:
+            if str(type_) == "enum":
+                options_ = extruder_stack.getProperty(key, "options")
+                value = options_[str(value_)]
+            else:
+                value = str(value_)
+
+        return value
+
+    def getGlobalValue(self, key: str) -> Any:
+        return self.global_values.get(key)
+
+    def getActiveExtruderValue(self, key: str) -> str:
+        """Value of the active extruder, formatted by setting type."""
+        return self.active_extruder_values[key]
+
+    @classmethod
+    def getInstance(cls) -> "SettingsSnapshot":
+        """Get the current snapshot, take a new one if settings changed since the last one."""
+        with cls._lock:
+            if not cls._signals_connected:
+                return SettingsSnapshot()  # changes aren't seen, don't keep it
+            if cls._snapshot is None or cls._snapshot.revision != HeaderFormatRegistry.getRevision():
+                cls._snapshot = SettingsSnapshot()
+            return cls._snapshot
+
+    @classmethod
+    def invalidate(cls, *args, **kwargs) -> None:
+        with cls._lock:
+            cls._snapshot = None
+
+    @classmethod
+    def watch(cls) -> None:
+        """Watch settings for changes, call it on the Qt thread."""
+        if cls._signals_connected:
+            return
+
+        CuraApplication.getInstance().globalContainerStackChanged.connect(cls.__onStacksChanged)
+        # extruder stacks are set up after the global stack changes
+        ExtruderManager.getInstance().activeExtruderChanged.connect(cls.__onStacksChanged)
+        with cls._lock:
+            cls.__watchStacks()
+            cls._signals_connected = True
+
+    @classmethod
+    def __watchStacks(cls) -> None:
+        application = CuraApplication.getInstance()
+        global_stack = application.getGlobalContainerStack()
+        stacks = [global_stack] + list(global_stack.extruderList) if global_stack else []
+        if stacks == cls._watched_stacks:
+            return
+
+        cls.__disconnectStacks()
+        for stack in stacks:
+            stack.propertyChanged.connect(cls.invalidate)
+            stack.containersChanged.connect(cls.invalidate)
+        cls._watched_stacks = stacks
+
+    @classmethod
+    def __disconnectStacks(cls) -> None:
+        for stack in cls._watched_stacks:
+            try:
+                stack.propertyChanged.disconnect(cls.invalidate)
+                stack.containersChanged.disconnect(cls.invalidate)
+            except Exception:
+                Logger.logException("w", "Failed to disconnect from container stack")
+        cls._watched_stacks = []
+
+    @classmethod
+    def __onStacksChanged(cls) -> None:
+        with cls._lock:
+            cls._snapshot = None
+            cls.__watchStacks()
@@ -1,48 +1,116 @@
-import base64
-from typing import List
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
-from PyQt6.QtCore import QBuffer
 from UM.Application import Application
 from UM.FileHandler.FileWriter import FileWriter
 from UM.Logger import Logger
 from UM.Math.AxisAlignedBox import AxisAlignedBox
 from UM.Math.Vector import Vector
 from UM.Mesh.MeshWriter import MeshWriter
-from UM.Scene.Iterator.DepthFirstIterator import DepthFirstIterator
 from UM.i18n import i18nCatalog
 
 from cura.CuraApplication import CuraApplication
-from cura.Settings.ExtruderManager import ExtruderManager
-from cura.Snapshot import Snapshot
-from cura.Utils.Threading import call_on_qt_thread
 from ..config import SNAPMAKER_DISCOVER_MACHINES
+from .ExtruderUsageIndex import ExtruderUsageIndex
+from .GCodeCompactor import GCodeCompactor, compact_gcode
+from .GCodeLayerIndex import GCodeLayerIndex
+from .GCodePipeline import GCodePipeline, GCodeStageRegistry
+from .GCodeScanner import GCodeScanner, scan_gcode
+from .GCodeSpool import GCodeSpool
+from .HeaderFormats import HeaderFormat, HeaderFormatRegistry
+from .SettingsSnapshot import SettingsSnapshot
+from .Thumbnail import THUMBNAIL_FORMAT, THUMBNAIL_SIZE, generate_thumbnail
 
 catalog = i18nCatalog("cura")
 
 
 class GCodeInfo:
 
-    def __init__(self) -> None:
+    def __init__(self, layer_index: Optional[GCodeLayerIndex] = None) -> None:
         self.bbox = AxisAlignedBox()
         self.flavor = 'Marlin'
         self.line_count = 0
+        self.extruder_filament = {}  # type: Dict[int, float]  # extruder -> mm, from ;Filament used:
+        self.layer_index = layer_index
 
 
 class SnapmakerGCodeWriter(MeshWriter):
     """GCode Writer that writes G-code in Snapmaker favour.
 
     - Add Snapmaker specific headers and thumbnail
+    - Pass the G-code body through post-processing stages, see GCodeStageRegistry
     """
 
+    EXTRUDERS_USED_SCENE = "scene"  # extruders of the nodes on the build plate
+    EXTRUDERS_USED_GCODE = "gcode"  # extruders that extrude in the G-code
+
+    # header fields taken from GCodeLayerIndex
+    LAYER_INDEX_FIELDS = frozenset(["layer_count", "tool_changes"])
+
+    # Strip comments and redundant parameters from the G-code body, see GCodeCompactor
+    PREFERENCE_KEY_COMPACT_OUTPUT = "SnapmakerPlugin/compact_gcode"
+
     def __init__(self) -> None:
         super().__init__(add_to_recent_files=True)
 
         self._extruder_mode = "Default"
         self._header_version = 1
+        self._thumbnail_size = THUMBNAIL_SIZE
+        self._thumbnail_format = THUMBNAIL_FORMAT
+
+        self._extruders_used_source = self.EXTRUDERS_USED_SCENE
+
+        self._compact_output = None  # type: Optional[bool]  # None: use the preference
+        self._compact_precision = None  # type: Optional[Dict[str, int]]
+        self._compactor = None  # type: Optional[GCodeCompactor]
+
+        self._timings = {}  # type: Dict[str, float]
 
     def setExtruderMode(self, extruder_mode: str) -> None:
         self._extruder_mode = extruder_mode
 
+    def setExtrudersUsedSource(self, source: str) -> None:
+        """Where ;Extruder(s) Used: is taken from, EXTRUDERS_USED_SCENE or EXTRUDERS_USED_GCODE."""
+        self._extruders_used_source = source
+
+    def setCompactOutput(self, compact: bool, precision: Optional[Dict[str, int]] = None) -> None:
+        """Write compact G-code, precision is the number of decimals per parameter, e.g. {"E": 4}."""
+        self._compact_output = compact
+        self._compact_precision = precision
+
+    def getCompactor(self) -> Optional[GCodeCompactor]:
+        """Compactor of the last write, with its statistics, None if output wasn't compacted."""
+        return self._compactor
+
+    def __isCompactOutput(self) -> bool:
+        if self._compact_output is not None:
+            return self._compact_output
+        preferences = Application.getInstance().getPreferences()
+        return bool(preferences.getValue(self.PREFERENCE_KEY_COMPACT_OUTPUT))
+
+    def __createPipeline(self, compact: bool) -> GCodePipeline:
+        # registered stages first, compaction runs after them
+        pipeline = GCodePipeline(GCodeStageRegistry.getStages())
+
+        self._compactor = None
+        if compact:
+            self._compactor = GCodeCompactor(self._compact_precision)
+            pipeline.addStage("compact", functools.partial(compact_gcode, compactor=self._compactor))
+        return pipeline
+
+    def getTimings(self) -> Dict[str, float]:
+        """Time (in seconds) the steps of the last write took."""
+        return dict(self._timings)
+
+    def _timed(self, name: str, func: Callable, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._timings[name] = time.perf_counter() - start
+
     def __detectHeaderVersion(self):
         global_stack = CuraApplication.getInstance().getGlobalContainerStack()
         machine_name = global_stack.getProperty("machine_name", "value")
@@ -52,6 +120,8 @@ class SnapmakerGCodeWriter(MeshWriter):
                 break
 
         self._header_version = machine.get('header_version', 1) if machine else -1
+        self._thumbnail_size = machine.get('thumbnail_size', THUMBNAIL_SIZE) if machine else THUMBNAIL_SIZE
+        self._thumbnail_format = machine.get('thumbnail_format', THUMBNAIL_FORMAT) if machine else THUMBNAIL_FORMAT
 
     def write(self, stream, node, mode=FileWriter.OutputMode.BinaryMode) -> None:
         """Writes the G-code for the entire scene to a stream.
@@ -79,248 +149,262 @@ class SnapmakerGCodeWriter(MeshWriter):
         self.setInformation(catalog.i18nc("@warning:status", "Please prepare G-code before exporting."))
         return False
 
-    @call_on_qt_thread
-    def __generateThumbnail(self) -> str:
-        """Generate thumbnail using PreviewPass.
-
-        Need to be run on Qt thread.
-        """
-        try:
-            image = Snapshot.snapshot(600, 600)
-            if not image:
-                return ""
-
-            buffer = QBuffer()
-            buffer.open(QBuffer.OpenModeFlag.ReadWrite)
-            image.save(buffer, "PNG")
-            base64_bytes = base64.b64encode(buffer.data())
-            base64_message = base64_bytes.decode("ascii")
-            buffer.close()
-
-            return "data:image/png;base64," + base64_message
-        except Exception:
-            Logger.logException("w", "Failed to create thumbnail for G-code")
-            return ""
-
-    def __parseOriginalGCode(self, gcode_list: List[str]) -> GCodeInfo:
-        """Parse Original GCode to get info.
+    def __parseOriginalGCode(self, gcode_list: List[str], layer_index: bool) -> Optional[GCodeInfo]:
+        """Parse Original GCode to get info, with a layer index if `layer_index`.
 
         ;FLAVOR:Marlin\n;TIME:6183\n;Filament used: 3.21557m, 0m\n;Layer height: 0.1\n;MINX:136.734\n;MINY:74.638\n;MINZ:0.3\n;MAXX:186.578\n;MAXY:125.365\n;MAXZ:52\n
         """
 
-        check_header_line = True
-        line_count = 0
-
-        key_value_pairs = {}
-
-        for gcode in gcode_list:
-            lines = gcode.split('\n')
-            line_count += len(lines) - 1
-
-            if check_header_line:
-                for line in lines:
-                    if line.startswith(";Generated with Cura_SteamEngine"):  # header ends
-                        check_header_line = False
-                        break
-
-                    if line.startswith(";") and ':' in line:
-                        line = line[1:].strip()
-                        key, value = line.split(":", 1)
-                        value = value.strip()
-
-                        key_value_pairs[key] = value
+        gcode_info = GCodeInfo(GCodeLayerIndex() if layer_index else None)
+        scanner = scan_gcode(gcode_list, gcode_info.layer_index)
+        return self.__fillGCodeInfo(gcode_info, scanner)
 
-        gcode_info = GCodeInfo()
-        if "FLAVOR" in key_value_pairs:
-            gcode_info.flavour = key_value_pairs["FLAVOR"]
-        if "MINX" in key_value_pairs:
-            gcode_info.bbox = AxisAlignedBox(
-                Vector(float(key_value_pairs["MINX"]), float(key_value_pairs["MINY"]), float(key_value_pairs["MINZ"])),
-                Vector(float(key_value_pairs["MAXX"]), float(key_value_pairs["MAXY"]), float(key_value_pairs["MAXZ"])),
-            )
-        gcode_info.line_count = line_count
+    @staticmethod
+    def __fillGCodeInfo(gcode_info: GCodeInfo, scanner: GCodeScanner) -> Optional[GCodeInfo]:
+        key_value_pairs = scanner.header
 
-        return gcode_info
-
-    def processGCodeList(self, stream, gcode_list: List[str]) -> None:
-        self.__detectHeaderVersion()
-
-        if self._header_version == 1:
-            self._processGCodeListV1(stream, gcode_list)
-        elif self._header_version == 0:
-            self._processGCodeListLegacy(stream, gcode_list)
-        else:
-            # Unsupported machine header, just use original
-            self._processGCodeListTransparent(stream, gcode_list)
-
-    def _processGCodeListV1(self, stream, gcode_list: List[str]) -> None:
         try:
-            gcode_info = self.__parseOriginalGCode(gcode_list)
+            if "FLAVOR" in key_value_pairs:
+                gcode_info.flavour = key_value_pairs["FLAVOR"]
+            if "MINX" in key_value_pairs:
+                gcode_info.bbox = AxisAlignedBox(
+                    Vector(float(key_value_pairs["MINX"]), float(key_value_pairs["MINY"]), float(key_value_pairs["MINZ"])),
+                    Vector(float(key_value_pairs["MAXX"]), float(key_value_pairs["MAXY"]), float(key_value_pairs["MAXZ"])),
+                )
         except KeyError:
-            gcode_info = None
-
-        print_info = CuraApplication.getInstance().getPrintInformation()
-        global_stack = CuraApplication.getInstance().getGlobalContainerStack()
-        scene = CuraApplication.getInstance().getController().getScene()
-
-        machine_name = global_stack.getProperty("machine_name", "value")
-
-        # convert Duration to int
-        estimated_time = int(print_info.currentPrintTime)
-
-        headers = [
-            ";Header Start",
-            ";Version:1",
-            ";Slicer:CuraEngine",
-            ";Printer:{}".format(machine_name),
-            ";Estimated Print Time:{}".format(estimated_time),
-            ";Lines:{}".format(gcode_info.line_count if gcode_info else 0),
-            ";Extruder Mode:{}".format(self._extruder_mode),
-        ]
-
-        for extruder in global_stack.extruderList:
-            nozzle_size = extruder.getProperty("machine_nozzle_size", "value")
-
-            material = extruder.material
-            temperature = extruder.getProperty("material_print_temperature", "value")
-
-            retraction_amount = extruder.getProperty("retraction_amount", "value")
-            switch_retraction_amount = extruder.getProperty("switch_extruder_retraction_amount", "value")
-
-            headers.append(";Extruder {} Nozzle Size:{}".format(extruder.position, nozzle_size))
-            headers.append(";Extruder {} Material:{}".format(extruder.position, material.getName()))
-            headers.append(";Extruder {} Print Temperature:{}".format(extruder.position, temperature))
-            headers.append(";Extruder {} Retraction Distance:{}".format(extruder.position, retraction_amount))
-            headers.append(";Extruder {} Switch Retraction Distance:{}".format(extruder.position, switch_retraction_amount))
-
-        bed_temperature = global_stack.getProperty("material_bed_temperature_layer_0", "value")
-        headers.append(";Bed Temperature:{}".format(bed_temperature))
+            return None
+        gcode_info.line_count = scanner.line_count
+        if "Filament used" in key_value_pairs:
+            gcode_info.extruder_filament = SnapmakerGCodeWriter.__parseFilamentUsed(key_value_pairs["Filament used"])
 
-        extruders_used = set()
-        for node in DepthFirstIterator(scene.getRoot()):
-            stack = node.callDecoration("getStack")
-            if not stack:
-                continue
-
-            extruder_nr = stack.getProperty("extruder_nr", "value")
-            extruders_used.add(int(extruder_nr))
-
-        headers.append(";Extruder(s) Used:{}".format(len(extruders_used)))
-
-        if gcode_info and gcode_info.bbox.isValid():
-            bbox = gcode_info.bbox
-            headers.extend([
-                ";Work Range - Min X:{}".format(bbox.minimum.x),
-                ";Work Range - Min Y:{}".format(bbox.minimum.y),
-                ";Work Range - Min Z:{}".format(bbox.minimum.z),
-                ";Work Range - Max X:{}".format(bbox.maximum.x),
-                ";Work Range - Max Y:{}".format(bbox.maximum.y),
-                ";Work Range - Max Z:{}".format(bbox.maximum.z),
-            ])
+        return gcode_info
 
-        thumbnail = self.__generateThumbnail()
-        headers.append(";Thumbnail:{}".format(thumbnail))
+    @staticmethod
+    def __parseFilamentUsed(value: str) -> Dict[int, float]:
+        """Filament used per extruder in mm, from CuraEngine's "3.21557m, 0m"."""
+        try:
+            return {position: float(length.strip().rstrip("m")) * 1000
+                    for position, length in enumerate(value.split(","))}
+        except ValueError:
+            Logger.warning("Can't parse filament used: %s", value)
+            return {}
+
+    def __writeGCode(self, stream, gcode_list: List[str], pipeline: GCodePipeline,
+                     build_header: Callable[[Callable[[], Optional[GCodeInfo]]], Tuple[str, Optional[GCodeInfo]]],
+                     layer_index: bool) -> None:
+        """Write header and G-code body.
+
+        build_header gets a function that returns the info of the G-code
+        body, it's called once the header needs it. The info has a layer
+        index if `layer_index`.
+
+        If the stream is a spool, the body is written to a segment of it in
+        another thread while the header (and thumbnail) is built, so export
+        takes max(header, body) instead of their sum. G-code passed through
+        the pipeline is scanned as it's written, the header waits for the
+        body then. Other streams get the body after the header, if it's
+        passed through the pipeline, it's spooled to a temporary file
+        meanwhile.
+        """
+        self._timings.clear()
+        if not isinstance(stream, GCodeSpool) and not pipeline:
+            header, gcode_info = self._timed("header", build_header,
+                                             functools.partial(self._timed, "scan", self.__parseOriginalGCode,
+                                                               gcode_list, layer_index))
+            self.__logTimings()
+            stream.write(header)
+            self.__writeBody(stream, gcode_list)
+            return
+
+        segment = stream.createSegment() if isinstance(stream, GCodeSpool) else GCodeSpool()
+        errors = []
+        body_info = []  # type: List[Optional[GCodeInfo]]
+
+        def write_body() -> None:
+            try:
+                if pipeline:
+                    body_info.append(self._timed("body", self.__writeStages, segment, gcode_list, pipeline,
+                                                   layer_index))
+                else:
+                    self._timed("body", self.__writeBody, segment, gcode_list)
+                segment.finish()
+            except Exception as e:
+                errors.append(e)
+
+        def scan() -> Optional[GCodeInfo]:
+            if not pipeline:
+                return self._timed("scan", self.__parseOriginalGCode, gcode_list, layer_index)
+            body_writer.join()
+            if errors:
+                raise errors[0]
+            return body_info[0]
+
+        body_writer = threading.Thread(target=write_body, name="SnapmakerGCodeBodyWriter", daemon=True)
+        body_writer.start()
+        try:
+            header, gcode_info = self._timed("header", build_header, scan)
+        except Exception:
+            body_writer.join()
+            segment.close()
+            raise
+        body_writer.join()
+        self.__logTimings()
+
+        if errors:
+            segment.close()
+            raise errors[0]
+
+        stream.write(header)
+        if isinstance(stream, GCodeSpool):
+            stream.appendSegment(segment)
+        else:
+            self.__copySegment(segment, stream)
+
+    def __writeStages(self, stream, gcode_list: List[str], pipeline: GCodePipeline,
+                      layer_index: bool) -> Optional[GCodeInfo]:
+        """Write the body through the pipeline, scan what's written."""
+        gcode_info = GCodeInfo(GCodeLayerIndex() if layer_index else None)
+        scanner = GCodeScanner(gcode_info.layer_index)
+        for gcode in pipeline.run(gcode_list):
+            scanner.feed(gcode)
+            stream.write(gcode)
+        scanner.finish()
 
-        headers.append(";Header End")
-        headers.append("")
+        for name, seconds in pipeline.getTimings().items():
+            self._timings["stage " + name] = seconds
+        return self.__fillGCodeInfo(gcode_info, scanner)
 
-        stream.write("\n".join(headers))
+    @staticmethod
+    def __copySegment(segment: GCodeSpool, stream) -> None:
+        segment.finish()
+        try:
+            with open(segment.path, "r", encoding="utf-8", newline="") as f:
+                while True:
+                    data = f.read(1024 * 1024)
+                    if not data:
+                        break
+                    stream.write(data)
+        finally:
+            segment.close()
 
+    @staticmethod
+    def __writeBody(stream, gcode_list: List[str]) -> None:
         for gcode in gcode_list:
             stream.write(gcode)
 
-    def __getExtruderValue(self, key) -> str:
-        extruder_stack = ExtruderManager.getInstance().getActiveExtruderStack()
+    def __logTimings(self) -> None:
+        Logger.debug("G-code header assembly took %s",
+                     ", ".join("{} {:.1f} ms".format(name, seconds * 1000) for name, seconds in self._timings.items()))
 
-        type_ = extruder_stack.getProperty(key, "type")
-        value_ = extruder_stack.getProperty(key, "value")
+    def processGCodeList(self, stream, gcode_list: List[str]) -> None:
+        self.__detectHeaderVersion()
 
-        if str(type_) == "float":
-            value = "{:.4f}".format(value_).rstrip("0").rstrip(".")
+        header_format = HeaderFormatRegistry.get(self._header_version)
+        pipeline = self.__createPipeline(header_format is not None and self.__isCompactOutput())
+        if header_format:
+            self._processGCodeListWithHeader(stream, gcode_list, pipeline, header_format)
         else:
-            if str(type_) == "enum":
-                options_ = extruder_stack.getProperty(key, "options")
-                value = options_[str(value_)]
-            else:
-                value = str(value_)
+            # Unsupported machine header, just use original
+            self._processGCodeListTransparent(stream, gcode_list, pipeline)
+        self.__logCompaction()
+
+    def __logCompaction(self) -> None:
+        if not self._compactor:
+            return
+        Logger.info("Compacted G-code from %.1f MB to %.1f MB (-%.1f%%) in %.1f ms",
+                    self._compactor.bytes_in / 1e6, self._compactor.bytes_out / 1e6,
+                    self._compactor.reduction * 100, self._compactor.time * 1000)
+
+    @staticmethod
+    def __needsLayerIndex(header_format: HeaderFormat) -> bool:
+        """Whether the header uses statistics of the G-code body, collecting them adds to the scan time."""
+        return bool(header_format.fields & SnapmakerGCodeWriter.LAYER_INDEX_FIELDS)
+
+    @staticmethod
+    def __countExtrudersInGCode(gcode_info: Optional[GCodeInfo]) -> int:
+        """Extruders that extrude filament in the G-code."""
+        if not gcode_info:
+            return 1
+        return sum(1 for filament in gcode_info.extruder_filament.values() if filament > 0)
+
+    def __countExtrudersUsed(self, gcode_info: Optional[GCodeInfo]) -> int:
+        if self._extruders_used_source == self.EXTRUDERS_USED_GCODE:
+            return self.__countExtrudersInGCode(gcode_info)
+
+        extruder_usage = ExtruderUsageIndex.getInstance()
+        if extruder_usage is None:
+            Logger.warning("Extruder usage index isn't started, count extruders in the G-code")
+            return self.__countExtrudersInGCode(gcode_info)
 
-        return value
+        active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
+        return extruder_usage.getExtrudersUsedCount(active_build_plate)
 
-    def _processGCodeListLegacy(self, stream, gcode_list: List[str]) -> None:
-        try:
-            gcode_info = self.__parseOriginalGCode(gcode_list)
-        except KeyError:
-            gcode_info = None
+    def _processGCodeListWithHeader(self, stream, gcode_list: List[str], pipeline: GCodePipeline,
+                                    header_format: HeaderFormat) -> None:
+        self.__writeGCode(stream, gcode_list, pipeline, functools.partial(self._buildHeader, header_format),
+                          self.__needsLayerIndex(header_format))
 
+    def _buildHeader(self, header_format: HeaderFormat,
+                     scan: Callable[[], Optional[GCodeInfo]]) -> Tuple[str, Optional[GCodeInfo]]:
         print_info = CuraApplication.getInstance().getPrintInformation()
-        global_stack = CuraApplication.getInstance().getGlobalContainerStack()
-
-        machine_name = global_stack.getProperty("machine_name", "value")
-
-        # convert Duration to int
-        estimated_time = int(print_info.currentPrintTime)
-
-        print_temp = float(self.__getExtruderValue("material_print_temperature"))
-        bed_temp = float(self.__getExtruderValue("material_bed_temperature")) or 0.
-        print_speed = float(self.__getExtruderValue("speed_infill"))
-
-        headers = [
-            ";Header Start",
-
-            # legacy keys
-            ";header_type: 3dp",
-            ";file_total_lines: {}".format(gcode_info.line_count if gcode_info else 0),
-            ";estimated_time(s): {:.02f}".format(estimated_time),
-            ";nozzle_temperature(°C): {:.0f}".format(print_temp),
-            ";build_plate_temperature(°C): {:.0f}".format(bed_temp),
-            ";work_speed(mm/minute): {:.0f}".format(print_speed),
-
-            # keys for Version 1
-            # ";Version:0",
-            # ";Slicer:CuraEngine",
-            ";Printer:{}".format(machine_name),
-            # ";Estimated Print Time:{}".format(estimated_time),
-            # ";Lines:{}".format(gcode_info.line_count if gcode_info else 0),
-            # ";Extruder Mode:{}".format(self._extruder_mode),
-        ]
-
-        for extruder in global_stack.extruderList:
-            nozzle_size = extruder.getProperty("machine_nozzle_size", "value")
-
-            material = extruder.material
-            temperature = extruder.getProperty("material_print_temperature", "value")
-
-            retraction_amount = extruder.getProperty("retraction_amount", "value")
-            switch_retraction_amount = extruder.getProperty("switch_extruder_retraction_amount", "value")
-
-            headers.append(";Extruder {} Nozzle Size:{}".format(extruder.position, nozzle_size))
-            headers.append(";Extruder {} Material:{}".format(extruder.position, material.getName()))
-            headers.append(";Extruder {} Print Temperature:{}".format(extruder.position, temperature))
-            headers.append(";Extruder {} Retraction Distance:{}".format(extruder.position, retraction_amount))
-            headers.append(";Extruder {} Switch Retraction Distance:{}".format(extruder.position, switch_retraction_amount))
+        settings = self._timed("settings", SettingsSnapshot.getInstance)
+
+        context = {"thumbnail": ""}
+        if header_format.thumbnail:
+            context["thumbnail"] = self._timed("thumbnail", generate_thumbnail,
+                                               self._thumbnail_size, self._thumbnail_format)
+
+        gcode_info = scan()  # may wait for the G-code body
+
+        context.update(settings.global_values)
+        context.update({
+            # convert Duration to int
+            "estimated_time": int(print_info.currentPrintTime),
+            "line_count": gcode_info.line_count if gcode_info else 0,
+            "extruder_mode": self._extruder_mode,
+            "extruders_used": self.__countExtrudersUsed(gcode_info),
+        })
+        for key, value in settings.active_extruder_values.items():
+            try:
+                context["active_" + key] = float(value)
+            except ValueError:
+                context["active_" + key] = value
+
+        extruders = []
+        for extruder in settings.extruders:
+            values = dict(extruder.values)
+            values["position"] = extruder.position
+            values["material_name"] = extruder.material_name
+            extruders.append(values)
+        context["extruders"] = extruders
+
+        flags = set()
+        if gcode_info:
+            flags.add("gcode_info")
+            layer_index = gcode_info.layer_index
+            if layer_index:
+                context["layer_count"] = layer_index.layerCount
+            for values in extruders:
+                position = int(values["position"])
+                values["filament_used"] = gcode_info.extruder_filament.get(position, 0.)
+                if layer_index:
+                    values["tool_changes"] = layer_index.tool_changes.get(position, 0)
 
         if gcode_info and gcode_info.bbox.isValid():
+            flags.add("bbox")
             bbox = gcode_info.bbox
-            headers.extend([
-                ";min_x(mm): {}".format(bbox.minimum.x),
-                ";min_y(mm): {}".format(bbox.minimum.y),
-                ";min_z(mm): {}".format(bbox.minimum.z),
-                ";max_x(mm): {}".format(bbox.maximum.x),
-                ";max_y(mm): {}".format(bbox.maximum.y),
-                ";max_z(mm): {}".format(bbox.maximum.z),
-            ])
-
-        thumbnail = self.__generateThumbnail()
-        headers.append(";thumbnail: {}".format(thumbnail))
-
-        headers.append(";Header End")
-        headers.append("")
-
-        stream.write("\n".join(headers))
-
-        for gcode in gcode_list:
-            stream.write(gcode)
-
-    def _processGCodeListTransparent(self, stream, gcode_list: List[str]) -> None:
-        for gcode in gcode_list:
+            context.update({
+                "min_x": bbox.minimum.x,
+                "min_y": bbox.minimum.y,
+                "min_z": bbox.minimum.z,
+                "max_x": bbox.maximum.x,
+                "max_y": bbox.maximum.y,
+                "max_z": bbox.maximum.z,
+            })
+
+        header = self._timed("render", header_format.render, context, frozenset(flags))
+        return header, gcode_info
+
+    def _processGCodeListTransparent(self, stream, gcode_list: List[str], pipeline: GCodePipeline) -> None:
+        for gcode in pipeline.run(gcode_list) if pipeline else gcode_list:
             stream.write(gcode)
@@ -0,0 +1,137 @@
+import base64
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PyQt6.QtCore import QBuffer
+from PyQt6.QtGui import QImage
+from UM.Logger import Logger
+from UM.Scene.Iterator.DepthFirstIterator import DepthFirstIterator
+
+from cura.CuraApplication import CuraApplication
+from cura.Snapshot import Snapshot
+from cura.Utils.Threading import call_on_qt_thread
+
+THUMBNAIL_SIZE = (600, 600)
+THUMBNAIL_FORMAT = "PNG"
+
+_MIME_TYPES = {
+    "PNG": "image/png",
+    "JPG": "image/jpeg",
+}
+
+
+def scene_fingerprint() -> str:
+    """Fingerprint of what the snapshot shows.
+
+    Snapshot places its own camera around the printable nodes, so the
+    meshes, their transformations and the colors of their extruders are
+    all that changes the picture. Meshes are told apart by a hash of
+    their vertex and index data, a reloaded or edited mesh gets a new
+    thumbnail even if its size stays the same.
+    """
+    fingerprint = hashlib.sha1()
+
+    global_stack = CuraApplication.getInstance().getGlobalContainerStack()
+    if global_stack:
+        for extruder in global_stack.extruderList:
+            fingerprint.update(str(extruder.material.getMetaDataEntry("color_code", "")).encode("utf-8"))
+
+    scene = CuraApplication.getInstance().getController().getScene()
+    for node in DepthFirstIterator(scene.getRoot()):
+        if not node.callDecoration("isSliceable") or not node.isVisible():
+            continue
+        mesh_data = node.getMeshData()
+        if not mesh_data:
+            continue
+
+        stack = node.callDecoration("getStack")
+        extruder_nr = stack.getProperty("extruder_nr", "value") if stack else 0
+        # not id(mesh_data), ids of collected meshes are reused
+        fingerprint.update("{}:{}:".format(mesh_data.getVertexCount(), extruder_nr).encode("utf-8"))
+        fingerprint.update(mesh_data.getVerticesAsByteArray() or b"")
+        if mesh_data.hasIndices():
+            fingerprint.update(mesh_data.getIndicesAsByteArray() or b"")
+        fingerprint.update(node.getWorldTransformation().getData().tobytes())
+
+    return fingerprint.hexdigest()
+
+
+class ThumbnailCache:
+    """Encoded thumbnails of the last scenes, so exporting the same scene again doesn't render again."""
+
+    MAX_SIZE = 4
+
+    _thumbnails = OrderedDict()  # type: OrderedDict[Tuple[str, int, int, str], str]
+
+    @classmethod
+    def get(cls, key: Tuple[str, int, int, str]) -> Optional[str]:
+        thumbnail = cls._thumbnails.get(key)
+        if thumbnail is not None:
+            cls._thumbnails.move_to_end(key)
+        return thumbnail
+
+    @classmethod
+    def put(cls, key: Tuple[str, int, int, str], thumbnail: str) -> None:
+        cls._thumbnails[key] = thumbnail
+        cls._thumbnails.move_to_end(key)
+        while len(cls._thumbnails) > cls.MAX_SIZE:
+            cls._thumbnails.popitem(last=False)
+
+
+@call_on_qt_thread
+def _snapshot(width: int, height: int) -> Optional[QImage]:
+    """Render the scene, this needs the Qt thread."""
+    try:
+        return Snapshot.snapshot(width, height)
+    except Exception:
+        Logger.logException("w", "Failed to create thumbnail for G-code")
+        return None
+
+
+def encode_thumbnail(image: QImage, image_format: str = THUMBNAIL_FORMAT) -> str:
+    """Encode image as data URL, QImage can be used off the Qt thread."""
+    buffer = QBuffer()
+    buffer.open(QBuffer.OpenModeFlag.ReadWrite)
+    image.save(buffer, image_format)
+    base64_message = base64.b64encode(buffer.data()).decode("ascii")
+    buffer.close()
+
+    return "data:{};base64,".format(_MIME_TYPES[image_format]) + base64_message
+
+
+def generate_thumbnail(size: Tuple[int, int] = THUMBNAIL_SIZE, image_format: str = THUMBNAIL_FORMAT) -> str:
+    """Generate thumbnail of the scene as data URL.
+
+    Only the snapshot is rendered on the Qt thread, the image is encoded on
+    the calling (job) thread. Thumbnails are cached by scene fingerprint.
+    """
+    width, height = size
+    if image_format not in _MIME_TYPES:
+        Logger.warning("Unsupported thumbnail format %s, use %s", image_format, THUMBNAIL_FORMAT)
+        image_format = THUMBNAIL_FORMAT
+
+    try:
+        key = (scene_fingerprint(), width, height, image_format)
+    except Exception:
+        Logger.logException("w", "Failed to fingerprint scene for thumbnail")
+        key = None
+
+    if key is not None:
+        thumbnail = ThumbnailCache.get(key)
+        if thumbnail is not None:
+            return thumbnail
+
+    image = _snapshot(width, height)
+    if not image:
+        return ""
+
+    try:
+        thumbnail = encode_thumbnail(image, image_format)
+    except Exception:
+        Logger.logException("w", "Failed to encode thumbnail for G-code")
+        return ""
+
+    if key is not None:
+        ThumbnailCache.put(key, thumbnail)
+    return thumbnail
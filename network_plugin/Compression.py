@@ -0,0 +1,52 @@
+from typing import Optional
+
+from UM.Application import Application
+from UM.Logger import Logger
+
+from ..config import get_machine_by_model
+from ..gcode_writer.GCodeSpool import COMPRESSION_GZIP, GCodeSpool
+
+# zlib level (1-9) of compressed uploads, 0 to send plain G-code
+PREFERENCE_KEY_COMPRESSION_LEVEL = "SnapmakerPlugin/compression_level"
+
+# file name suffix of compressed uploads
+_SUFFIXES = {
+    COMPRESSION_GZIP: ".gz",
+}
+
+
+def get_compression_level() -> int:
+    preferences = Application.getInstance().getPreferences()
+    try:
+        return max(0, min(9, int(preferences.getValue(PREFERENCE_KEY_COMPRESSION_LEVEL) or 0)))
+    except ValueError:
+        return 0
+
+
+def negotiate_compression(model: str) -> Optional[str]:
+    """Get compression to upload with to a printer of this model.
+
+    Compression is used only if it's enabled, and the machine config lists
+    it in `compression`, i.e. the firmware is known to decompress it.
+    """
+    if get_compression_level() == 0:
+        return None
+
+    machine = get_machine_by_model(model)
+    if machine and COMPRESSION_GZIP in machine.get('compression', ()):
+        return COMPRESSION_GZIP
+    return None
+
+
+def create_gcode_spool(model: str, directory: Optional[str] = None) -> GCodeSpool:
+    """Create the spool G-code for a printer of this model is written to."""
+    compression = negotiate_compression(model)
+    if compression:
+        Logger.info("Compress G-code with %s (level %d) for %s", compression, get_compression_level(), model)
+        return GCodeSpool(directory, compression=compression, compression_level=get_compression_level())
+    return GCodeSpool(directory)
+
+
+def compressed_filename(filename: str, spool: GCodeSpool) -> str:
+    """Add the suffix of the spool's compression to the upload file name."""
+    return filename + _SUFFIXES.get(spool.compression, "")
@@ -0,0 +1,65 @@
+from typing import TYPE_CHECKING, Callable, Optional, Union
+
+from ..gcode_writer.GCodeSpool import GCodeSpool
+
+if TYPE_CHECKING:
+    from .HTTPNetworkedPrinterOutputDevice import HTTPNetworkedPrinterOutputDevice
+    from .SACPNetworkedPrinterOutputDevice import SACPNetworkedPrinterOutputDevice
+
+    PrinterDevice = Union[SACPNetworkedPrinterOutputDevice, HTTPNetworkedPrinterOutputDevice]
+
+
+class DeviceSend:
+    """Send of a written spool to a device, on behalf of the upload queue or a group send.
+
+    Forwards the write signals of the device while the send runs. The
+    device sends nothing else meanwhile (sendSpool() refuses), so they're
+    about this spool. A send that stops making progress is given up by
+    the device's SendWatchdog, it's reported as failed then.
+
+    on_finished: called with the send and whether the file was sent
+    on_progress: called with the send on progress
+    """
+
+    def __init__(self, device: "PrinterDevice", on_finished: Callable[["DeviceSend", bool], None],
+                 on_progress: Optional[Callable[["DeviceSend"], None]] = None) -> None:
+        self.device = device
+        self._on_finished = on_finished
+        self._on_progress = on_progress
+        self._running = False
+
+    def start(self, spool: GCodeSpool, filename: Optional[str] = None) -> bool:
+        """Start sending, False if the device is still sending another file."""
+        self.device.writeProgress.connect(self._onProgress)
+        self.device.writeFinished.connect(self._onFinished)
+        self.device.writeError.connect(self._onError)
+        self._running = True
+        if not self.device.sendSpool(spool, filename):
+            self.stop()
+            return False
+        return True
+
+    def stop(self) -> None:
+        """Stop forwarding signals, the device isn't told."""
+        if not self._running:
+            return
+        self._running = False
+        self.device.writeProgress.disconnect(self._onProgress)
+        self.device.writeFinished.disconnect(self._onFinished)
+        self.device.writeError.disconnect(self._onError)
+
+    def _onProgress(self, *args) -> None:
+        if self._on_progress:
+            self._on_progress(self)
+
+    def _onFinished(self, *args) -> None:
+        self.__finish(True)
+
+    def _onError(self, *args) -> None:
+        self.__finish(False)
+
+    def __finish(self, success: bool) -> None:
+        if not self._running:
+            return
+        self.stop()
+        self._on_finished(self, success)
@@ -1,9 +1,8 @@
 import json
 import time
-from io import StringIO
 from typing import TYPE_CHECKING, Dict, List, Optional
 
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import QFile, QIODevice, QTimer
 from PyQt6.QtNetwork import (
     QHttpPart,
     QNetworkReply,
@@ -17,10 +16,16 @@ from UM.Message import Message
 from cura.PrinterOutput.NetworkedPrinterOutputDevice import \
     NetworkedPrinterOutputDevice, AuthState
 from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
+from ..gcode_writer.GCodeSpool import GCodeSpool
+from ..gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
+from .Compression import compressed_filename, create_gcode_spool
 from .HTTPTokenManager import HTTPTokenManager
+from .KeepAliveSession import KeepAliveSession
+from .SendWatchdog import SendWatchdog
 
 if TYPE_CHECKING:
     from UM.FileHandler.FileHandler import FileHandler
+    from UM.FileHandler.WriteFileJob import WriteFileJob
     from UM.Scene.SceneNode import SceneNode
 
 
@@ -36,12 +41,21 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     def __init__(self, device_id: str, address: str, properties: Dict[str, str]) -> None:
         super().__init__(device_id, address, properties)
 
+        # getProperty() looks keys up as bytes, properties of discovered printers are str
+        self._model = properties.get("model", "")
+
         self._setInterfaceElements()
 
         self._api_prefix = ":8080/api/v1"
 
         self._token = ""  # API token
-        self._stream = StringIO()  # data stream of file
+        self._stream = None  # type: Optional[GCodeSpool]  # spooled G-code file
+        self._upload_file = None  # type: Optional[QFile]  # body device of the upload
+        self._upload_reply = None  # type: Optional[QNetworkReply]
+        self._upload_progress = 0.
+        self._upload_filename = None  # type: Optional[str]  # name given by sendSpool()
+        self._session = KeepAliveSession(self.checkStatus, self.disconnect)  # health check with /status
+        self._watchdog = SendWatchdog(self.__onSendStalled)
 
         self.authenticationStateChanged.connect(self._onAuthenticationStateChanged)
         self.connectionStateChanged.connect(self._onConnectionStateChanged)
@@ -70,6 +84,8 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         if self.connectionState == ConnectionState.Connected:
             if self.authenticationState != AuthState.Authenticated:
                 return
+            if not self._stream or self._stream.closed:
+                return  # kept session, nothing to send
 
             # once connected, we send file right away
             if not self._progress.visible:
@@ -79,6 +95,7 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
 
     def _onAuthenticationStateChanged(self) -> None:
         if self.authenticationState == AuthState.Authenticated:
+            self._watchdog.touch()
             self._need_auth.hide()
         elif self.authenticationState == AuthState.AuthenticationRequested:
             self._need_auth.show()
@@ -104,11 +121,90 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         """Custom request in subclass."""
         raise NotImplementedError
 
-    def _writeFileJobFinished(self, job) -> None:
+    def getModel(self) -> str:
+        """Model the printer reported in discovery, e.g. "Snapmaker J1"."""
+        return self._model
+
+    def createSpool(self, directory: Optional[str] = None) -> GCodeSpool:
+        """Create the spool G-code for this printer is written to."""
+        return create_gcode_spool(self._model, directory)
+
+    def createWriter(self) -> SnapmakerGCodeWriter:
+        """Create the writer that writes G-code for this device."""
+        return SnapmakerGCodeWriter()
+
+    def isSending(self) -> bool:
+        """Whether a file is being written or uploaded to this device."""
+        return self._stream is not None
+
+    def sendSpool(self, spool: GCodeSpool, filename: Optional[str] = None) -> bool:
+        """Send G-code that's been written already, e.g. a spool shared by a group send.
+
+        filename: name of the file on the printer, named after the print job if not set
+
+        Returns False if another file is being uploaded, writeFinished or
+        writeError are emitted for this file otherwise.
+        """
+        if self.isSending():
+            Logger.warning("Unable to send to %s, still uploading another file", self.getId())
+            return False
+        self._stream = spool.retain()
+        self._upload_filename = filename
+
+        self.writeStarted.emit(self)
+        self._writeFileJobFinished(None)
+        return True
+
+    def abortSend(self) -> None:
+        """Give up uploading a written file, e.g. when the printer stopped responding."""
+        if not self._stream:
+            return
+        reply = self._upload_reply
+        self._abortUpload()
+        self._need_auth.hide()
+        if reply:
+            reply.abort()  # finishes as canceled, see _onRequestFinished()
+
+    def __onSendStalled(self) -> None:
+        Message(title="Error",
+                text="{} stopped responding, uploading was aborted.".format(self.getId()),
+                lifetime=0,
+                dismissable=True).show()
+        self.abortSend()
+
+    def getUploadProgress(self) -> float:
+        """Progress (in percent) of the file being uploaded."""
+        return self._upload_progress
+
+    def _writeFileJobFinished(self, job: Optional["WriteFileJob"]) -> None:
+        if self._stream is None:
+            Logger.warning("G-code for %s written, but uploading it was aborted", self.getId())
+            return
+        if job is not None and job.getError():
+            Logger.error("Unable to write G-code for %s: %s", self.getId(), job.getError())
+            Message(title="Error",
+                    text="Unable to write G-code: {}".format(job.getError()),
+                    lifetime=0,
+                    dismissable=True).show()
+            self._abortUpload()
+            return
+
+        self._watchdog.start()  # until the file is uploaded
+        if self.authenticationState == AuthState.Authenticated and self._token and self._session.acquire():
+            # connected and authorized already, send file right away
+            Logger.info("Reuse connection to %s", self.getId())
+            if not self._progress.visible:
+                self._progress.show()
+            self._upload()
+            return
+
         # connect to remote
         self.connect()
 
     def __onWriteFinished(self):
+        if self._session.keep():
+            return  # keep connection for the next send
+
         # disconnect from remote
         self.disconnect()
 
@@ -120,12 +216,14 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
 
     def connect(self) -> None:
         # reset state
+        self._session.close()
         self.setConnectionState(ConnectionState.Closed)
         self.setAuthenticationState(AuthState.NotAuthenticated)
 
         self.postFormWithParts("/connect", self._queryParams(), self._onRequestFinished)
 
     def disconnect(self) -> None:
+        self._session.close()
         if self._token:
             self.postFormWithParts("/disconnect", self._queryParams(), self._onRequestFinished)
 
@@ -138,25 +236,65 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         if not self._token:
             return
 
+        self._filename = self._upload_filename or self.createFilename(self._stream)
+
+        self._upload_progress = 0.
+        parts = self._queryParams()
+        file_part = self._createFileFormPart('name=file; filename="{}"'.format(self._filename))
+        if file_part is None:
+            return
+        parts.append(file_part)
+        self._upload_reply = self.postFormWithParts("/upload",
+                                                    parts,
+                                                    on_finished=self._onRequestFinished,
+                                                    on_progress=self._onUploadProgress)
+
+    def createFilename(self, spool: GCodeSpool) -> str:
+        """Name of the file on the printer, after the current print job."""
         print_info = Application.getInstance().getPrintInformation()
         job_name = print_info.jobName.strip()
         print_time = print_info.currentPrintTime
         material_name = "-".join(print_info.materialNames)
 
-        self._filename = "{}_{}_{}.gcode".format(
+        filename = "{}_{}_{}.gcode".format(
             job_name, material_name,
             "{}h{}m{}s".format(print_time.days * 24 + print_time.hours, print_time.minutes, print_time.seconds))
+        return compressed_filename(filename, spool)
 
-        parts = self._queryParams()
-        parts.append(
-            self._createFormPart(
-                'name=file; filename="{}"'.format(self._filename),
-                self._stream.getvalue().encode()))
-        self._stream.close()
-        self.postFormWithParts("/upload",
-                               parts,
-                               on_finished=self._onRequestFinished,
-                               on_progress=self._onUploadProgress)
+    def _createFileFormPart(self, content_header: str) -> Optional[QHttpPart]:
+        """Create form part that streams the spooled G-code file.
+
+        Qt reads the body from the file while sending, the G-code is never
+        loaded into memory as a whole.
+        """
+        self._stream.finish()
+
+        self._upload_file = QFile(self._stream.path)
+        if not self._upload_file.open(QIODevice.OpenModeFlag.ReadOnly):
+            Logger.error("Unable to open spooled G-code file %s", self._stream.path)
+            self._upload_file = None
+            return None
+
+        part = QHttpPart()
+        part.setHeader(QNetworkRequest.KnownHeaders.ContentDispositionHeader, "form-data; " + content_header)
+        part.setBodyDevice(self._upload_file)
+        return part
+
+    def _cleanupUpload(self) -> None:
+        self._watchdog.stop()
+        self._upload_reply = None
+        if self._upload_file:
+            self._upload_file.close()
+            self._upload_file = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+        self._upload_filename = None
+
+    def _abortUpload(self) -> None:
+        self._progress.hide()
+        self._cleanupUpload()
+        self.writeError.emit()
 
     def _jsonReply(self, reply: QNetworkReply):
         try:
@@ -172,7 +310,13 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
                 QNetworkReply.NetworkError.NoError,
                 QNetworkReply.NetworkError.AuthenticationRequiredError,  # 204 is No Content, not an error
         ):
+            if reply.error() == QNetworkReply.NetworkError.OperationCanceledError and not self._stream:
+                Logger.info("Canceled %s", http_url)  # by abortSend()
+                return
             Logger.warning("Error %s from %s", reply.error(), http_url)
+            if self._stream and (self._api_prefix + "/connect" in http_url or self._api_prefix + "/upload" in http_url):
+                self._abortUpload()  # nothing retries the send
+            self._session.close()
             self.setConnectionState(ConnectionState.Closed)
             Message(title="Error",
                     text=reply.errorString(),
@@ -191,12 +335,16 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
             # /api/v1/status
             if self._api_prefix + "/status" in http_url:
                 if http_code == 200:  # approved
+                    self._session.alive()
                     self.setAuthenticationState(AuthState.Authenticated)
                     resp = self._jsonReply(reply)
                     device_status = resp.get("status", "UNKNOWN")
                     self.setDeviceStatus(device_status)
                 elif http_code == 401:  # denied
+                    self._session.close()
                     self.setAuthenticationState(AuthState.AuthenticationDenied)
+                    if self._stream:
+                        self._abortUpload()
                 elif http_code == 204:  # wait for authentication on HMI
                     self.setAuthenticationState(AuthState.AuthenticationRequested)
                 else:
@@ -224,6 +372,8 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
                 else:
                     # failed
                     self.setConnectionState(ConnectionState.Closed)
+                    if self._stream:
+                        self._abortUpload()
                     Message(
                         title="Error",
                         text=
@@ -238,6 +388,7 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
             # /api/v1/upload
             elif self._api_prefix + "/upload" in http_url:
                 self._progress.hide()
+                self._cleanupUpload()
                 self.writeFinished.emit()
 
                 Message(title="Sent to {}".format(self.getId()),
@@ -247,7 +398,9 @@ class HTTPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
     def _onUploadProgress(self, bytes_sent: int, bytes_total: int) -> None:
         if bytes_total > 0:
             percentage = (bytes_sent / bytes_total) if bytes_total else 0
-            self._progress.setProgress(percentage * 100)
+            self._upload_progress = percentage * 100
+            self._progress.setProgress(self._upload_progress)
+            self._watchdog.touch()
             self.writeProgress.emit()
 
 
@@ -279,6 +432,11 @@ class PrintJobNeedAuthMessage(Message):
     def _onCheck(self, *args, **kwargs):
         self._device.checkStatus()
 
+    def hide(self, *args, **kwargs):
+        super().hide(*args, **kwargs)
+        if self._device.authenticationState == AuthState.AuthenticationRequested:
+            self._device.abortSend()  # dismissed while waiting for authorization
+
 
 class PrintJobUploadProgressMessage(Message):
 
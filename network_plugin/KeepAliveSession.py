@@ -0,0 +1,100 @@
+import time
+from typing import Callable
+
+from PyQt6.QtCore import QTimer
+
+from UM.Application import Application
+from UM.Logger import Logger
+
+# Seconds a connection is kept open after a send, for the next one to reuse it, 0 to disconnect right away
+PREFERENCE_KEY_KEEP_ALIVE_TIMEOUT = "SnapmakerPlugin/keep_alive_timeout"
+
+
+class KeepAliveSession:
+    """Keeps the connection of a device open between sends.
+
+    Each output device (one per device id) owns a session. After a send,
+    the connection is kept open until it has been idle for the timeout set
+    in preferences. Meanwhile health checks are run every heartbeat
+    interval, a send only reuses the connection if the last check passed
+    recently, and skips connect and authentication then.
+
+    heartbeat: runs a health check, its result is reported by alive() or close()
+    close: closes the connection of the device
+    """
+
+    HEARTBEAT_INTERVAL = 10  # seconds
+
+    def __init__(self, heartbeat: Callable[[], None], close: Callable[[], None]) -> None:
+        self._heartbeat = heartbeat
+        self._close = close
+
+        self._open = False
+        self._last_seen = 0.
+
+        self._heartbeat_timer = QTimer()
+        self._heartbeat_timer.setInterval(self.HEARTBEAT_INTERVAL * 1000)
+        self._heartbeat_timer.timeout.connect(self._onHeartbeat)
+
+        self._idle_timer = QTimer()
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.timeout.connect(self._onIdle)
+
+    @staticmethod
+    def getTimeout() -> int:
+        preferences = Application.getInstance().getPreferences()
+        try:
+            return max(0, int(preferences.getValue(PREFERENCE_KEY_KEEP_ALIVE_TIMEOUT) or 0))
+        except ValueError:
+            return 0
+
+    @classmethod
+    def isEnabled(cls) -> bool:
+        return cls.getTimeout() > 0
+
+    def isAlive(self) -> bool:
+        """Whether the connection is open and passed a health check recently."""
+        return self._open and time.monotonic() - self._last_seen < 2 * self.HEARTBEAT_INTERVAL
+
+    def keep(self) -> bool:
+        """Keep the connection open after a send, False if keep-alive is off."""
+        timeout = self.getTimeout()
+        if timeout <= 0:
+            return False
+
+        self._open = True
+        self._last_seen = time.monotonic()
+        self._idle_timer.start(timeout * 1000)
+        self._heartbeat_timer.start()
+        return True
+
+    def acquire(self) -> bool:
+        """Take the connection for a send, False if there's none to reuse."""
+        if not self.isAlive():
+            return False
+
+        self._idle_timer.stop()
+        self._heartbeat_timer.stop()
+        return True
+
+    def alive(self) -> None:
+        """Report a passed health check."""
+        self._last_seen = time.monotonic()
+
+    def close(self) -> None:
+        """Forget the connection, e.g. because it was lost or a health check failed."""
+        self._open = False
+        self._idle_timer.stop()
+        self._heartbeat_timer.stop()
+
+    def _onHeartbeat(self) -> None:
+        if self._open:
+            self._heartbeat()
+
+    def _onIdle(self) -> None:
+        if not self._open:
+            return
+
+        Logger.info("Closing idle connection")
+        self.close()
+        self._close()
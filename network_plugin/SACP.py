@@ -1,7 +1,14 @@
 """
 TODO: SACP protocol is not well implemented, refactor this.
 """
+import functools
 import struct
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 INT8 = 'B'
 INT16 = 'H'
@@ -12,7 +19,12 @@ SACP_PACK_FORMAT = '<{0}{1}{2}{3}{4}{5}{6}{7}{8}{9}{10}'.format(INT8, INT8, INT1
 SACP_PACKAGE = 60 * 1024  # 60 KiB
 
 
-def SACP_check_head(package_data, length):
+SACP_HEAD_PREFIX_FORMAT = '<{0}{1}{2}{3}{4}'.format(INT8, INT8, INT16, INT8, INT8)
+SACP_HEAD_SUFFIX_FORMAT = '<{0}{1}{2}{3}{4}'.format(INT8, INT8, INT16, INT8, INT8)
+
+
+def SACP_check_head_bitwise(package_data, length):
+    """Reference implementation of the header CRC-8 (poly 0x07), bit by bit."""
     crc = 0
     poly = 0x07
     for i in range(length):
@@ -26,7 +38,53 @@ def SACP_check_head(package_data, length):
     return crc
 
 
-def u16_check_data(package_data, length):
+def _crc8_table(poly):
+    table = bytearray(256)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & 0x80 else (crc << 1)
+        table[byte] = crc & 0xff
+    return bytes(table)
+
+
+SACP_CRC8_TABLE = _crc8_table(0x07)
+
+
+def SACP_check_head(package_data, length):
+    crc = 0
+    table = SACP_CRC8_TABLE
+    for i in range(length):
+        crc = table[crc ^ package_data[i]]
+    return crc
+
+
+@functools.lru_cache(maxsize=64)
+def SACP_head_prefix(data_length, receiver_id):
+    """First 7 bytes of a packet: magic, length, version, receiver and their CRC.
+
+    They only depend on payload length and receiver, so file chunks of the same
+    size share a single cached prefix.
+    """
+    prefix = bytearray(struct.pack(SACP_HEAD_PREFIX_FORMAT,
+                                   0xAA,
+                                   0x55,
+                                   data_length + 6 + 2,
+                                   SACP_VERSION,
+                                   receiver_id))
+    prefix.append(SACP_check_head(prefix, 6))
+    return bytes(prefix)
+
+
+def _u16_fold(check_num):
+    while check_num > 0xffff:
+        check_num = ((check_num >> 16) & 0xffff) + (check_num & 0xffff)
+    check_num = ~check_num
+    return check_num & 0xffff
+
+
+def u16_check_data_python(package_data, length):
+    """Reference implementation, sums big-endian 16-bit words byte by byte."""
     check_num = 0
     if length > 0:
         for i in range(0, (length - 1), 2):
@@ -34,10 +92,70 @@ def u16_check_data(package_data, length):
             check_num &= 0xffffffff
         if length % 2 != 0:
             check_num += package_data[length - 1]
-    while check_num > 0xffff:
-        check_num = ((check_num >> 16) & 0xffff) + (check_num & 0xffff)
-    check_num = ~check_num
-    return check_num & 0xffff
+    return _u16_fold(check_num)
+
+
+def u16_check_data_memoryview(package_data, length):
+    """Sum words with memoryview.cast, no copy of the payload is made.
+
+    Words are summed in native byte order, on little-endian hosts the
+    big-endian sum is recovered from the native sum N and the byte sum S:
+    BE = 257 * S - N.
+    """
+    check_num = 0
+    if length > 0:
+        view = memoryview(package_data)
+        if view.format != INT8 or view.ndim != 1:
+            view = view.cast(INT8)
+        even_length = length & ~1
+        words = view[:even_length]
+        word_sum = sum(words.cast(INT16))
+        if sys.byteorder == "little":
+            word_sum = 257 * sum(words) - word_sum
+        check_num = word_sum & 0xffffffff
+        if length % 2 != 0:
+            check_num += view[length - 1]
+    return _u16_fold(check_num)
+
+
+def u16_check_data_numpy(package_data, length):
+    """Sum words with NumPy in a single vectorized call."""
+    check_num = 0
+    if length > 0:
+        words = numpy.frombuffer(package_data, dtype=">u2", count=length // 2)
+        check_num = int(words.sum(dtype=numpy.uint64)) & 0xffffffff
+        if length % 2 != 0:
+            check_num += package_data[length - 1]
+    return _u16_fold(check_num)
+
+
+CHECKSUM_BACKENDS = {
+    "python": u16_check_data_python,
+    "memoryview": u16_check_data_memoryview,
+}
+if numpy is not None:
+    CHECKSUM_BACKENDS["numpy"] = u16_check_data_numpy
+
+_checksum_backend = "numpy" if numpy is not None else "memoryview"
+
+
+def get_checksum_backend():
+    return _checksum_backend
+
+
+def set_checksum_backend(name):
+    """Select the implementation used by u16_check_data().
+
+    name: one of CHECKSUM_BACKENDS, "numpy" is only available when NumPy is installed.
+    """
+    global _checksum_backend
+    if name not in CHECKSUM_BACKENDS:
+        raise ValueError("Unknown checksum backend: {}".format(name))
+    _checksum_backend = name
+
+
+def u16_check_data(package_data, length):
+    return CHECKSUM_BACKENDS[_checksum_backend](package_data, length)
 
 
 class ReceiverException(Exception):
@@ -53,6 +171,31 @@ class ReceiverData(object):
         self.sequence = sequence
 
 
+def SACP_pack_into(buffer, receiver_id, sender_id, attribute, sequence, command_set, command_id, send_data):
+    """Write a packet into a preallocated buffer, return the packet length.
+
+    send_data may be a bytes-like object or a list/tuple of them, parts are
+    copied one after another so the caller doesn't have to join them first.
+    """
+    parts = send_data if isinstance(send_data, (list, tuple)) else (send_data,)
+    data_length = 0
+    for part in parts:
+        data_length += len(part)
+
+    buffer[0:7] = SACP_head_prefix(data_length, receiver_id)
+    struct.pack_into(SACP_HEAD_SUFFIX_FORMAT, buffer, 7, sender_id, attribute, sequence, command_set, command_id)
+    offset = 13
+    for part in parts:
+        end = offset + len(part)
+        buffer[offset:end] = part
+        offset = end
+
+    with memoryview(buffer) as view:
+        check_num = u16_check_data(view[7:offset], data_length + 6)
+    struct.pack_into("<H", buffer, offset, check_num & 0xFFFF)
+    return offset + 2
+
+
 def SACP_pack(receiver_id, sender_id, attribute, sequence, command_set, command_id, send_data):
     """
         receiver_id : 接收者ID
@@ -61,29 +204,37 @@ def SACP_pack(receiver_id, sender_id, attribute, sequence, command_set, command_
         sequence : 包的标号
         command_set : command_set
         command_id : command_id
-        data : 要发送的数据
+        data : 要发送的数据, 或者多个数据片段 (list/tuple)
     """
-    data_length = len(send_data)
-    package_head = struct.pack(SACP_PACK_FORMAT,
-                               0xAA,
-                               0x55,
-                               data_length + 6 + 2,
-                               SACP_VERSION,
-                               receiver_id,
-                               0,  # 前6个字节的校验,暂时为0
-                               sender_id,
-                               attribute,
-                               sequence,
-                               command_set,
-                               command_id)
-    package_head = bytearray(package_head)
-    package_head[6] = SACP_check_head(package_head, 6)
-    pack_array = package_head + send_data
-    check_num = u16_check_data(pack_array[7:], data_length + 6)
-    pack_array = pack_array + struct.pack("<H", check_num & 0xFFFF)
+    parts = send_data if isinstance(send_data, (list, tuple)) else (send_data,)
+    pack_array = bytearray(sum(len(part) for part in parts) + 13 + 2)
+    SACP_pack_into(pack_array, receiver_id, sender_id, attribute, sequence, command_set, command_id, send_data)
     return pack_array
 
 
+def SACP_update_sequence(packet, sequence):
+    """Patch the sequence of a framed packet in place and refresh its checksum.
+
+    The sequence isn't covered by the header CRC. The checksum is a folded sum
+    of 16-bit words, so it's updated incrementally from the old and new word
+    (as in RFC 1624) instead of summing the whole payload again. The 16-bit
+    length field keeps packets far below the size that could overflow the
+    32-bit sum, so the shortcut is exact.
+    """
+    length = len(packet)
+    old_sequence = packet[9] | packet[10] << 8
+    if old_sequence == sequence:
+        return
+    struct.pack_into("<H", packet, 9, sequence)
+
+    # the little-endian sequence is the big-endian word at offset 9
+    old_word = (old_sequence & 0xff) << 8 | old_sequence >> 8
+    new_word = (sequence & 0xff) << 8 | sequence >> 8
+    folded = ~(packet[length - 2] | packet[length - 1] << 8) & 0xffff
+    folded = (folded - old_word + new_word) % 0xffff or 0xffff
+    struct.pack_into("<H", packet, length - 2, ~folded & 0xffff)
+
+
 def SACP_unpack(receiver_data):
     if (receiver_data[0] != 0xAA and receiver_data[1] != 0x55) or len(receiver_data) < 13:
         print(receiver_data[0], receiver_data[1], len(receiver_data))
@@ -113,6 +264,93 @@ def SACP_unpack(receiver_data):
     return ReceiverData(command_set, command_id, valid_data, sequence)
 
 
+class SACPFrameDecoder(object):
+    """Incremental decoder that turns a byte stream into SACP packets.
+
+    Feed it whatever the socket returned, complete packets are yielded as
+    ReceiverData as soon as they have fully arrived. Partial packets stay in
+    the buffer until the rest comes in. On garbage or a bad header CRC the
+    decoder resyncs on the next 0xAA 0x55.
+
+    The buffer is a bytearray with a read offset, consumed bytes are dropped
+    in bulk once they make up most of it, so decoding stays O(n) however the
+    stream is fragmented.
+    """
+
+    COMPACT_THRESHOLD = 64 * 1024
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+        self._frame_length = 0  # length of the validated packet at offset, if still incomplete
+        self.discarded = 0  # bytes skipped while looking for a packet
+
+    def reset(self):
+        self._buffer.clear()
+        self._offset = 0
+        self._frame_length = 0
+        self.discarded = 0
+
+    def pending(self):
+        return len(self._buffer) - self._offset
+
+    def feed(self, data):
+        self._compact()
+        self._buffer += data
+        return self._frames()
+
+    def _compact(self):
+        if self._offset >= len(self._buffer):
+            self._buffer.clear()
+            self._offset = 0
+        elif self._offset > self.COMPACT_THRESHOLD and self._offset * 2 > len(self._buffer):
+            del self._buffer[:self._offset]
+            self._offset = 0
+
+    def _skip(self, position):
+        self.discarded += position - self._offset
+        self._offset = position
+
+    def _frames(self):
+        buffer = self._buffer
+        if self._frame_length:
+            # header already checked, only wait for the rest of the packet
+            if len(buffer) - self._offset < self._frame_length:
+                return
+            yield self._take(self._frame_length)
+
+        while True:
+            start = buffer.find(b'\xaa\x55', self._offset)
+            if start < 0:
+                # a trailing 0xAA could be the first half of the next magic
+                end = len(buffer)
+                if end > self._offset and buffer[-1] == 0xAA:
+                    end -= 1
+                self._skip(end)
+                return
+            self._skip(start)
+
+            if len(buffer) - start < 7:
+                return
+            data_len = buffer[start + 2] | buffer[start + 3] << 8
+            if data_len < 8 or SACP_check_head(buffer[start:start + 6], 6) != buffer[start + 6]:
+                self._skip(start + 1)
+                continue
+
+            frame_length = data_len + 7
+            if len(buffer) - start < frame_length:
+                self._frame_length = frame_length
+                return
+            yield self._take(frame_length)
+
+    def _take(self, frame_length):
+        start = self._offset
+        packet = bytes(self._buffer[start:start + frame_length])
+        self._offset = start + frame_length
+        self._frame_length = 0
+        return SACP_unpack(packet)
+
+
 def SACP_validData(receiver_valid_data, package_format):
     receiver_valid_data = struct.unpack(package_format, receiver_valid_data)
     return receiver_valid_data
@@ -0,0 +1,172 @@
+import hashlib
+import struct
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from .SACP import SACP_PACKAGE, SACP_pack, SACP_pack_into, SACP_update_sequence
+
+
+class SACPFileTransfer:
+    """A G-code file served to the printer chunk by chunk.
+
+    The file is kept as one immutable byte buffer, chunk boundaries are byte
+    offsets into it, so the byte length announced in the prepare packet always
+    matches the chunks sent. Framed chunk packets are kept in a small LRU,
+    a retransmit only has its sequence and checksum patched.
+
+    With a pipeline depth > 0, the packets following the last requested one
+    are framed ahead of time (see prefetch()), so they can be written as soon
+    as the printer asks for them.
+    """
+
+    CACHED_PACKETS = 4
+
+    def __init__(self, data, filename: str, md5: Optional[str] = None, pipeline_depth: int = 0) -> None:
+        self._data = memoryview(data).cast("B")
+        self._filename = filename
+
+        if md5 is None:
+            md5 = hashlib.md5(self._data).hexdigest()
+        self._md5 = md5.encode("utf-8")
+
+        size = len(self._data)
+        # same count as before, the printer requests indices [0, package_count)
+        self._package_count = size // SACP_PACKAGE + 1
+        self._offsets = array("Q", (min(index * SACP_PACKAGE, size) for index in range(self._package_count + 1)))
+
+        self._packets = OrderedDict()  # package index -> framed packet (bytearray)
+        self._pipeline_depth = max(0, pipeline_depth)
+        self._cache_size = self.CACHED_PACKETS + self._pipeline_depth
+
+        self._in_flight = OrderedDict()  # package index -> time its reply was written
+        self._last_requested = -1
+        self._acknowledged = -1  # all packages up to this index have been received
+
+    @property
+    def filename(self) -> str:
+        return self._filename
+
+    @property
+    def md5(self) -> str:
+        return self._md5.decode("utf-8")
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    @property
+    def packageCount(self) -> int:
+        return self._package_count
+
+    @property
+    def pipelineDepth(self) -> int:
+        return self._pipeline_depth
+
+    @property
+    def inFlight(self) -> int:
+        """Number of packages sent but not acknowledged yet."""
+        return len(self._in_flight)
+
+    @property
+    def acknowledgedIndex(self) -> int:
+        return self._acknowledged
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the packages received by the printer."""
+        return (self._acknowledged + 1) / self._package_count
+
+    def onPackageRequested(self, index: int) -> None:
+        """Track a package request.
+
+        The printer asks for packages in order, a request for package N
+        acknowledges all packages before it.
+        """
+        while self._in_flight:
+            oldest = next(iter(self._in_flight))
+            if oldest >= index:
+                break
+            del self._in_flight[oldest]
+        self._acknowledged = max(self._acknowledged, index - 1)
+        self._last_requested = max(self._last_requested, index)
+        self._in_flight[index] = time.monotonic()
+
+    def onFinished(self) -> None:
+        self._in_flight.clear()
+        self._acknowledged = self._package_count - 1
+
+    def prefetch(self) -> int:
+        """Frame packets following the last requested one, return how many were framed."""
+        framed = 0
+        end = min(self._last_requested + 1 + self._pipeline_depth, self._package_count)
+        for index in range(self._last_requested + 1, end):
+            if index not in self._packets:
+                self._framePacket(index, 0)
+                framed += 1
+        return framed
+
+    def getChunk(self, index: int) -> memoryview:
+        return self._data[self._offsets[index]:self._offsets[index + 1]]
+
+    def getPreparePacket(self) -> bytes:
+        gcode_name = self._filename.encode("utf-8")
+        gcode_name_length = len(gcode_name)
+        file_md5_length = len(self._md5)
+        packet_data = struct.pack(
+            "<H{0}sIHH{1}s".format(gcode_name_length, file_md5_length),
+            gcode_name_length,
+            gcode_name,
+            self.size,
+            self._package_count,
+            file_md5_length,
+            self._md5,
+        )
+        return SACP_pack(receiver_id=2,
+                         sender_id=0,
+                         attribute=0,
+                         sequence=1,
+                         command_set=0xb0,
+                         command_id=0x00,
+                         send_data=packet_data)
+
+    def getPacket(self, index: int, sequence: int) -> bytearray:
+        """Get the framed reply to a request for package `index`."""
+        packet = self._packets.get(index)
+        if packet is not None:
+            self._packets.move_to_end(index)
+            SACP_update_sequence(packet, sequence)
+            return packet
+
+        return self._framePacket(index, sequence)
+
+    def _framePacket(self, index: int, sequence: int) -> bytearray:
+        chunk = self.getChunk(index)
+        file_md5_length = len(self._md5)
+        chunk_head = struct.pack("<BH{0}sHH".format(file_md5_length),
+                                 0,
+                                 file_md5_length,
+                                 self._md5,
+                                 index,
+                                 len(chunk))
+        packet_length = len(chunk_head) + len(chunk) + 13 + 2
+
+        packet = None
+        if len(self._packets) >= self._cache_size:
+            _, packet = self._packets.popitem(last=False)
+            if len(packet) != packet_length:
+                packet = None
+        if packet is None:
+            packet = bytearray(packet_length)
+
+        SACP_pack_into(packet,
+                       receiver_id=2,
+                       sender_id=0,
+                       attribute=1,
+                       sequence=sequence,
+                       command_set=0xb0,
+                       command_id=0x01,
+                       send_data=(chunk_head, chunk))
+        self._packets[index] = packet
+        return packet
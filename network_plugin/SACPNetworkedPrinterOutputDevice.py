@@ -1,35 +1,53 @@
-import hashlib
 import struct
-from io import StringIO
 from typing import TYPE_CHECKING, Dict, List, Optional
 
 from cura.CuraApplication import CuraApplication
 from cura.PrinterOutput.NetworkedPrinterOutputDevice import \
     NetworkedPrinterOutputDevice
 from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
-from PyQt6.QtNetwork import QTcpSocket
+from PyQt6.QtCore import QTimer
+from PyQt6.QtNetwork import QAbstractSocket, QTcpSocket
+from UM.Application import Application
 from UM.Logger import Logger
 from UM.Message import Message
 
-from .SACP import SACP_PACKAGE, SACP_pack, SACP_unpack, SACP_validData
+from ..gcode_writer.GCodeSpool import GCodeSpool
+from ..gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
+from .Compression import compressed_filename, create_gcode_spool
+from .KeepAliveSession import KeepAliveSession
+from .SACP import SACPFrameDecoder, SACP_pack, SACP_validData
+from .SACPFileTransfer import SACPFileTransfer
+from .SendWatchdog import SendWatchdog
 
 if TYPE_CHECKING:
     from UM.FileHandler.FileHandler import FileHandler
+    from UM.FileHandler.WriteFileJob import WriteFileJob
     from UM.Scene.SceneNode import SceneNode
 
 
 class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
 
+    # Number of packages framed ahead of the printer's requests, 0 to disable
+    PREFERENCE_KEY_PIPELINE_DEPTH = "SnapmakerPlugin/sacp_pipeline_depth"
+
     def __init__(self, device_id: str, address: str, properties: Dict[str, str]) -> None:
         super().__init__(device_id, address, properties)
 
+        # getProperty() looks keys up as bytes, properties of discovered printers are str
+        self._model = properties.get("model", "")
+
         self._setInterfaceElements()
 
-        self._stream = StringIO()
-        self._data = ""
-        self._data_md5 = ""
+        self._stream = None  # type: Optional[GCodeSpool]
+        self._transfer = None  # type: Optional[SACPFileTransfer]
+        self._upload_filename = None  # type: Optional[str]  # name given by sendSpool()
+        self._file_ready = False  # G-code is written, can be sent once connected
+        self._session = KeepAliveSession(self.__checkSession, self.__closeSession)
+        self._watchdog = SendWatchdog(self.__onSendStalled)
 
         self._socket = QTcpSocket()
+        self._socket.errorOccurred.connect(self.__socketError)
+        self._frame_decoder = SACPFrameDecoder()
 
         self.connectionStateChanged.connect(self.__onConnectionStateChanged)
 
@@ -47,13 +65,100 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         """Custom request in subclass."""
         raise NotImplementedError
 
-    def _writeFileJobFinished(self, job) -> None:
+    def getModel(self) -> str:
+        """Model the printer reported in discovery, e.g. "Snapmaker J1"."""
+        return self._model
+
+    def createSpool(self, directory: Optional[str] = None) -> GCodeSpool:
+        """Create the spool G-code for this printer is written to."""
+        return create_gcode_spool(self._model, directory)
+
+    def createWriter(self) -> SnapmakerGCodeWriter:
+        """Create the writer that writes G-code for this device."""
+        return SnapmakerGCodeWriter()
+
+    def isSending(self) -> bool:
+        """Whether a file is being written or sent to this device."""
+        return self._stream is not None
+
+    def sendSpool(self, spool: GCodeSpool, filename: Optional[str] = None) -> bool:
+        """Send G-code that's been written already, e.g. a spool shared by a group send.
+
+        filename: name of the file on the printer, named after the print job if not set
+
+        Returns False if another file is being sent, writeFinished or
+        writeError are emitted for this file otherwise.
+        """
+        if self.isSending():
+            Logger.warning("Unable to send to %s, still sending another file", self.getId())
+            return False
+        self._stream = spool.retain()
+        self._upload_filename = filename
+
+        self.writeStarted.emit(self)
+        self._startSession()
+        self._writeFileJobFinished(None)
+        return True
+
+    def abortSend(self) -> None:
+        """Give up sending a written file, e.g. when the printer stopped responding."""
+        if not self._file_ready:
+            return  # nothing sent, or still being written
+        self._session.close()
+        self.disconnect()
+        self.setConnectionState(ConnectionState.Closed)
+        self._abortSendFile()
+
+    def __onSendStalled(self) -> None:
+        Message(title="Error",
+                text="{} stopped responding, sending was aborted.".format(self.getId()),
+                lifetime=0,
+                dismissable=True).show()
+        self.abortSend()
+
+    def getUploadProgress(self) -> float:
+        """Progress (in percent) of the file being sent."""
+        return self._transfer.progress * 100 if self._transfer else 0.
+
+    def _startSession(self) -> None:
+        """Connect and handshake while the G-code is being written.
+
+        The file is sent when both are done, whichever finishes last. It
+        can't be sent earlier, the prepare packet carries its size and MD5.
+        """
+        self._file_ready = False
+        if self.connectionState == ConnectionState.Connected and self._session.acquire():
+            Logger.info("Reuse connection to %s", self.getId())
+            return
         self.connect()
 
+    def _writeFileJobFinished(self, job: Optional["WriteFileJob"]) -> None:
+        if self._stream is None:
+            Logger.warning("G-code for %s written, but sending it was aborted", self.getId())
+            return
+        if job is not None and job.getError():
+            Logger.error("Unable to write G-code for %s: %s", self.getId(), job.getError())
+            Message(title="Error",
+                    text="Unable to write G-code: {}".format(job.getError()),
+                    lifetime=0,
+                    dismissable=True).show()
+            self._abortSendFile()
+            if self.connectionState == ConnectionState.Connected:
+                self.__closeSession()
+            return
+
+        self._file_ready = True
+        self._watchdog.start()  # until the printer received the file
+        if self.connectionState == ConnectionState.Connected:
+            self._sendFile()  # handshake is done already
+        elif self.connectionState != ConnectionState.Connecting:
+            self.connect()
+
     def connect(self) -> None:
         self.disconnect()
 
         self.setConnectionState(ConnectionState.Connecting)
+        self._frame_decoder.reset()
         self._socket.connected.connect(self.__socketConnected)
         self._socket.readyRead.connect(self.__socketReadyRead)
         self._socket.connectToHost(self._address, 8888)
@@ -61,6 +166,7 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         Logger.info("Disconnected from output device.")
 
     def disconnect(self) -> None:
+        self._session.close()
         if self._socket.state() == QTcpSocket.SocketState.ConnectedState:
             self._socket.connected.disconnect(self.__socketConnected)
             self._socket.readyRead.disconnect(self.__socketReadyRead)
@@ -68,6 +174,8 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
 
     def __socketConnected(self) -> None:
         if self._socket.state() == QTcpSocket.SocketState.ConnectedState:
+            # let the OS probe the connection, it may be kept open between sends
+            self._socket.setSocketOption(QAbstractSocket.SocketOption.KeepAliveOption, 1)
             self.__sacpConnect()
 
     def __socketReadyRead(self) -> None:
@@ -75,25 +183,15 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
             Logger.debug("Socket not connected, abort read.")
             return
 
-        while True:
-            data = self._socket.read(4)
-            if not data or len(data) < 4:
-                break
-            if data[0] != 0xAA and data[1] != 0x55:
-                # discard this 4 bytes
-                continue
-
-            data_len = (data[2] | data[3] << 8) & 0xFFFF
-            residue_data = self._socket.read(data_len + 3)
-            data += residue_data
-            receiver_data = SACP_unpack(data)
-
+        # feed whatever has arrived, the decoder keeps partial packets until they are complete
+        for receiver_data in self._frame_decoder.feed(bytes(self._socket.readAll())):
             if receiver_data.command_set == 0x01 and receiver_data.command_id == 0x05:
                 token_length = receiver_data.valid_data[1]
                 receiver_valid_data = SACP_validData(
                     receiver_data.valid_data, "<BH{0}s".format(token_length))
 
                 if receiver_valid_data[0] == 0:  # connected
+                    self._watchdog.touch()
                     self.setConnectionState(ConnectionState.Connected)
 
             elif receiver_data.command_set == 0x01 and receiver_data.command_id == 0x05:
@@ -109,29 +207,80 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
                 package_index = receiver_valid_data[-1]
                 sequence = receiver_data.sequence
 
-                package_data = self._data[(
-                    SACP_PACKAGE * package_index):(SACP_PACKAGE * (package_index + 1))]
-                self.__sacpSendGcodoFile(
-                    self._data_md5, package_data, package_index, sequence)
+                self.__sacpSendGcodoFile(package_index, sequence)
 
             elif receiver_data.command_set == 0xb0 and receiver_data.command_id == 0x02:
                 receiver_valid_data = SACP_validData(
                     receiver_data.valid_data, "<B")
                 if receiver_valid_data[0] == 0:
+                    if self._transfer:
+                        self._transfer.onFinished()
                     self._sendFileFinished()
+                else:
+                    Logger.warning("Printer %s failed to receive G-code file (Err: %d)",
+                                   self.getId(), receiver_valid_data[0])
+                    self._abortSendFile()
+
+    def __socketError(self, error) -> None:
+        Logger.warning("Socket error %s on %s", error, self.getId())
+        self._session.close()
+        self.setConnectionState(ConnectionState.Closed)
+        # while the G-code is being written, the spool is still in use,
+        # _writeFileJobFinished() connects again once it's done
+        if self._stream and self._file_ready:
+            Message(title="Error",
+                    text=self._socket.errorString(),
+                    lifetime=0,
+                    dismissable=True).show()
+            self._abortSendFile()
+
+    def _abortSendFile(self) -> None:
+        self._watchdog.stop()
+        self._transfer = None
+        self._file_ready = False
+        self._upload_filename = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+        self.writeError.emit()
 
     def __onConnectionStateChanged(self, device_id: str) -> None:
-        if self.connectionState == ConnectionState.Connected:
-            # once connected, we send file right away
+        if self.connectionState != ConnectionState.Connected:
+            return
+        if self._file_ready:
+            # once connected and written, we send file right away
             self._sendFile()
+        elif self._stream is None:
+            self.__closeSession()  # sending was aborted while connecting
 
     def __onWriteFinished(self):
+        self._watchdog.stop()
+        self._transfer = None
+        self._file_ready = False
+        self._upload_filename = None
+        if self._stream:
+            self._stream.close()
+            self._stream = None
+
+        if self._session.keep():
+            return  # keep connection for the next send
+
+        self.__closeSession()
+
+    def __closeSession(self) -> None:
         # disconnect from remote
         self.__sacpDisconnect()
 
         # disconnect socket
         self.disconnect()
 
+    def __checkSession(self) -> None:
+        # there's no SACP request without side effects, rely on the socket and TCP keep-alive
+        if self._socket.state() == QTcpSocket.SocketState.ConnectedState:
+            self._session.alive()
+        else:
+            self._session.close()
+
     def _sendFile(self) -> None:
         self._prepareSendFile()
 
@@ -147,16 +296,22 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
         Logger.info("Send G-code file successfully")
 
     def _prepareSendFile(self) -> None:
+        filename = self._upload_filename or self.createFilename(self._stream)
+
+        # chunks are served as byte slices of the memory-mapped spool file,
+        # its MD5 was computed while the G-code was written
+        self._transfer = SACPFileTransfer(self._stream.getbuffer(), filename, md5=self._stream.md5,
+                                          pipeline_depth=self.__getPipelineDepth())
+        self.__sacpPrepareSendGcode()
+
+    def createFilename(self, spool: GCodeSpool) -> str:
+        """Name of the file on the printer, after the current print job."""
         print_info = CuraApplication.getInstance().getPrintInformation()
 
         job_name = print_info.jobName.strip()
         print_time = print_info.currentPrintTime
         material_name = "-".join(print_info.materialNames)
 
-        self._data = self._stream.getvalue()
-        self._data_md5 = hashlib.md5(self._data.encode("utf-8")).hexdigest()
-        package_count = int(len(self._data) / SACP_PACKAGE) + 1
-
         filename = "{}_{}_{}.gcode".format(
             job_name,
             material_name,
@@ -165,10 +320,14 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
                 print_time.minutes,
                 print_time.seconds)
         )
+        return compressed_filename(filename, spool)
 
-        # TODO: upload
-        self.__sacpPrepareSendGcode(
-            self._data, filename, self._data_md5, package_count)
+    def __getPipelineDepth(self) -> int:
+        preferences = Application.getInstance().getPreferences()
+        try:
+            return int(preferences.getValue(self.PREFERENCE_KEY_PIPELINE_DEPTH) or 0)
+        except ValueError:
+            return 0
 
     def __sacpString(self, s: str) -> bytes:
         s_utf = s.encode("utf-8")
@@ -199,49 +358,23 @@ class SACPNetworkedPrinterOutputDevice(NetworkedPrinterOutputDevice):
                            send_data=b'')
         self._socket.write(packet)
 
-    def __sacpPrepareSendGcode(self, data: str, gcode_name, file_md5, package_count) -> None:
-        data = data.encode("utf-8")
-        gcode_name = gcode_name.encode("utf-8")
-        file_md5 = file_md5.encode("utf-8")
-
-        gcode_name_length = len(gcode_name)
-        file_md5_length = len(file_md5)
-        data_format = "H{0}sIHH{1}s".format(gcode_name_length, file_md5_length)
-        packet_data = struct.pack(
-            '<{0}'.format(data_format),
-            gcode_name_length,
-            gcode_name,
-            len(data),
-            package_count,
-            file_md5_length,
-            file_md5,
-        )
-        packet = SACP_pack(receiver_id=2,
-                           sender_id=0,
-                           attribute=0,
-                           sequence=1,
-                           command_set=0xb0,
-                           command_id=0x00,
-                           send_data=packet_data)
-        self._socket.write(packet)
+    def __sacpPrepareSendGcode(self) -> None:
+        self._socket.write(self._transfer.getPreparePacket())
 
-    def __sacpSendGcodoFile(self, file_md5, data: str, index, sequence):
-        gcode_data_length = len(data.encode('utf-8'))
-        file_md5_length = len(file_md5.encode('utf-8'))
-        data_format = "BH{0}sHH{1}s".format(file_md5_length, gcode_data_length)
-        data = struct.pack('<{0}'.format(data_format),
-                           0,
-                           file_md5_length,
-                           file_md5.encode('utf-8'),
-                           index,
-                           gcode_data_length,
-                           data.encode('utf-8'),
-                           )
-        packet = SACP_pack(receiver_id=2,
-                           sender_id=0,
-                           attribute=1,
-                           sequence=sequence,
-                           command_set=0xb0,
-                           command_id=0x01,
-                           send_data=data)
-        self._socket.write(packet)
+    def __sacpSendGcodoFile(self, index, sequence):
+        if not self._transfer:
+            Logger.warning("Package %d requested but no file is being sent.", index)
+            return
+
+        self._transfer.onPackageRequested(index)
+        self._socket.write(self._transfer.getPacket(index, sequence))
+        self._watchdog.touch()
+        self.writeProgress.emit()
+
+        if self._transfer.pipelineDepth:
+            # frame the next packages while this one is on its way
+            QTimer.singleShot(0, self.__prefetchPackets)
+
+    def __prefetchPackets(self) -> None:
+        if self._transfer:
+            self._transfer.prefetch()
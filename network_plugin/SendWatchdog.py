@@ -0,0 +1,46 @@
+from typing import Callable
+
+from PyQt6.QtCore import QTimer
+
+from UM.Logger import Logger
+
+
+class SendWatchdog:
+    """Aborts a send that stopped making progress.
+
+    Each output device owns a watchdog. It's started once the G-code is
+    written and the device starts sending it, touched on every sign of
+    progress, and stopped when the send finished or failed. If it isn't
+    touched for TIMEOUT, abort is called, the device gives up the send and
+    reports writeError, so it's free for the next one.
+
+    The timeout covers connecting, waiting for authorization on the
+    touchscreen and the transfer itself, whichever stalls.
+
+    abort: gives up the send of the device
+    """
+
+    TIMEOUT = 90  # seconds
+
+    def __init__(self, abort: Callable[[], None]) -> None:
+        self._abort = abort
+
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.TIMEOUT * 1000)
+        self._timer.timeout.connect(self._onTimeout)
+
+    def start(self) -> None:
+        self._timer.start()
+
+    def touch(self) -> None:
+        """Report progress of the send."""
+        if self._timer.isActive():
+            self._timer.start()  # restart
+
+    def stop(self) -> None:
+        self._timer.stop()
+
+    def _onTimeout(self) -> None:
+        Logger.warning("Send made no progress for %d s, abort it", self.TIMEOUT)
+        self._abort()
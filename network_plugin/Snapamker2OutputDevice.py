@@ -1,4 +1,3 @@
-from io import StringIO
 from typing import TYPE_CHECKING, Dict, List, Optional
 
 from UM.FileHandler.WriteFileJob import WriteFileJob
@@ -6,8 +5,8 @@ from UM.Message import Message
 from UM.Mesh.MeshWriter import MeshWriter
 
 from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
-from ..gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
 from .HTTPNetworkedPrinterOutputDevice import HTTPNetworkedPrinterOutputDevice
+from .UploadQueue import UploadQueue
 
 if TYPE_CHECKING:
     from UM.FileHandler.FileHandler import FileHandler
@@ -34,6 +33,10 @@ class Snapmaker2OutputDevice(HTTPNetworkedPrinterOutputDevice):
             Message(title="Unable to send request",
                     text="Machine {} is busy".format(self.getId())).show()
             return
+        if self.isSending() and not UploadQueue.isEnabled():
+            Message(title="Unable to send request",
+                    text="Still sending to {}".format(self.getId())).show()
+            return
 
         self.writeStarted.emit(self)
 
@@ -46,11 +49,13 @@ class Snapmaker2OutputDevice(HTTPNetworkedPrinterOutputDevice):
         )
         message.show()
 
-        self._stream = StringIO()  # create a new io stream
+        if UploadQueue.isEnabled():
+            UploadQueue.getInstance().write(self, nodes, message)  # sent in the background
+            return
 
-        writer = SnapmakerGCodeWriter()
+        self._stream = self.createSpool()  # G-code is spooled to a temporary file
 
-        job = WriteFileJob(writer, self._stream, nodes, MeshWriter.OutputMode.TextMode)
+        job = WriteFileJob(self.createWriter(), self._stream, nodes, MeshWriter.OutputMode.TextMode)
         job.finished.connect(self._writeFileJobFinished)
         job.setMessage(message)
         job.start()
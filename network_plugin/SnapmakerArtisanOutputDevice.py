@@ -1,4 +1,3 @@
-from io import StringIO
 from typing import TYPE_CHECKING, List, Optional
 
 from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
@@ -6,8 +5,8 @@ from UM.FileHandler.WriteFileJob import WriteFileJob
 from UM.Mesh.MeshWriter import MeshWriter
 from UM.Message import Message
 
-from ..gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
 from .SACPNetworkedPrinterOutputDevice import SACPNetworkedPrinterOutputDevice
+from .UploadQueue import UploadQueue
 
 if TYPE_CHECKING:
     from UM.FileHandler.FileHandler import FileHandler
@@ -23,6 +22,10 @@ class SnapmakerArtisanOutputDevice(SACPNetworkedPrinterOutputDevice):
             Message(title="Unable to send request",
                     text="Machine {} is busy".format(self.getId())).show()
             return
+        if self.isSending() and not UploadQueue.isEnabled():
+            Message(title="Unable to send request",
+                    text="Still sending to {}".format(self.getId())).show()
+            return
 
         self.writeStarted.emit(self)
 
@@ -35,11 +38,14 @@ class SnapmakerArtisanOutputDevice(SACPNetworkedPrinterOutputDevice):
         )
         message.show()
 
-        self._stream = StringIO()  # create a new io stream
+        if UploadQueue.isEnabled():
+            UploadQueue.getInstance().write(self, nodes, message)  # sent in the background
+            return
 
-        writer = SnapmakerGCodeWriter()
+        self._stream = self.createSpool()  # G-code is spooled to a temporary file
 
-        job = WriteFileJob(writer, self._stream, nodes, MeshWriter.OutputMode.TextMode)
+        job = WriteFileJob(self.createWriter(), self._stream, nodes, MeshWriter.OutputMode.TextMode)
         job.finished.connect(self._writeFileJobFinished)
         job.setMessage(message)
+        self._startSession()  # connect while G-code is being written
         job.start()
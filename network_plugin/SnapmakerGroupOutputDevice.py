@@ -0,0 +1,189 @@
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Union
+
+from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
+from UM.Application import Application
+from UM.FileHandler.WriteFileJob import WriteFileJob
+from UM.Logger import Logger
+from UM.Mesh.MeshWriter import MeshWriter
+from UM.Message import Message
+from UM.OutputDevice.OutputDevice import OutputDevice
+
+from ..gcode_writer.GCodeSpool import GCodeSpool
+from .Compression import create_gcode_spool
+from .DeviceSend import DeviceSend
+from .HTTPNetworkedPrinterOutputDevice import HTTPNetworkedPrinterOutputDevice
+from .SACPNetworkedPrinterOutputDevice import SACPNetworkedPrinterOutputDevice
+
+if TYPE_CHECKING:
+    from UM.FileHandler.FileHandler import FileHandler
+    from UM.Scene.SceneNode import SceneNode
+
+PrinterDevice = Union[SACPNetworkedPrinterOutputDevice, HTTPNetworkedPrinterOutputDevice]
+
+
+class SnapmakerGroupOutputDevice(OutputDevice):
+    """Send one job to all discovered printers of the active machine.
+
+    The G-code is written once into a spool, which is shared (read-only)
+    by the uploads to the printers. Each printer gets one upload at most,
+    printers that are busy (printing, or sending another file) are skipped,
+    and at most the number of uploads set in preferences run at the same
+    time, the others wait for a slot. Progress of all uploads is shown in
+    a single message.
+    """
+
+    # Number of printers that are sent to at the same time
+    PREFERENCE_KEY_MAX_CONCURRENT_UPLOADS = "SnapmakerPlugin/group_max_concurrent_uploads"
+
+    def __init__(self, device_id: str, model: str) -> None:
+        super().__init__(device_id)
+
+        self._model = model
+        self._devices = []  # type: List[PrinterDevice]
+
+        self._stream = None  # type: Optional[GCodeSpool]
+        self._waiting = deque()  # type: Deque[PrinterDevice]
+        self._uploads = {}  # type: Dict[str, DeviceSend]  # device id -> running upload
+        self._results = {}  # type: Dict[str, bool]  # device id -> whether the file was sent
+        self._total = 0
+
+        self._message = None  # type: Optional[Message]
+
+        self.setPriority(1)
+        self.setName("Snapmaker printers")
+        self.setIconName("print")
+        self._updateInterfaceElements()
+
+    def _updateInterfaceElements(self) -> None:
+        self.setShortDescription("Send to {} printers".format(len(self._devices)))
+        self.setDescription("Send to all {} printers".format(self._model))
+
+    def getModel(self) -> str:
+        return self._model
+
+    def getDevices(self) -> List[PrinterDevice]:
+        return list(self._devices)
+
+    def setDevices(self, devices: List[PrinterDevice]) -> None:
+        self._devices = list(devices)
+        self._updateInterfaceElements()
+
+    def isSending(self) -> bool:
+        return self._stream is not None
+
+    def requestWrite(self, nodes: List["SceneNode"], file_name: Optional[str] = None,
+                     limit_mimetypes: bool = False, file_handler: Optional["FileHandler"] = None,
+                     filter_by_machine: bool = False, **kwargs) -> None:
+        if self.isSending():
+            Message(title="Unable to send request",
+                    text="Still sending to {} printers".format(self._model)).show()
+            return
+
+        devices = [device for device in self._devices if device.connectionState != ConnectionState.Busy]
+        if not devices:
+            Message(title="Unable to send request",
+                    text="All {} printers are busy".format(self._model)).show()
+            return
+
+        self.writeStarted.emit(self)
+
+        self._message = Message(
+            text="Preparing to upload to {} printers".format(len(devices)),
+            progress=-1,
+            lifetime=0,
+            dismissable=False,
+            use_inactivity_timer=False,
+        )
+        self._message.show()
+
+        self._waiting = deque(devices)
+        self._results = {}
+        self._total = len(devices)
+        self._stream = create_gcode_spool(self._model)  # written once, shared by all uploads
+
+        # printers of the same model share writer settings
+        job = WriteFileJob(devices[0].createWriter(), self._stream, nodes, MeshWriter.OutputMode.TextMode)
+        job.finished.connect(self._writeFileJobFinished)
+        job.start()
+
+    def _writeFileJobFinished(self, job: WriteFileJob) -> None:
+        if job.getError():
+            Logger.error("Unable to write G-code: %s", job.getError())
+            self._results = {device.getId(): False for device in self._waiting}
+            self._waiting.clear()
+            self.__finish()
+            return
+
+        self._stream.finish()
+        Logger.info("Send %d bytes of G-code to %d printers", self._stream.size, self._total)
+        self._message.setText("Sending to {} printers".format(self._total))
+        self._message.setProgress(0)
+        self.__startUploads()
+
+    def __getMaxConcurrentUploads(self) -> int:
+        preferences = Application.getInstance().getPreferences()
+        try:
+            return max(1, int(preferences.getValue(self.PREFERENCE_KEY_MAX_CONCURRENT_UPLOADS) or 1))
+        except ValueError:
+            return 1
+
+    def __startUploads(self) -> None:
+        max_uploads = self.__getMaxConcurrentUploads()
+        while self._waiting and len(self._uploads) < max_uploads:
+            device = self._waiting.popleft()
+            if device.getId() in self._uploads or device.connectionState == ConnectionState.Busy:
+                Logger.warning("Skip sending to %s, it's busy", device.getId())
+                self._results[device.getId()] = False
+                continue
+
+            upload = DeviceSend(device, self._onUploadFinished, self._onUploadProgress)
+            self._uploads[device.getId()] = upload
+            if not upload.start(self._stream):
+                del self._uploads[device.getId()]
+                self._results[device.getId()] = False  # still sending another file
+
+        if not self._uploads and not self._waiting:
+            self.__finish()
+
+    def _onUploadProgress(self, *args) -> None:
+        progress = sum(100. for _ in self._results)
+        progress += sum(upload.device.getUploadProgress() for upload in self._uploads.values())
+        self._message.setProgress(progress / self._total)
+        self.writeProgress.emit()
+
+    def _onUploadFinished(self, upload: DeviceSend, success: bool) -> None:
+        device_id = upload.device.getId()
+        if self._uploads.get(device_id) is not upload:
+            return
+        del self._uploads[device_id]
+
+        Logger.info("Sending to %s %s", device_id, "finished" if success else "failed")
+        self._results[device_id] = success
+        self._onUploadProgress()
+        self.__startUploads()
+
+    def __finish(self) -> None:
+        if not self.isSending():
+            return
+        self._stream.close()  # removed once the last upload is done with it
+        self._stream = None
+
+        if self._message:
+            self._message.hide()
+            self._message = None
+
+        failed = [device_id for device_id, success in self._results.items() if not success]
+        if self._results and not failed:
+            Message(title="Sent G-code file to {} printers".format(len(self._results)),
+                    text="Please start print on the touchscreens.",
+                    lifetime=60).show()
+            self.writeFinished.emit(self)
+        else:
+            Message(title="Error",
+                    text="Unable to send G-code file to {} of {} printers: {}".format(
+                        len(failed), self._total, ", ".join(failed)),
+                    lifetime=0,
+                    dismissable=True).show()
+            self.writeError.emit(self)
+
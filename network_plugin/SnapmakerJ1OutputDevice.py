@@ -1,4 +1,3 @@
-from io import StringIO
 from typing import TYPE_CHECKING, List, Optional
 
 from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
@@ -8,6 +7,7 @@ from UM.Message import Message
 
 from ..gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
 from .SACPNetworkedPrinterOutputDevice import SACPNetworkedPrinterOutputDevice
+from .UploadQueue import UploadQueue
 
 if TYPE_CHECKING:
     from UM.FileHandler.FileHandler import FileHandler
@@ -16,6 +16,11 @@ if TYPE_CHECKING:
 
 class SnapmakerJ1OutputDevice(SACPNetworkedPrinterOutputDevice):
 
+    def createWriter(self) -> SnapmakerGCodeWriter:
+        writer = SnapmakerGCodeWriter()
+        writer.setExtruderMode("IDEX Full Control")  # only support IDEX Full Control in Cura
+        return writer
+
     def requestWrite(self, nodes: List["SceneNode"], file_name: Optional[str] = None,
                      limit_mimetypes: bool = False, file_handler: Optional["FileHandler"] = None,
                      filter_by_machine: bool = False, **kwargs) -> None:
@@ -23,6 +28,10 @@ class SnapmakerJ1OutputDevice(SACPNetworkedPrinterOutputDevice):
             Message(title="Unable to send request",
                     text="Machine {} is busy".format(self.getId())).show()
             return
+        if self.isSending() and not UploadQueue.isEnabled():
+            Message(title="Unable to send request",
+                    text="Still sending to {}".format(self.getId())).show()
+            return
 
         self.writeStarted.emit(self)
 
@@ -35,12 +44,14 @@ class SnapmakerJ1OutputDevice(SACPNetworkedPrinterOutputDevice):
         )
         message.show()
 
-        self._stream = StringIO()  # create a new io stream
+        if UploadQueue.isEnabled():
+            UploadQueue.getInstance().write(self, nodes, message)  # sent in the background
+            return
 
-        writer = SnapmakerGCodeWriter()
-        writer.setExtruderMode("IDEX Full Control")  # only support IDEX Full Control in Cura
+        self._stream = self.createSpool()  # G-code is spooled to a temporary file
 
-        job = WriteFileJob(writer, self._stream, nodes, MeshWriter.OutputMode.TextMode)
+        job = WriteFileJob(self.createWriter(), self._stream, nodes, MeshWriter.OutputMode.TextMode)
         job.finished.connect(self._writeFileJobFinished)
         job.setMessage(message)
+        self._startSession()  # connect while G-code is being written
         job.start()
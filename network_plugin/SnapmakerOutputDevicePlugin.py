@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from PyQt6.QtCore import QTimer
 from PyQt6.QtNetwork import QNetworkInterface, QAbstractSocket
@@ -7,11 +7,18 @@ from UM.Application import Application
 from UM.Logger import Logger
 from UM.OutputDevice.OutputDevicePlugin import OutputDevicePlugin
 
+from .Compression import PREFERENCE_KEY_COMPRESSION_LEVEL
 from .DiscoverSocket import DiscoverSocket
+from .KeepAliveSession import PREFERENCE_KEY_KEEP_ALIVE_TIMEOUT
+from .SACPNetworkedPrinterOutputDevice import SACPNetworkedPrinterOutputDevice
+from .SnapmakerGroupOutputDevice import SnapmakerGroupOutputDevice
 from .SnapmakerJ1OutputDevice import SnapmakerJ1OutputDevice
 from .SnapmakerArtisanOutputDevice import SnapmakerArtisanOutputDevice
 from .Snapamker2OutputDevice import Snapmaker2OutputDevice
+from .UploadQueue import PREFERENCE_KEY_UPLOAD_QUEUE, UploadQueue
+from .HTTPNetworkedPrinterOutputDevice import HTTPNetworkedPrinterOutputDevice
 from .HTTPTokenManager import HTTPTokenManager
+from ..gcode_writer.SnapmakerGCodeWriter import SnapmakerGCodeWriter
 from ..config import (
     is_machine_discover_supported,
     SNAPMAKER_J1,
@@ -45,8 +52,18 @@ class SnapmakerOutputDevicePlugin(OutputDevicePlugin):
         self._active_machine_name = ""
         self._active_machine = None
 
+        self._group_device = None  # type: Optional[SnapmakerGroupOutputDevice]
+
         self._http_token_manager = HTTPTokenManager.getInstance()
 
+        preferences = Application.getInstance().getPreferences()
+        preferences.addPreference(SACPNetworkedPrinterOutputDevice.PREFERENCE_KEY_PIPELINE_DEPTH, 0)
+        preferences.addPreference(PREFERENCE_KEY_COMPRESSION_LEVEL, 0)
+        preferences.addPreference(PREFERENCE_KEY_KEEP_ALIVE_TIMEOUT, 0)
+        preferences.addPreference(SnapmakerGCodeWriter.PREFERENCE_KEY_COMPACT_OUTPUT, False)
+        preferences.addPreference(SnapmakerGroupOutputDevice.PREFERENCE_KEY_MAX_CONCURRENT_UPLOADS, 4)
+        preferences.addPreference(PREFERENCE_KEY_UPLOAD_QUEUE, False)
+
         Application.getInstance().globalContainerStackChanged.connect(
             self._onGlobalContainerStackChanged)
         Application.getInstance().applicationShuttingDown.connect(self.stop)
@@ -130,6 +147,36 @@ class SnapmakerOutputDevicePlugin(OutputDevicePlugin):
                 device = Snapmaker2OutputDevice(device_id, address, properties)
                 self.getOutputDeviceManager().addOutputDevice(device)
 
+            if device:
+                self.__updateGroupDevice()
+                if UploadQueue.isEnabled():
+                    UploadQueue.getInstance().attach(device)  # send uploads queued before a restart
+
+    def __updateGroupDevice(self) -> None:
+        """Offer sending to all discovered printers of the active machine at once."""
+        manager = self.getOutputDeviceManager()
+        model = self._active_machine['model'] if self._active_machine else ""
+
+        devices = [device for device in manager.getOutputDevices()
+                   if isinstance(device, (SACPNetworkedPrinterOutputDevice, HTTPNetworkedPrinterOutputDevice))
+                   and device.getModel() == model]
+
+        if self._group_device and (len(devices) < 2 or self._group_device.getModel() != model):
+            if self._group_device.isSending():
+                return  # keep it until its uploads are done
+            manager.removeOutputDevice(self._group_device.getId())
+            self._group_device = None
+
+        if len(devices) < 2:
+            return
+
+        if not self._group_device:
+            self._group_device = SnapmakerGroupOutputDevice("snapmaker_group@{}".format(model), model)
+            self._group_device.setDevices(devices)
+            manager.addOutputDevice(self._group_device)
+        else:
+            self._group_device.setDevices(devices)
+
     def start(self) -> None:
         if not is_machine_discover_supported(self._active_machine_name):
             return
@@ -170,6 +217,7 @@ class SnapmakerOutputDevicePlugin(OutputDevicePlugin):
 
     def _onGlobalContainerStackChanged(self) -> None:
         self._updateActiveMachine()
+        self.__updateGroupDevice()
 
         # Start timer when active machine is supported
         if is_machine_discover_supported(self._active_machine_name):
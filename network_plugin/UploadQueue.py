@@ -0,0 +1,265 @@
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+from cura.PrinterOutput.PrinterOutputDevice import ConnectionState
+from PyQt6.QtCore import QTimer
+from UM.Application import Application
+from UM.FileHandler.WriteFileJob import WriteFileJob
+from UM.Logger import Logger
+from UM.Mesh.MeshWriter import MeshWriter
+from UM.Message import Message
+from UM.Resources import Resources
+
+from ..gcode_writer.GCodeSpool import GCodeSpool
+from .DeviceSend import DeviceSend
+
+if TYPE_CHECKING:
+    from UM.Scene.SceneNode import SceneNode
+    from .HTTPNetworkedPrinterOutputDevice import HTTPNetworkedPrinterOutputDevice
+    from .SACPNetworkedPrinterOutputDevice import SACPNetworkedPrinterOutputDevice
+
+    PrinterDevice = Union[SACPNetworkedPrinterOutputDevice, HTTPNetworkedPrinterOutputDevice]
+
+# Send through a queue, with retries in the background, kept across restarts
+PREFERENCE_KEY_UPLOAD_QUEUE = "SnapmakerPlugin/upload_queue"
+
+
+class QueuedUpload:
+    """A file waiting to be sent to a device."""
+
+    def __init__(self, device_id: str, filename: str, spool: GCodeSpool, attempts: int = 0) -> None:
+        self.device_id = device_id
+        self.filename = filename
+        self.spool = spool
+        self.attempts = attempts
+        self.next_attempt = 0.  # time.monotonic() of the next attempt
+
+    def toDict(self) -> Dict[str, Any]:
+        return {
+            "device_id": self.device_id,
+            "filename": self.filename,
+            "spool": os.path.basename(self.spool.path),
+            "md5": self.spool.md5,
+            "size": self.spool.size,
+            "compression": self.spool.compression,
+            "attempts": self.attempts,
+        }
+
+
+class UploadQueue:
+    """Pending uploads of each device, sent one after another in the background.
+
+    G-code is spooled into the queue directory, and the queue is saved to
+    a manifest next to the spool files whenever it changes, so pending
+    uploads are picked up again after a restart, once their device is
+    discovered. Spool files are checked against the size in the manifest
+    when they're opened again, they aren't hashed on startup, their MD5
+    is taken from the manifest.
+
+    An upload is only started while its device isn't sending another file.
+    An attempt fails on an error, or if it stops making progress (see
+    SendWatchdog). A failed attempt is retried with exponential backoff,
+    up to MAX_ATTEMPTS, every attempt sends the whole file.
+    """
+
+    MANIFEST = "queue.json"
+
+    RETRY_DELAY = 5  # seconds, doubled with each failed attempt
+    MAX_RETRY_DELAY = 300  # seconds
+    MAX_ATTEMPTS = 10
+
+    instance = None
+
+    @classmethod
+    def getInstance(cls) -> "UploadQueue":
+        if not cls.instance:
+            cls.instance = UploadQueue(os.path.join(Resources.getDataStoragePath(), "snapmaker_upload_queue"))
+            cls.instance.load()
+
+        return cls.instance
+
+    @staticmethod
+    def isEnabled() -> bool:
+        preferences = Application.getInstance().getPreferences()
+        return bool(preferences.getValue(PREFERENCE_KEY_UPLOAD_QUEUE))
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+
+        self._uploads = {}  # type: Dict[str, List[QueuedUpload]]  # device id -> pending uploads, in order
+        self._devices = {}  # type: Dict[str, PrinterDevice]  # device id -> discovered device
+        self._running = {}  # type: Dict[str, Tuple[DeviceSend, QueuedUpload]]  # device id -> upload being sent
+        self._timers = {}  # type: Dict[str, QTimer]  # device id -> timer of the next attempt
+        self._writing = {}  # type: Dict[WriteFileJob, PrinterDevice]  # G-code being written for a device
+
+    def getDirectory(self) -> str:
+        return self._directory
+
+    def getUploads(self, device_id: str) -> List[QueuedUpload]:
+        return list(self._uploads.get(device_id, []))
+
+    def load(self) -> None:
+        """Restore the uploads saved by an earlier session."""
+        try:
+            with open(os.path.join(self._directory, self.MANIFEST), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            Logger.warning("Unable to read upload queue: %s", e)
+            return
+
+        kept = {self.MANIFEST}
+        for entry in entries:
+            try:
+                upload = self.__loadUpload(entry)
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                Logger.warning("Drop queued upload %s: %s", entry, e)
+                continue
+            if upload is None:
+                continue
+
+            kept.add(os.path.basename(upload.spool.path))
+            self._uploads.setdefault(upload.device_id, []).append(upload)
+
+        # spool files of uploads that were never queued, e.g. Cura quit while writing
+        for name in os.listdir(self._directory):
+            if name not in kept:
+                try:
+                    os.remove(os.path.join(self._directory, name))
+                except OSError:
+                    pass
+
+        Logger.info("Restored %d queued uploads", sum(len(uploads) for uploads in self._uploads.values()))
+
+    def __loadUpload(self, entry: Dict[str, Any]) -> Optional[QueuedUpload]:
+        path = os.path.join(self._directory, os.path.basename(entry["spool"]))
+        # trust the MD5 saved with it, hashing large files would stall startup
+        spool = GCodeSpool(compression=entry.get("compression"), path=path, md5=str(entry["md5"]))
+        if spool.size != int(entry["size"]):
+            Logger.warning("Drop queued upload %s, its spool file has changed", entry["filename"])
+            spool.close()
+            return None
+
+        return QueuedUpload(str(entry["device_id"]), str(entry["filename"]), spool, int(entry.get("attempts", 0)))
+
+    def save(self) -> None:
+        entries = [upload.toDict() for uploads in self._uploads.values() for upload in uploads]
+        path = os.path.join(self._directory, self.MANIFEST)
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+            os.replace(path + ".tmp", path)  # never leave a half-written manifest
+        except OSError as e:
+            Logger.warning("Unable to save upload queue: %s", e)
+
+    def attach(self, device: "PrinterDevice") -> None:
+        """Add a discovered device, its pending uploads are sent from now on."""
+        self._devices[device.getId()] = device
+        self.__schedule(device.getId())
+
+    def write(self, device: "PrinterDevice", nodes: List["SceneNode"], message: Optional[Message] = None) -> None:
+        """Write G-code for a device into the queue, it's sent once the uploads before it are done."""
+        self.attach(device)  # e.g. discovered before the queue was enabled
+        os.makedirs(self._directory, exist_ok=True)
+        spool = device.createSpool(self._directory)
+
+        job = WriteFileJob(device.createWriter(), spool, nodes, MeshWriter.OutputMode.TextMode)
+        job.finished.connect(self._onWriteFileJobFinished)
+        if message:
+            job.setMessage(message)
+        self._writing[job] = device
+        job.start()
+
+    def _onWriteFileJobFinished(self, job: WriteFileJob) -> None:
+        device = self._writing.pop(job)
+        spool = job.getStream()
+        if job.getError():
+            Logger.error("Unable to write G-code for %s: %s", device.getId(), job.getError())
+            spool.close()
+            return
+
+        spool.finish()
+        self.add(device.getId(), device.createFilename(spool), spool)
+
+    def add(self, device_id: str, filename: str, spool: GCodeSpool) -> None:
+        """Queue a written spool, the queue closes it once it's sent or given up."""
+        uploads = self._uploads.setdefault(device_id, [])
+        uploads.append(QueuedUpload(device_id, filename, spool))
+        self.save()
+
+        if len(uploads) > 1:
+            Message(title="Queued for {}".format(device_id),
+                    text="{} will be sent after {} other files.".format(filename, len(uploads) - 1),
+                    lifetime=10).show()
+        self.__schedule(device_id)
+
+    def __schedule(self, device_id: str) -> None:
+        if device_id in self._running or not self._uploads.get(device_id):
+            return
+        device = self._devices.get(device_id)
+        if device is None:
+            return  # sent once the device is discovered
+
+        upload = self._uploads[device_id][0]
+        delay = upload.next_attempt - time.monotonic()
+        if delay <= 0 and (device.connectionState == ConnectionState.Busy or device.isSending()):
+            delay = self.RETRY_DELAY  # wait for the print or other send to finish, not counted as attempt
+        if delay > 0:
+            self.__scheduleLater(device_id, delay)
+            return
+
+        upload.attempts += 1
+        self.save()
+        Logger.info("Send %s to %s (attempt %d)", upload.filename, device_id, upload.attempts)
+
+        send = DeviceSend(device, self._onUploadFinished)
+        self._running[device_id] = (send, upload)
+        if not send.start(upload.spool, upload.filename):
+            upload.attempts -= 1  # the device started another send meanwhile
+            del self._running[device_id]
+            self.__scheduleLater(device_id, self.RETRY_DELAY)
+
+    def __scheduleLater(self, device_id: str, delay: float) -> None:
+        timer = self._timers.get(device_id)
+        if timer is None:
+            timer = QTimer()
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda: self.__schedule(device_id))
+            self._timers[device_id] = timer
+        if not timer.isActive():
+            timer.start(int(delay * 1000))
+
+    def _onUploadFinished(self, send: DeviceSend, success: bool) -> None:
+        device_id = send.device.getId()
+        if device_id not in self._running or self._running[device_id][0] is not send:
+            return
+        upload = self._running.pop(device_id)[1]
+        if success:
+            self.__remove(upload)
+        elif upload.attempts >= self.MAX_ATTEMPTS:
+            Logger.error("Give up sending %s to %s after %d attempts", upload.filename, device_id, upload.attempts)
+            Message(title="Error",
+                    text="Unable to send {} to {} after {} attempts.".format(
+                        upload.filename, device_id, upload.attempts),
+                    lifetime=0,
+                    dismissable=True).show()
+            self.__remove(upload)
+        else:
+            delay = min(self.MAX_RETRY_DELAY, self.RETRY_DELAY * 2 ** (upload.attempts - 1))
+            upload.next_attempt = time.monotonic() + delay
+            self.save()
+            Logger.info("Retry sending %s to %s in %d s", upload.filename, device_id, delay)
+
+        self.__schedule(device_id)
+
+    def __remove(self, upload: QueuedUpload) -> None:
+        self._uploads[upload.device_id].remove(upload)
+        if not self._uploads[upload.device_id]:
+            del self._uploads[upload.device_id]
+        upload.spool.close()
+        self.save()
+
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+# the plugin directory is a package, its __init__ registers the plugin with Cura
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pytest_collect_directory(path, parent):
+    if str(path) == PLUGIN_DIR:
+        # collect it as plain directory, pytest would import the __init__ otherwise
+        return pytest.Dir.from_parent(parent, path=path)
+    return None
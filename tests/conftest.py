@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+# the plugin is loaded by Cura as a package, modules use relative imports
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_PACKAGE = "SnapmakerCuraPlugin"
+
+if PLUGIN_PACKAGE not in sys.modules:
+    # register the package without running its __init__, which registers the plugin with Cura
+    package = types.ModuleType(PLUGIN_PACKAGE)
+    package.__path__ = [PLUGIN_DIR]
+    sys.modules[PLUGIN_PACKAGE] = package
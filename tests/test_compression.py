@@ -0,0 +1,65 @@
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("cura")
+pytest.importorskip("PyQt6.QtNetwork")
+
+from PyQt6.QtCore import QCoreApplication
+
+from SnapmakerCuraPlugin.config import SNAPMAKER_J1
+from SnapmakerCuraPlugin.gcode_writer.GCodeSpool import COMPRESSION_GZIP
+from SnapmakerCuraPlugin.network_plugin.Compression import PREFERENCE_KEY_COMPRESSION_LEVEL
+from SnapmakerCuraPlugin.network_plugin.SnapmakerJ1OutputDevice import SnapmakerJ1OutputDevice
+
+
+@pytest.fixture
+def application():
+    if QCoreApplication.instance() is None:
+        QCoreApplication([])
+
+    preferences = {PREFERENCE_KEY_COMPRESSION_LEVEL: 6}
+    app = mock.MagicMock()
+    app.getPreferences.return_value.getValue.side_effect = preferences.get
+    with mock.patch("UM.Application.Application.getInstance", return_value=app), \
+            mock.patch("cura.CuraApplication.CuraApplication.getInstance", return_value=app):
+        yield preferences
+
+
+def create_device() -> SnapmakerJ1OutputDevice:
+    # properties as SnapmakerOutputDevicePlugin parses them from discovery replies
+    return SnapmakerJ1OutputDevice("Snapmaker J1@192.168.1.2", "192.168.1.2",
+                                   {"model": "Snapmaker J1", "status": "IDLE"})
+
+
+def test_device_model(application):
+    assert create_device().getModel() == "Snapmaker J1"
+
+
+def test_device_spool_is_compressed(application):
+    device = create_device()
+    with mock.patch.dict(SNAPMAKER_J1, compression=(COMPRESSION_GZIP,)):
+        spool = device.createSpool()
+    try:
+        assert spool.compression == COMPRESSION_GZIP
+    finally:
+        spool.close()
+
+
+def test_device_spool_is_plain_if_firmware_does_not_decompress(application):
+    spool = create_device().createSpool()
+    try:
+        assert spool.compression is None
+    finally:
+        spool.close()
+
+
+def test_device_spool_is_plain_if_compression_is_off(application):
+    application[PREFERENCE_KEY_COMPRESSION_LEVEL] = 0
+    device = create_device()
+    with mock.patch.dict(SNAPMAKER_J1, compression=(COMPRESSION_GZIP,)):
+        spool = device.createSpool()
+    try:
+        assert spool.compression is None
+    finally:
+        spool.close()
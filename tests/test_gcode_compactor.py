@@ -0,0 +1,44 @@
+from SnapmakerCuraPlugin.gcode_writer.GCodeCompactor import GCodeCompactor
+from SnapmakerCuraPlugin.gcode_writer.GCodeScanner import GCodeScanner
+
+HEADER = ";FLAVOR:Marlin\n" + GCodeScanner.HEADER_END + " 5.2.1\n"
+
+
+def compact(body: str) -> list:
+    compactor = GCodeCompactor()
+    text = compactor.feed(HEADER + body) + compactor.finish()
+    return text[len(HEADER):].splitlines()
+
+
+def test_modal_parameters_are_dropped():
+    assert compact("G1 F1500 X10.000 Y10 E1\nG1 F1500 X20 Y10 E2 ; infill\n") == [
+        "G1 F1500 X10 Y10 E1",
+        "G1 X20 E2",
+    ]
+
+
+def test_arc_forgets_feed_rate_and_extrusion():
+    # the arc sets F and E, a following move with the values from before must keep them
+    assert compact("G1 F1500 X10 Y10 E1\nG2 X30 Y30 I5 J5 E4 F3000\nG1 F1500 X40 Y40 E5\n"
+                   "G3 X10 Y10 I-5 J-5 E1 F3000\nG1 F1500 X10 Y10 E1\n") == [
+        "G1 F1500 X10 Y10 E1",
+        "G2 X30 Y30 I5 J5 E4 F3000",
+        "G1 F1500 X40 Y40 E5",
+        "G3 X10 Y10 I-5 J-5 E1 F3000",
+        "G1 F1500 X10 Y10 E1",
+    ]
+
+
+def test_home_forgets_position():
+    assert compact("G1 F1500 X10 Y10 Z1\nG28\nG1 F1500 X10 Y10 Z1\n") == [
+        "G1 F1500 X10 Y10 Z1",
+        "G28",
+        "G1 F1500 X10 Y10 Z1",
+    ]
+
+
+def test_lines_split_across_chunks():
+    compactor = GCodeCompactor()
+    text = "".join([compactor.feed(HEADER + "G1 F1500 X1"), compactor.feed("0 Y10\n;LAYER:1\nG1 X10"),
+                    compactor.feed(" Y20\n"), compactor.finish()])
+    assert text[len(HEADER):].splitlines() == ["G1 F1500 X10 Y10", ";LAYER:1", "G1 Y20"]